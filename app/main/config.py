@@ -13,7 +13,8 @@ def setup_directory(directory_path):
 class Config:
     PROJECT_PATH = up(up(up(__file__)))
     DOWNLOADS_PATH = setup_directory(join(PROJECT_PATH, 'downloads'))
-    DATA_PATH = setup_directory(join(PROJECT_PATH, 'data'))
+    DATA_PATH = setup_directory(os.environ.get('DATA_PATH', join(PROJECT_PATH, 'data')))
+    METRICS_PATH = setup_directory(os.environ.get('METRICS_PATH', join(PROJECT_PATH, 'metrics')))
     HOST = '127.0.0.1'
 
     # database
@@ -24,6 +25,9 @@ class Config:
     DATABASE_URL = f'postgresql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:5432/{DATABASE_NAME}'
 
     # services
+    SHARED_PATH = os.environ.get('SHARED_PATH', '/shared')  # volume mounted at the same path in every container
+    USE_DOCKER = os.getenv('USE_DOCKER', 'true').lower() == 'true'  # false when services are already running
+
     VIDEO_SCRAPER_NAME = 'video-scraper'
     VIDEO_SCRAPER_PORT = os.getenv('VIDEO_SCRAPER_PORT', 8080)
 
@@ -2,6 +2,12 @@ from .face_detection import FaceDetection
 from .face_recognition import FaceRecognition
 from .forced_alignment import ForcedAlignment
 from .head_pose_estimation import HeadPoseEstimation
+from .manager import ContainerManager
 from .speech_recognition import SpeechRecognition
 from .sync_net import SyncNet
 from .video_scraper import VideoScraper
+
+__all__ = [
+    'FaceDetection', 'FaceRecognition', 'ForcedAlignment', 'HeadPoseEstimation', 'ContainerManager',
+    'SpeechRecognition', 'SyncNet', 'VideoScraper'
+]
@@ -6,7 +6,12 @@ from docker.errors import APIError
 
 from main import config
 
-MAX_STATUS_CHECKS = 180
+MAX_STATUS_CHECKS = 720
+STATUS_CHECK_INTERVAL = 0.25  # seconds
+
+
+class ContainerError(Exception):
+    pass
 
 
 class Base:
@@ -15,11 +20,12 @@ class Base:
         self.name = name
         self.port = port
         self.api = f'http://{config.HOST}:{self.port}'
-        try:
-            self._ = from_env().containers.get(container_id=name)
-        except APIError:
-            print(f'Could not find container: {self.name}')
-            exit()
+        self._ = None  # no container when the service isn't run by docker e.g. benchmark stubs
+        if config.USE_DOCKER:
+            try:
+                self._ = from_env().containers.get(container_id=name)
+            except APIError:
+                raise ContainerError(f'Could not find container: {self.name}')
         self.start_time = None
 
     def __enter__(self):
@@ -43,26 +49,29 @@ class Base:
             return False
 
     def is_running(self):
+        if self._ is None:
+            return self.is_up()
+
         return self._.status == 'running' and self.is_up()
 
     def reload(self):
-        return self._.reload()
+        if self._ is not None:
+            return self._.reload()
 
     def start(self):
         print(f'\nStarting container: {self.name}...', end='', flush=True)
 
         if not self.is_running():
             try:
-                self._.start()
+                if self._ is not None:
+                    self._.start()
                 status_check_retries = 0
                 while not self.is_running():
                     self.reload()
-                    time.sleep(1)
+                    time.sleep(STATUS_CHECK_INTERVAL)
                     status_check_retries += 1
                     if status_check_retries == MAX_STATUS_CHECKS:
-                        print(f'Not running after {MAX_STATUS_CHECKS} status '
-                              f'checks')
-                        exit()
+                        raise ContainerError(f'{self.name} not running after {MAX_STATUS_CHECKS} status checks')
                     print('.', end='', flush=True)
             except APIError:
                 print(f'Could not start container: {self.name}')
@@ -72,7 +81,7 @@ class Base:
     def stop(self):
         print(f'Stopping container: {self.name}...', end='', flush=True)
 
-        if self.is_running():
+        if self._ is not None and self.is_running():
             try:
                 self._.stop()
                 self.reload()
@@ -2,7 +2,7 @@ import os
 
 from .base import Base
 from main.config import config
-from main.utils.file import File
+from main.utils.file import upload
 from main.utils.http import post
 
 
@@ -11,8 +11,19 @@ class FaceDetection(Base):
     def __init__(self):
         super().__init__(name=config.FACE_DETECTION_NAME, port=config.FACE_DETECTION_PORT)
 
-    def detect(self, video_path):
-        response = post(endpoint=f'{self.api}/detect/',
-                        files={'video': File(video_path)})
+    def detect(self, video_path, backend=None):
+        files, data = upload(video=video_path)
+        if backend:
+            data['backend'] = backend
+        response = post(endpoint=f'{self.api}/detect/', files=files, data=data)
+
+        return response
+
+    def detect_video(self, video_path, backend=None):
+        # tracks of the whole video as rows of frame, face id, x1, y1, x2, y2
+        files, data = upload(video=video_path)
+        if backend:
+            data['backend'] = backend
+        response = post(endpoint=f'{self.api}/detect/video', files=files, data=data)
 
         return response
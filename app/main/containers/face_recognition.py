@@ -5,7 +5,7 @@ import numpy as np
 
 from .base import Base
 from main.config import config
-from main.utils.file import File
+from main.utils.file import File, upload
 from main.utils.http import post
 
 
@@ -26,7 +26,8 @@ class FaceRecognition(Base):
         return response
 
     def get_embeddings_by_video(self, video_path):
-        response = post(endpoint=f'{self.api}/embeddings/video', files={'video': File(video_path)})
+        files, data = upload(video=video_path)
+        response = post(endpoint=f'{self.api}/embeddings/video', files=files, data=data)
 
         return response
 
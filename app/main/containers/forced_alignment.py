@@ -3,7 +3,7 @@ import tempfile
 from .base import Base
 from main.config import config
 from main.utils.http import post
-from main.utils.file import File
+from main.utils.file import upload
 
 
 class ForcedAlignment(Base):
@@ -15,8 +15,7 @@ class ForcedAlignment(Base):
         with tempfile.NamedTemporaryFile('w+') as f:
             f.write(transcript)
             f.seek(0)
-            response = post(endpoint=f'{self.api}/align/',
-                            files={'audio': File(audio_path),
-                                   'transcript': File(f.name)})
+            files, data = upload(audio=audio_path, transcript=f.name)
+            response = post(endpoint=f'{self.api}/align/', files=files, data=data)
 
             return response
@@ -1,6 +1,6 @@
 from .base import Base
 from main.config import config
-from main.utils.file import File
+from main.utils.file import upload
 from main.utils.http import post
 
 
@@ -11,6 +11,7 @@ class HeadPoseEstimation(Base):
                          port=config.HEAD_POSE_ESTIMATION_PORT)
 
     def estimate(self, video_path):
-        response = post(endpoint=f'{self.api}/estimate/', files={'video': File(video_path)})
+        files, data = upload(video=video_path)
+        response = post(endpoint=f'{self.api}/estimate/', files=files, data=data)
 
         return response
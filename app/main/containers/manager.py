@@ -0,0 +1,101 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from main.utils.metrics import metrics
+
+IDLE_TIMEOUT = 600  # seconds a container can go unused before it's stopped
+REAP_INTERVAL = 30
+
+
+class ContainerManager:
+    """Keeps service containers warm across videos
+
+    Containers are started on first use and shared by every video in the harvest run. Unused containers are
+    stopped after an idle timeout and started again on demand. Everything still running is stopped on close.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, stop_on_close=True):
+        self.idle_timeout = idle_timeout
+        self.stop_on_close = stop_on_close
+        self.containers = {}  # {container class: container}
+        self.running = set()
+        self.num_users = {}
+        self.last_used = {}
+        self.start_locks = {}  # {container class: lock}, held while the container starts
+        self.lock = threading.RLock()
+        self.closed = threading.Event()
+        self.reaper = None
+
+        if self.idle_timeout:
+            self.reaper = threading.Thread(target=self.reap, daemon=True)
+            self.reaper.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, container_class):
+        with self.lock:
+            container = self.containers.get(container_class)
+            if container is None:
+                container = container_class()
+                self.containers[container_class] = container
+                self.start_locks[container_class] = threading.Lock()
+
+        # starting can take minutes, only users of the same container wait on it
+        with self.start_locks[container_class]:
+            if container_class not in self.running:
+                with metrics.timer('container', container.name):
+                    container.start()
+                with self.lock:
+                    self.running.add(container_class)
+
+        with self.lock:
+            self.last_used[container_class] = time.time()
+
+        return container
+
+    def start(self, *container_classes):
+        for container_class in container_classes:
+            self.get(container_class)
+
+    @contextmanager
+    def use(self, container_class):
+        # containers in use are never reaped, no matter how long the request takes
+        # counted as a user before it's started so it can't be reaped in between
+        with self.lock:
+            self.num_users[container_class] = self.num_users.get(container_class, 0) + 1
+        try:
+            container = self.get(container_class)
+
+            # covers the request(s) made to the service, including waiting on it
+            with metrics.timer('service', container.name):
+                yield container
+        finally:
+            with self.lock:
+                self.num_users[container_class] -= 1
+                self.last_used[container_class] = time.time()
+
+    def stop(self, container_class):
+        with self.lock:
+            if container_class in self.running:
+                self.containers[container_class].stop()
+                self.running.remove(container_class)
+
+    def reap(self):
+        while not self.closed.wait(REAP_INTERVAL):
+            with self.lock:
+                for container_class in list(self.running):
+                    is_idle = time.time() - self.last_used[container_class] > self.idle_timeout
+                    if is_idle and not self.num_users.get(container_class):
+                        print(f'Container idle for {self.idle_timeout} seconds')
+                        self.stop(container_class)
+
+    def close(self):
+        self.closed.set()
+        if self.stop_on_close:
+            for container_class in list(self.running):
+                self.stop(container_class)
@@ -1,7 +1,14 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
 from .base import Base
 from main.config import config
 from main.utils.http import post
-from main.utils.file import File
+from main.utils.file import File, is_shared, upload
+
+BATCH_SIZE = 32  # clips per request
+MAX_BATCHES_IN_FLIGHT = 2  # the next batch is uploaded while the previous one is being transcribed
 
 
 class SpeechRecognition(Base):
@@ -9,10 +16,56 @@ class SpeechRecognition(Base):
     def __init__(self):
         super().__init__(name=config.SPEECH_RECOGNITION_NAME, port=config.SPEECH_RECOGNITION_PORT)
 
-    def transcribe(self, audio_path):
+    def transcribe(self, audio_path, start=None, end=None):
+        # start and end (seconds) transcribe a clip of the audio
+        files, data = upload(audio=audio_path)
         response = post(
             endpoint=f'{self.api}/transcribe/',
-            files={'audio': File(audio_path)},
+            files=files,
+            data={'start': start, 'end': end, **data}
         )
 
         return response
+
+    def transcribe_batch(self, audio_paths, spans=None):
+        # candidates of every clip in order, None for clips that failed
+        # spans are the (start, end) seconds of clips of shared files, the service only reads the clips
+        # the service returns the results of shared paths before those of uploaded files
+        spans = spans or [(None, None)] * len(audio_paths)
+        shared = [i for i, audio_path in enumerate(audio_paths) if is_shared(audio_path)]
+        uploaded = [i for i, audio_path in enumerate(audio_paths) if not is_shared(audio_path)]
+        if any([spans[i] != (None, None) for i in uploaded]):
+            raise ValueError('Clips of files outside of the shared volume must be cut before uploading')
+
+        response = post(
+            endpoint=f'{self.api}/transcribe/batch',
+            files=[('audio', File(audio_paths[i])) for i in uploaded],
+            data={
+                'audio_path': [os.path.realpath(audio_paths[i]) for i in shared],
+                'start': ['' if spans[i][0] is None else spans[i][0] for i in shared],
+                'end': ['' if spans[i][1] is None else spans[i][1] for i in shared]
+            }
+        )
+
+        results = [None] * len(audio_paths)
+        if response is None or response.status_code != HTTPStatus.OK:
+            return results
+
+        for i, result in zip(shared + uploaded, response.json()):
+            results[i] = result
+
+        return results
+
+    def transcribe_many(self, audio_paths, spans=None, batch_size=BATCH_SIZE,
+                        max_batches_in_flight=MAX_BATCHES_IN_FLIGHT):
+        # transcribes the clips in batches, batches are pipelined so the service is never waiting on an upload
+        spans = spans or [(None, None)] * len(audio_paths)
+        batches = [(audio_paths[i:i + batch_size], spans[i:i + batch_size])
+                   for i in range(0, len(audio_paths), batch_size)]
+
+        results = []
+        with ThreadPoolExecutor(max_workers=max_batches_in_flight) as executor:
+            for batch_results in executor.map(lambda batch: self.transcribe_batch(*batch), batches):
+                results.extend(batch_results)
+
+        return results
@@ -4,7 +4,7 @@ import subprocess
 
 from .base import Base
 from main.config import config
-from main.utils.file import File
+from main.utils.file import upload
 from main.utils.http import post, download_file
 
 
@@ -14,9 +14,19 @@ class SyncNet(Base):
         super().__init__(name=config.SYNC_NET_NAME, port=config.SYNC_NET_PORT)
 
     def find_synchronise(self, video_path, track):
+        files, data = upload(video=video_path)
         response = post(endpoint=f'{self.api}/synchronise/',
-                        files={'video': File(video_path)},
-                        data={'track': json.dumps(track)})
+                        files=files,
+                        data={'track': json.dumps(track), **data})
+
+        return response
+
+    def find_synchronise_tracks(self, video_path, tracks):
+        # {person id: track} evaluated in one request, returns the request id and {person id: sync results}
+        files, data = upload(video=video_path)
+        response = post(endpoint=f'{self.api}/synchronise/multi',
+                        files=files,
+                        data={'tracks': json.dumps(tracks), **data})
 
         return response
 
@@ -31,7 +41,9 @@ class SyncNet(Base):
         command = f'ffmpeg -hide_banner -loglevel error -y -i {input_video_path} -itsoffset {time_offset} -i {input_video_path} -map 0:v -map 1:a {output_video_path}'
         subprocess.call(command, shell=True, stdout=None)
 
-    def get_cropped_video(self, save_path):
-        download_file(endpoint=f'{self.api}/crop/',
+    def get_cropped_video(self, save_path, request_id, person_id=None):
+        # the crop of a synchronisation request, of a person of find_synchronise_tracks if given
+        download_file(endpoint=f'{self.api}/crop/?request_id={request_id}'
+                               + (f'&person_id={person_id}' if person_id is not None else ''),
                       request_type='get',
                       save_path=save_path)
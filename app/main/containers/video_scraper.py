@@ -1,6 +1,9 @@
+import os
+import uuid
+
 from .base import Base
 from main.config import config
-from main.utils.http import download_file, get
+from main.utils.http import download_file, get, post
 
 
 class VideoScraper(Base):
@@ -26,8 +29,18 @@ class VideoScraper(Base):
 
         return response.json()
 
+    def get_video_info(self, url, transcript=False):
+        # info JSON and english subtitle availability, optionally with the VTT - nothing else is downloaded
+        print(f'Getting video info at URL: {url}')
+        response = post(endpoint=f'{self.api}/videos/info',
+                        json={'url': url, 'transcript': transcript})
+
+        return response.json()
+
     def download_video(self, url):
         print(f'Downloading video at URL: {url}')
 
+        # unique save path - parallel workers download at the same time
         return download_file(endpoint=f'{self.api}/videos/download',
+                             save_path=os.path.join(config.DOWNLOADS_PATH, f'{uuid.uuid4()}.zip'),
                              json={'url': url})
@@ -1,32 +1,35 @@
 import argparse
-import os
 import shutil
-import tempfile
+import time
+import traceback
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from functools import partial
 from http import HTTPStatus
 
-from tqdm import tqdm
-
-from main.containers import FaceDetection, FaceRecognition, ForcedAlignment, HeadPoseEstimation, SpeechRecognition, \
-    SyncNet, VideoScraper
-from main.models import Video, Word
-from main.utils.audio import slice as slice_audio
-from main.utils.db import construct_db, Session as db_session
-from main.utils.enums import TranscriptType
-from main.utils.file import File, initialise_dirs
-from main.utils.time import time_to_millis, time_to_seconds
-from main.utils.transcript import is_similar
-from main.utils.video import combine_audio_and_video, convert, crop, extract_audio, get_centre_frame, get_num_frames, \
-    precise_slice, slice as slice_video
+from main.containers import ContainerManager, FaceDetection, FaceRecognition, ForcedAlignment, HeadPoseEstimation, \
+    SpeechRecognition, SyncNet, VideoScraper
+from main.containers.manager import IDLE_TIMEOUT
+from main.jobs import claim, complete, enqueue, fail, Lease, MAX_ATTEMPTS, POLL_INTERVAL, worker_id
+from main.models import Video
+from main.stages import checkpoint, completed, FACE_DETECTION_MODES, FACE_TRACKING_BACKENDS, slice_segments, STAGES, \
+    track_faces, WORD_VALIDATION_MODES
+from main.utils.db import BATCH_SIZE, construct_db, db_engine, Session as db_session, UnitOfWork
+from main.utils.enums import TranscriptType, VideoStage
+from main.utils.file import initialise_dirs
+from main.utils.metrics import metrics
+from main.utils.pipeline import Pipeline, QUEUE_SIZE, Stage
 from main.utils.vtt import extract_segments
 
-MIN_MAX_SYNCNET_CONFIDENCE = 5
-ASR_ENGLISH_CONFIDENCE = -10
+# containers used by harvest_url, shared between workers when running in parallel
+SERVICES = [VideoScraper, SpeechRecognition, FaceDetection, SyncNet, ForcedAlignment, HeadPoseEstimation,
+            FaceRecognition]
+
+worker_services = None  # container manager of a parallel worker process
 
 # TODO:
 #  SyncNet confidence too strict? Plot ROC curve to find optimal SyncNet confidence
 #  Fix hope-net, should be looking for majority angles rather than median
 #  Find out if words required? If not, just try finding videos where the start and end can have FA confidence < 0 and the rest > 0 (everything else thrown out)
-#  Youtube-dl should look at info first before downloading video, would be quicker
 
 
 def remove_video(s, _video):
@@ -36,10 +39,35 @@ def remove_video(s, _video):
     if _video.segments:
         for segment in _video.segments:
             s.delete(segment)
-        s.commit()
+    _video.stage = VideoStage.REJECTED
+    s.commit()
+
+
+def check_video_info(video_info, min_num_views=None, max_duration=None, manual_transcripts_only=False, **kwargs):
+    # returns the reason a video should be rejected using its metadata only, None if it passes
+    info, subtitles = video_info['info'], video_info['subtitles']
+
+    view_count = info.get('view_count')
+    if min_num_views and view_count is not None and view_count < min_num_views:
+        return f'Not enough views: {view_count} < {min_num_views}'
+
+    duration = info.get('duration')
+    if max_duration and duration is not None and duration > (max_duration * 60):  # convert mins to seconds
+        return f'Video too long: {duration / 60} mins > {max_duration} mins'
+
+    if not subtitles['manual'] and not subtitles['auto']:
+        return 'Video does not have transcript'
+
+    if manual_transcripts_only and not subtitles['manual']:
+        return 'Manual transcripts only'
 
 
-def harvest_url(**kwargs):
+def harvest_url(services=None, **kwargs):
+    if services is None:
+        # containers only need to live as long as this video
+        with ContainerManager(idle_timeout=None) as services:
+            return harvest_url(services=services, **kwargs)
+
     url, manual_transcripts_only, keep_non_speakers = kwargs['url'], kwargs['manual_transcripts_only'], \
                                                       kwargs['keep_non_speakers']
     print('\n*******************************************************************************')
@@ -47,375 +75,117 @@ def harvest_url(**kwargs):
     print('Manual Transcripts Only:', manual_transcripts_only)
     print('Keep Non Speakers:', keep_non_speakers)
 
-    # check if video has been done already
-    with db_session() as s:
+    # CPU time of the whole process, the segment stages run in other threads
+    with db_session(expire_on_commit=False) as s, \
+            metrics.timer('video', 'harvest', cpu_clock=time.process_time, url=url) as video_event:
+        # check if video has been done already
         video = s.query(Video).filter((Video.url == url)).first()
         if video:  # not None if exists
-            print(f'{url} already processed')
-            return
+            if not kwargs.get('resume') or video.stage in [VideoStage.COMPLETE, VideoStage.REJECTED]:
+                print(f'{url} already processed')
+                video_event['skipped'] = True
+                return
+            print(f'Resuming from stage: {video.stage.name}')
+        else:
+            try:
+                # check the metadata before spending bandwidth and disk on the download
+                with metrics.timer('video_stage', 'info', url=url), services.use(VideoScraper) as vs:
+                    rejection = check_video_info(vs.get_video_info(url=url), **kwargs)
+            except Exception as e:
+                print(f'Failed to get video info: {e}')
+                video_event['rejected'] = True
+                if kwargs.get('retry'):
+                    raise  # the job is retried later
+                return
+            if rejection:
+                print(rejection)
+                video_event['rejected'] = True
+                video = Video(url=url)
+                video.stage = VideoStage.REJECTED  # keep it in the database so it isn't checked again
+                s.add(video)
+                s.commit()
+                return
 
-    try:
-        # download video
-        with VideoScraper() as vs:
-            zip_path = vs.download_video(url=url)
-    except Exception as e:
-        print(f'Failed to scrape video: {e}')
-        return
+            video = Video(url=url)
+
+        if video.stage.value < VideoStage.DOWNLOADED.value:
+            if not video.is_scraped:
+                try:
+                    # download video
+                    with metrics.timer('video_stage', 'download', url=url), services.use(VideoScraper) as vs:
+                        zip_path = vs.download_video(url=url)
+                except Exception as e:
+                    print(f'Failed to scrape video: {e}')
+                    video_event['rejected'] = True
+                    if kwargs.get('retry'):
+                        raise  # the job is retried later
+                    return
+
+                # extract video zip
+                with metrics.timer('video_stage', 'extract', url=url):
+                    video.extract(zip_path=zip_path)
+            video.stage = VideoStage.DOWNLOADED
+            s.add(video)
+            s.commit()
 
-    with db_session() as s:
-        # extract video zip
-        video = Video(url=url)
-        video.extract(zip_path=zip_path)
-        s.add(video)
-        s.commit()
-
-        if video.has_info:
-            # check for view count
-            min_view_count = kwargs.get('min_num_views')
-            if min_view_count and video.view_count < min_view_count:
-                print(f'Not enough views: {video.view_count} < {min_view_count}')
+        if video.stage.value < VideoStage.SEGMENTED.value:
+            with metrics.timer('video_stage', 'segment', url=url) as event:
+                event['rejected'] = not segment_video(s, video, **kwargs)
+            if event['rejected']:
                 remove_video(s, video)
+                video_event['rejected'] = True
                 return
 
-            # check for duration
-            max_duration = kwargs.get('max_duration')
-            if max_duration and video.duration > (max_duration * 60):  # convert mins to seconds
-                print(f'Video too long: {video.duration / 60} mins > {max_duration} mins')
+        if video.stage.value < VideoStage.SEGMENTS_PROCESSED.value:
+            # create directories on disk
+            dirs = [video.data_path, video.segments_path,
+                    *[segment.data_path for segment in video.segments],
+                    *[segment.words_path for segment in video.segments]]
+            initialise_dirs(dirs)
+
+            # stream segments through the stages - each segment moves on as soon as its previous stage is done
+            # changes go through a unit of work because the stages run in separate threads
+            # they're committed in batches, segments resume after the last stage that was committed
+            session = UnitOfWork(s, batch_size=kwargs.get('batch_size') or BATCH_SIZE)
+            stage_kwargs = {'services': services, 'keep_non_speakers': keep_non_speakers,
+                            'word_validation': kwargs.get('word_validation') or 'clips',
+                            'face_tracking': kwargs.get('face_tracking')}
+            if kwargs.get('face_detection') == 'video':
+                # tracker state carries across segment boundaries, each frame is decoded and detected once
+                with metrics.timer('video_stage', 'face_tracking', url=url):
+                    stage_kwargs['face_tracks'] = track_faces(video, services,
+                                                              face_tracking=kwargs.get('face_tracking'))
+            pipeline = Pipeline(stages=[
+                Stage(name, partial(checkpoint(f, stage=stage, session=session), **stage_kwargs),
+                      done=partial(completed, stage=stage))
+                for name, f, stage in STAGES
+            ], queue_size=kwargs.get('queue_size') or QUEUE_SIZE, reject=session.delete)
+
+            print(f'\nProcessing {len(video.segments)} segments...')
+            with metrics.timer('video_stage', 'segments', cpu_clock=time.process_time, url=url,
+                               num_segments=len(video.segments)) as event:
+                try:
+                    segments = pipeline.run(slice_segments(video.segments), total=len(video.segments))
+                finally:
+                    session.commit()  # checkpoints of the segments done so far
+                if pipeline.failed:
+                    # not rejected, the video is left segmented so they start again from their last checkpoint
+                    raise Exception(f'{len(pipeline.failed)} segments failed, resume to retry them')
+                event['rejected'] = not segments
+            s.expire(video, ['segments'])  # rejected segments were deleted by the stages
+            print('Segments left:', len(segments))
+
+            if not segments:
                 remove_video(s, video)
+                video_event['rejected'] = True
                 return
 
-        if not video.has_transcript:
-            print(f'Video does not have transcript')
-            remove_video(s, video)
-            return
-
-        segments, is_transcript_auto_generated = extract_segments(vtt_path=video.transcript_path)
-
-        video.segments = segments
-        video.transcript_type = TranscriptType.AUTO if is_transcript_auto_generated else TranscriptType.MANUAL
-        s.commit()
-
-        print('Video transcript type:', video.transcript_type.name)
-        if manual_transcripts_only and video.transcript_type == TranscriptType.AUTO:
-            print('Manual transcripts only')
-            remove_video(s, video)
-            return
-
-        # create directories on disk
-        dirs = [video.data_path, video.segments_path,
-                *[segment.data_path for segment in video.segments],
-                *[segment.words_path for segment in video.segments]]
-        initialise_dirs(dirs)
-
-        # extract audio, video and transcript segments using timestamps
-        print(f'\nExtracting {len(video.segments)} video, audio and transcript segments...')
-        for segment in tqdm(video.segments):
-            slice_audio(audio_path=video.audio_path,
-                        start=time_to_millis(segment.start),
-                        end=time_to_millis(segment.end),
-                        output_path=segment.audio_path)
-            slice_video(video_path=video.video_path,
-                        start=time_to_seconds(segment.start),
-                        end=time_to_seconds(segment.end),
-                        output_path=segment.video_path)
-            combine_audio_and_video(video_path=segment.video_path,
-                                    audio_path=segment.audio_path,
-                                    combined_output_path=segment.combined_video_audio_path)
-            File(segment.transcript_path).write(segment.text)
-
-        # check language spoken in segments - run through ASR
-        # 1) check if there's an ASR transcript
-        # 2) check if ASR confidence meets threshold
-        # 3) check if manual and ASR transcript are somewhat similar
-        with SpeechRecognition() as asr:
-            for segment in tqdm(video.segments):
-                response = asr.transcribe(segment.audio_path)
-                response = response.json()
-                if response['transcript'].strip() and \
-                        response['confidence'] >= ASR_ENGLISH_CONFIDENCE and \
-                        is_similar(segment.text, response['transcript']):
-                    segment.asr_text = response['transcript']
-                    segment.asr_confidence = response['confidence']
-                else:
-                    s.delete(segment)
-                s.commit()
-            print('Segments left:', len(video.segments))
-
-        if not video.segments:
-            remove_video(s, video)
-            return
-
-        # run face detection and tracking on the segment
-        # remove segment if no people detected
-        with FaceDetection() as fd:
-            for segment in tqdm(video.segments):
-                response = fd.detect(video_path=segment.combined_video_audio_path)
-                segment.frame_detections = response.json()
-                if segment.get_num_people() == 0:
-                    s.delete(segment)
-                s.commit()
-            print('Segments left:', len(video.segments))
-
-        if not video.segments:
-            remove_video(s, video)
-            return
-
-        # find out who the speaker is in the segments
-        with SyncNet() as sn:
-            for segment in tqdm(video.segments):
-                num_frames = get_num_frames(segment.combined_video_audio_path)
-                frame_detections = segment.frame_detections
-                assert num_frames == len(frame_detections)
-
-                # create tracks from frame detections
-                people_detections = {_id: [] for _id in range(segment.get_num_people())}
-                for frame_id, detections in frame_detections.items():
-                    for people_id, detection in detections.items():
-                        people_detections[int(people_id)].append({
-                            k: v for k, v in zip(['x1', 'y1', 'x2', 'y2'], detection)
-                        })
-
-                # get sync results from tracks of same length of video
-                people_sync_results = {}
-                for person_id, detections in people_detections.items():
-                    detection_frames_ratio = len(detections) / num_frames
-                    if detection_frames_ratio == 1:
-                        sync_response = sn.find_synchronise(
-                            video_path=segment.combined_video_audio_path,
-                            track=detections
-                        )
-                        if sync_response.status_code == HTTPStatus.OK:
-                            sync_results = sync_response.json()
-                            people_sync_results[person_id] = sync_results
-
-                            # download cropped video from sync-net API
-                            cropped_video_path = os.path.join(segment.data_path,
-                                                              f'cropped_person_{person_id}.avi')
-                            sn.get_cropped_video(save_path=cropped_video_path)
-                            people_sync_results[person_id]['cropped_video_path'] = cropped_video_path
-
-                if len(people_sync_results) > 0:
-                    # get person with max confidence - they are the speaker
-                    speaker = None
-                    max_confidence = 0
-                    for person_id, sync_results in people_sync_results.items():
-                        confidence = sync_results['confidence']
-                        if confidence > max_confidence:
-                            max_confidence = confidence
-                            speaker = person_id
-
-                    # check how high the max confidence is
-                    # i.e. small max confidence indicates speaker not that person
-                    if max_confidence >= MIN_MAX_SYNCNET_CONFIDENCE:
-                        segment.sync_confidence = max_confidence
-                        s.commit()
-
-                        # now sync the video by the offset of the speaker
-                        av_offset = people_sync_results[speaker]['offset']
-                        sn.synchronise(
-                            input_video_path=people_sync_results[speaker]['cropped_video_path'],
-                            output_video_path=segment.speaker_video_path,
-                            frame_offset=av_offset
-                        )
-
-                        # delete speaker cropped video
-                        os.remove(people_sync_results[speaker]['cropped_video_path'])
-                        del people_sync_results[speaker]
-
-                        if keep_non_speakers:
-                            for non_speaker_id, sync_results in people_sync_results.items():
-                                # convert avi to mp4
-                                convert(
-                                    input_video_path=sync_results['cropped_video_path'],
-                                    output_video_path=sync_results['cropped_video_path'].replace('.avi', '.mp4')
-                                )
-
-                        # delete other avi cropped videos that aren't the speaker cropped video
-                        for non_speaker_id, sync_results in people_sync_results.items():
-                            os.remove(sync_results['cropped_video_path'])
-
-                        # crop speaker again but make the bounding box bigger
-                        # this allows other services to make detections easier
-                        crop(
-                            input_video_path=segment.combined_video_audio_path,
-                            output_video_path=segment.speaker_video_path_bigger,
-                            track=[[d['x1'], d['y1'], d['x2'], d['y2']] for d in people_detections[speaker]],
-                            height=250,
-                            width=250,
-                            x_pad=30,
-                            y_pad=50
-                        )
-
-                        # convert cropped speaker avi to mp4 for browser viewing reasons
-                        convert(
-                            input_video_path=segment.speaker_video_path,
-                            output_video_path=segment.speaker_video_path_mp4
-                        )
-
-                        # extract cropped speaker audio for forced alignment
-                        extract_audio(
-                            video_path=segment.speaker_video_path,
-                            output_audio_path=segment.speaker_audio_path,
-                            audio_codec='pcm_s16le'
-                        )
-                    else:
-                        # delete segment - max syncnet confidence too small
-                        s.delete(segment)
-                        s.commit()
-                else:
-                    # delete segment - no sync results
-                    s.delete(segment)
-                    s.commit()
-
-            print('Segments left:', len(video.segments))
-
-        if not video.segments:
-            remove_video(s, video)
-            return
-
-        # ------------------ POST-PROCESSING ------------------
-
-        # run forced alignment between audio and transcript
-        # subtitles may not be in sync with audio
-        # only do this with automatic transcripts
-        """
-        Forced alignment only uses WAV:PCM format
-        Need to convert using the command (check out sync-net preprocessing for a similar command):
-        ffmpeg -y -i cropped_speaker.avi -vn -acodec pcm_s16le cropped_speaker.wav
-
-        Interesting comment about millisecond slicing video and audio:
-        https://superuser.com/questions/1257914/ffmpeg-cut-videos-with-millisecond-accuracy-without-audio#comment1849491_1257914
-        """
-        with ForcedAlignment() as fa:
-            for segment in tqdm(video.segments):
-                response = fa.align(
-                    audio_path=segment.speaker_audio_path,
-                    transcript=segment.text
-                )
-                if response.status_code == HTTPStatus.OK:
-                    response = response.json()
-                    segment.update(
-                        fa_log_likelihood=response['av_log_likelihood_per_frame'],
-                        fa_alignment=response['alignment']
-                    )
-                else:
-                    s.delete(segment)
-                s.commit()
-
-        # # check forced alignment word confidences
-        # # i.e. if words in middle of transcript have confidence < -5, remove segment
-        # # ok for words at start or end to < min confidence, just remove them
-        # for segment in tqdm(video.segments):
-        #     # find all words with bad scores
-        #     removed_word_indices = []
-        #     for i, alignment in enumerate(segment.fa_alignment):
-        #         score = alignment[-1]
-        #         if score < 0:
-        #             removed_word_indices.append(i)
-        #
-        #     # check if all bad words are linked to start or end
-        #     num_words = len(segment.fa_alignment)
-        #     all_linked = True
-        #     for index in removed_word_indices:
-        #         if all([j in removed_word_indices for j in range(index+1)]) or \
-        #             all([j in removed_word_indices for j in range(index, num_words)]):
-        #             continue
-        #         else:
-        #             all_linked = False
-        #             break
-        #
-        #     # remove segment if we have bad middle words, else trim text
-        #     if all_linked:
-        #         segment_words = segment.text.split(' ')
-        #         segment_words = [word for i, word in enumerate(segment_words) if i not in removed_word_indices]
-        #         segment.trimmed_text = ' '.join(segment_words)
-        #     else:
-        #         s.delete(segment)
-        #     s.commit()
-
-        #     # checks forced alignment word confidences
-        #     # i.e. remove words with less confidence
-        #     for segment in tqdm(video.segments):
-        #         removed_words = []
-        #         for i, alignment in enumerate(segment.fa_alignment):
-        #             score = alignment[-1]
-        #             if score < 0:
-        #                 removed_words.append(i)
-        #         segment_words = segment.text.split(' ')
-        #         segment_words = [word for i, word in enumerate(segment_words) if i not in removed_words]
-        #         segment.text = ' '.join(segment_words)
-        #         s.commit()
-        #
-        #     # run forced alignment again
-        #     for segment in tqdm(video.segments):
-        #         response = fa.align(
-        #             audio_path=segment.speaker_audio_path,
-        #             transcript=segment.text
-        #         )
-        #         if response.status_code == HTTPStatus.OK:
-        #             response = response.json()
-        #             segment.update(
-        #                 fa_log_likelihood=response['av_log_likelihood_per_frame'],
-        #                 fa_alignment=response['alignment']
-        #             )
-        #         else:
-        #             s.delete(segment)
-        #         s.commit()
-
-        # slice words and run through ASR to validate
-        with SpeechRecognition() as asr:
-            for segment in tqdm(video.segments):
-                for i, (text, start_time, end_time, score) in enumerate(segment.fa_alignment):
-                    word = Word(text=text, segment_id=segment.id)
-                    s.add(word)
-                    s.commit()
-
-                    precise_slice(
-                        video_path=segment.speaker_video_path,
-                        start=start_time,
-                        end=end_time,
-                        output_path=word.video_path
-                    )
-                    return_code = convert(
-                        input_video_path=word.video_path,
-                        output_video_path=word.video_path_mp4
-                    )
-                    if return_code != 0 and os.path.exists(word.video_path_mp4):
-                        s.delete(word)
-                        s.commit()
-                        continue
-
-                    # extract audio and run ASR on word
-                    extract_audio(
-                        video_path=word.video_path,
-                        output_audio_path=word.audio_path,
-                        audio_codec='pcm_s16le'
-                    )
-                    asr_response = asr.transcribe(audio_path=word.audio_path)
-                    if asr_response.status_code != HTTPStatus.OK:
-                        s.delete(word)
-                        s.commit()
-                        continue
-
-                    asr_response = asr_response.json()
-                    word.asr_text = asr_response['transcript']
-                    word.asr_confidence = asr_response['confidence']
-                    s.commit()
-
-                    os.remove(word.video_path)
-                    os.remove(word.audio_path)
-
-        # find head pose estimation
-        with HeadPoseEstimation() as hpe:
-            for segment in tqdm(video.segments):
-                response = hpe.estimate(segment.speaker_video_path_bigger)
-                if response.status_code == HTTPStatus.OK:
-                    segment.update(**response.json())
-                    s.commit()
+            video.stage = VideoStage.SEGMENTS_PROCESSED
+            s.commit()
 
         # run face recognition across segments for local identity matching
         segment_embeddings = {}
-        with FaceRecognition() as fr:
+        with metrics.timer('video_stage', 'face_recognition', url=url), services.use(FaceRecognition) as fr:
             for segment in video.segments:
                 response = fr.get_embeddings_by_video(segment.speaker_video_path_bigger)
                 if response.status_code == HTTPStatus.OK:
@@ -426,8 +196,183 @@ def harvest_url(**kwargs):
             video.num_people = num_people
             for segment in video.segments:
                 segment.local_identity = segment_to_identities.get(segment.data_path, -1)  # -1 = no identity
+            video.stage = VideoStage.COMPLETE
             s.commit()
 
+        # hours of data harvested per hour
+        video_event['num_segments'] = len(video.segments)
+        video_event['data_duration'] = sum([segment.duration for segment in video.segments])
+
+
+def segment_video(s, video, **kwargs):
+    # returns True if the video was split into transcript segments
+    if video.has_info:
+        # check for view count
+        min_view_count = kwargs.get('min_num_views')
+        if min_view_count and video.view_count < min_view_count:
+            print(f'Not enough views: {video.view_count} < {min_view_count}')
+            return False
+
+        # check for duration
+        max_duration = kwargs.get('max_duration')
+        if max_duration and video.duration > (max_duration * 60):  # convert mins to seconds
+            print(f'Video too long: {video.duration / 60} mins > {max_duration} mins')
+            return False
+
+    if not video.has_transcript:
+        print(f'Video does not have transcript')
+        return False
+
+    # segments left over from an interrupted run
+    for segment in video.segments:
+        s.delete(segment)
+
+    segments, is_transcript_auto_generated = extract_segments(vtt_path=video.transcript_path)
+
+    video.segments = segments
+    video.transcript_type = TranscriptType.AUTO if is_transcript_auto_generated else TranscriptType.MANUAL
+    s.commit()
+
+    print('Video transcript type:', video.transcript_type.name)
+    if kwargs.get('manual_transcripts_only') and video.transcript_type == TranscriptType.AUTO:
+        print('Manual transcripts only')
+        return False
+
+    video.stage = VideoStage.SEGMENTED
+    s.commit()
+
+    return True
+
+
+def harvest_url_isolated(url, services=None, **kwargs):
+    # a failing URL shouldn't take down the rest of the harvest
+    try:
+        harvest_url(url=url, services=services or worker_services, **kwargs)
+
+        return True
+    except Exception as e:
+        print(f'Failed to harvest {url}: {e}')
+        traceback.print_exc()
+
+        return False
+    finally:
+        metrics.write_textfile()
+
+
+def harvest_jobs(services=None, **kwargs):
+    # harvests jobs claimed from the queue until it's empty, or forever when waiting for new jobs
+    # returns the no. jobs harvested and failed
+    worker = worker_id()
+    num_harvested, num_failed = 0, 0
+
+    while True:
+        with db_session(expire_on_commit=False) as s:
+            job = claim(s, worker=worker)
+        if job is None:
+            if not kwargs.get('wait'):
+                break
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        print(f'\nClaimed job {job.id} ({job.source}), attempt {job.attempts}/{job.max_attempts}')
+        with Lease(job, worker=worker):
+            # options of the job's source take precedence
+            # videos that couldn't be scraped are failed so the job is retried instead of dropped
+            # a retried or reclaimed job picks its video up at the last checkpoint of the previous attempt
+            succeeded = harvest_url_isolated(**{**kwargs, **(job.options or {}), 'url': job.url, 'retry': True,
+                                                'resume': True}, services=services)
+
+        with db_session(expire_on_commit=False) as s:
+            if succeeded:
+                released = complete(s, job, worker=worker)
+                num_harvested += 1
+            else:
+                released = fail(s, job, worker=worker, error='Harvest failed')
+                num_failed += 1
+        if not released:
+            print(f'\nLost the lease of job {job.id}, left to the worker that claimed it')
+
+    return num_harvested, num_failed
+
+
+def init_worker():
+    global worker_services
+
+    # forked workers must not reuse the parent's database connections
+    db_engine.dispose()
+
+    # containers are started/stopped by the parent process
+    worker_services = ContainerManager(idle_timeout=None, stop_on_close=False)
+
+
+def harvest_urls(urls, **kwargs):
+    num_workers = kwargs.get('workers') or 1
+    num_failed = 0
+
+    if num_workers == 1:
+        # containers stay warm between videos, stopped only after being idle
+        with ContainerManager(idle_timeout=kwargs.get('idle_timeout', IDLE_TIMEOUT)) as services:
+            for url in urls:
+                num_failed += not harvest_url_isolated(url=url, services=services, **kwargs)
+        print(f'Harvested {len(urls) - num_failed}/{len(urls)} URLs')
+        metrics.summary()
+        return
+
+    # start every service once up-front and keep it up for the whole run
+    # the parent can't see when workers use a container so there is no idle timeout
+    with ContainerManager(idle_timeout=None) as services:
+        services.start(*SERVICES)
+
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker) as executor:
+            futures = {executor.submit(harvest_url_isolated, url, **kwargs): url for url in urls}
+            for future in as_completed(futures):
+                try:
+                    succeeded = future.result()
+                except BaseException as e:  # e.g. worker exited
+                    print(f'Worker failed on {futures[future]}: {e}')
+                    succeeded = False
+                num_failed += not succeeded
+
+    print(f'Harvested {len(urls) - num_failed}/{len(urls)} URLs using {num_workers} workers')
+    print(f'Metrics of each worker written to {metrics.metrics_path}')
+
+
+def harvest_worker(**kwargs):
+    # harvests jobs from the queue, several nodes can run workers against the same database
+    num_workers = kwargs.get('workers') or 1
+
+    if num_workers == 1:
+        with ContainerManager(idle_timeout=kwargs.get('idle_timeout', IDLE_TIMEOUT)) as services:
+            num_harvested, num_failed = harvest_jobs(services=services, **kwargs)
+        print(f'Harvested {num_harvested} jobs, {num_failed} failed')
+        metrics.summary()
+        return
+
+    num_harvested, num_failed = 0, 0
+    with ContainerManager(idle_timeout=None) as services:
+        services.start(*SERVICES)
+
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker) as executor:
+            futures = [executor.submit(harvest_jobs, **kwargs) for _ in range(num_workers)]
+            for future in as_completed(futures):
+                try:
+                    _num_harvested, _num_failed = future.result()
+                    num_harvested += _num_harvested
+                    num_failed += _num_failed
+                except BaseException as e:  # e.g. worker exited, its job is picked up again once its lease expires
+                    print(f'Worker failed: {e}')
+
+    print(f'Harvested {num_harvested} jobs, {num_failed} failed using {num_workers} workers')
+
+
+def harvest_or_enqueue(urls, source, **kwargs):
+    if kwargs.get('enqueue'):
+        with db_session() as s:
+            enqueue(s, urls, source=source, **kwargs)
+        return
+
+    harvest_urls(urls, **kwargs)
+
 
 def harvest_channel(**kwargs):
     channel_id = kwargs['channel_id']
@@ -435,8 +380,7 @@ def harvest_channel(**kwargs):
     with VideoScraper() as vs:
         urls = vs.get_channel_urls(channel_id=channel_id)
 
-    for url in urls:
-        harvest_url(url=url, **kwargs)
+    harvest_or_enqueue(urls, source=f'channel:{channel_id}', **kwargs)
 
 
 def harvest_user(**kwargs):
@@ -445,8 +389,7 @@ def harvest_user(**kwargs):
     with VideoScraper() as vs:
         urls = vs.get_user_urls(user_id=channel_user)
 
-    for url in urls:
-        harvest_url(url=url, **kwargs)
+    harvest_or_enqueue(urls, source=f'user:{channel_user}', **kwargs)
 
 
 def harvest_playlist(**kwargs):
@@ -455,8 +398,7 @@ def harvest_playlist(**kwargs):
     with VideoScraper() as vs:
         urls = vs.get_playlist_urls(playlist_id=playlist_id)
 
-    for url in urls:
-        harvest_url(url=url, **kwargs)
+    harvest_or_enqueue(urls, source=f'playlist:{playlist_id}', **kwargs)
 
 
 def main(args):
@@ -464,7 +406,8 @@ def main(args):
         'url': harvest_url,
         'channel_id': harvest_channel,
         'channel_user': harvest_user,
-        'playlist_id': harvest_playlist
+        'playlist_id': harvest_playlist,
+        'worker': harvest_worker
     }
     run_type = args.run_type
 
@@ -472,8 +415,19 @@ def main(args):
         print(f'Choose from {list(f.keys())}')
         exit()
 
+    construct_db()  # creates the job queue table if missing
+
+    if run_type == 'url' and args.enqueue:
+        with db_session() as s:
+            enqueue(s, [args.url], source='url', **args.__dict__)
+        return
+
     f[run_type](**args.__dict__)
 
+    if run_type == 'url':
+        metrics.write_textfile()
+        metrics.summary()
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -481,6 +435,20 @@ if __name__ == '__main__':
     parser.add_argument('--min_num_views', type=int, default=None)
     parser.add_argument('--max_duration', type=int, default=None)
     parser.add_argument('--keep_non_speakers', action='store_true')
+    parser.add_argument('--workers', type=int, default=1)  # no. videos harvested in parallel
+    parser.add_argument('--idle_timeout', type=int, default=IDLE_TIMEOUT)  # seconds before idle containers stop
+    parser.add_argument('--queue_size', type=int, default=QUEUE_SIZE)  # max. segments waiting on each stage
+    parser.add_argument('--resume', action='store_true')  # pick up interrupted videos at their last stage
+    parser.add_argument('--batch_size', type=int, default=BATCH_SIZE)  # db changes per commit, 1 commits every change
+    # clips: ASR on every word clip, timings: match to the segment's ASR word timings, no word videos are cut
+    parser.add_argument('--word_validation', choices=WORD_VALIDATION_MODES, default='clips')
+    # segments: track faces in every segment, video: track the whole video once and slice segments from it
+    parser.add_argument('--face_detection', choices=FACE_DETECTION_MODES, default='segments')
+    parser.add_argument('--face_tracking', choices=FACE_TRACKING_BACKENDS)  # the service's default if not given
+    parser.add_argument('--enqueue', action='store_true')  # add URLs to the job queue instead of harvesting them
+    parser.add_argument('--priority', type=int, default=0)  # of enqueued jobs, higher first
+    parser.add_argument('--max_attempts', type=int, default=MAX_ATTEMPTS)  # of enqueued jobs
+    parser.add_argument('--wait', action='store_true')  # workers wait for new jobs when the queue is empty
 
     sub_parsers = parser.add_subparsers(dest='run_type')
 
@@ -496,4 +464,6 @@ if __name__ == '__main__':
     parser_4 = sub_parsers.add_parser('playlist_id')
     parser_4.add_argument('playlist_id')
 
+    sub_parsers.add_parser('worker')  # harvests jobs from the queue
+
     main(parser.parse_args())
@@ -7,12 +7,10 @@ from tqdm import tqdm
 
 from main.models import Segment, Video
 from main.containers import FaceDetection, FaceRecognition, SyncNet
-from main.utils.audio import slice as slice_audio
 from main.utils.db import construct_db, Session as db_session
 from main.utils.file import initialise_dirs
-from main.utils.time import int_to_time, time_to_millis, time_to_seconds
-from main.utils.video import combine_audio_and_video, convert, crop, extract_audio, get_duration, get_num_frames, \
-    slice as slice_video
+from main.utils.time import int_to_time, time_to_seconds
+from main.utils.video import convert, crop, extract_audio, get_duration, get_num_frames, multi_slice
 
 MIN_MAX_SYNCNET_CONFIDENCE = 5
 
@@ -49,34 +47,17 @@ def main(args):
 
         # TODO: tidy these up between files
         print('Slicing video...')
-        import time
-        for segment in tqdm(video.segments):
-
-            # TODO: Slicing is so slow, make it faster
-            start = time.time()
-            slice_audio(audio_path=video.audio_path,
-                        start=time_to_millis(segment.start),
-                        end=time_to_millis(segment.end),
-                        output_path=segment.audio_path)
-            print('Slice audio', time.time() - start)
-            start = time.time()
-            slice_video(video_path=video.video_path,
-                        start=time_to_seconds(segment.start),
-                        end=time_to_seconds(segment.end),
-                        output_path=segment.video_path)
-            print('Slice video', time.time() - start)
-            start = time.time()
-            combine_audio_and_video(video_path=segment.video_path,
-                                    audio_path=segment.audio_path,
-                                    combined_output_path=segment.combined_video_audio_path)
-            print('Combine', time.time() - start)
+        multi_slice(video_path=video.video_path,
+                    audio_path=video.audio_path,
+                    slices=[(time_to_seconds(segment.start), time_to_seconds(segment.end), segment.video_path,
+                             segment.audio_path, segment.combined_video_audio_path) for segment in video.segments])
 
         # run face detection and tracking on segments
         # remove segment if no people detected
         with FaceDetection() as fd:
             for segment in tqdm(video.segments):
                 response = fd.detect(video_path=segment.combined_video_audio_path)
-                segment.frame_detections = response.json()
+                segment.update(frame_detections=response.json())
                 if segment.get_num_people() == 0:
                     s.delete(segment)
                 s.commit()
@@ -86,16 +67,12 @@ def main(args):
         with SyncNet() as sn:
             for segment in tqdm(video.segments):
                 num_frames = get_num_frames(segment.combined_video_audio_path)
-                frame_detections = segment.frame_detections
-                assert num_frames == len(frame_detections)
 
-                # create tracks from frame detections
-                people_detections = {_id: [] for _id in range(segment.get_num_people())}
-                for frame_id, detections in frame_detections.items():
-                    for people_id, detection in detections.items():
-                        people_detections[int(people_id)].append({
-                            k: v for k, v in zip(['x1', 'y1', 'x2', 'y2'], detection)
-                        })
+                # create tracks from detections
+                people_detections = {
+                    person_id: [dict(zip(['x1', 'y1', 'x2', 'y2'], box)) for box in track[:, 1:].tolist()]
+                    for person_id, track in segment.get_tracks().items()
+                }
 
                 # get sync results from tracks of same length of video
                 people_sync_results = {}
@@ -113,7 +90,8 @@ def main(args):
                             # download cropped video from sync-net API
                             cropped_video_path = os.path.join(segment.data_path,
                                                               f'cropped_person_{person_id}.avi')
-                            sn.get_cropped_video(save_path=cropped_video_path)
+                            sn.get_cropped_video(save_path=cropped_video_path,
+                                                 request_id=sync_results.pop('request_id'))
                             people_sync_results[person_id]['cropped_video_path'] = cropped_video_path
 
                 if len(people_sync_results) > 0:
@@ -0,0 +1,167 @@
+"""
+Job queue of URLs to harvest, shared by every harvest node through the database
+
+Workers claim the highest priority pending job with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent claims never
+block on or return the same job. A claimed job is leased to its worker, the lease is renewed while the job runs.
+The job of a worker that died becomes claimable again once its lease expires. Failed jobs are retried with backoff
+up to their max attempts.
+"""
+import datetime
+import os
+import socket
+import threading
+import uuid
+
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects.postgresql import insert
+
+from main.models import HarvestJob
+from main.utils.db import Session as db_session
+from main.utils.enums import JobStatus
+
+LEASE_DURATION = 600  # seconds
+HEARTBEAT_INTERVAL = 60  # seconds between lease renewals
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 60  # seconds, doubled after every attempt
+POLL_INTERVAL = 10  # seconds between claims when waiting on an empty queue
+
+# options of a source that are stored with its jobs
+JOB_OPTIONS = ['manual_transcripts_only', 'min_num_views', 'max_duration', 'keep_non_speakers']
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def now():
+    return datetime.datetime.utcnow()
+
+
+def enqueue(s, urls, source=None, priority=0, max_attempts=MAX_ATTEMPTS, **kwargs):
+    # URLs already in the queue are left as they are, returns the no. jobs added
+    urls = list(dict.fromkeys(urls))  # unique, keeps order
+    if not urls:
+        return 0
+
+    options = {k: kwargs[k] for k in JOB_OPTIONS if kwargs.get(k) is not None}
+    created_at = now()
+    statement = insert(HarvestJob.__table__).values([{
+        'id': uuid.uuid4(),
+        'url': url,
+        'source': source,
+        'options': options,
+        'priority': priority,
+        'status': JobStatus.PENDING.value,
+        'attempts': 0,
+        'max_attempts': max_attempts,
+        'available_at': created_at,
+        'created_at': created_at,
+        'updated_at': created_at
+    } for url in urls]).on_conflict_do_nothing(index_elements=['url'])
+    result = s.execute(statement)
+    s.commit()
+
+    print(f'Queued {result.rowcount}/{len(urls)} URLs from {source}')
+
+    return result.rowcount
+
+
+def claim(s, worker, lease_duration=LEASE_DURATION):
+    # returns the next job leased to the worker, None if there is nothing to do
+    # jobs whose lease expired after their last attempt are given up on first
+    s.query(HarvestJob).filter(
+        HarvestJob.status == JobStatus.RUNNING,
+        HarvestJob.lease_expires_at < now(),
+        HarvestJob.attempts >= HarvestJob.max_attempts
+    ).update({'status': JobStatus.FAILED.value, 'error': 'Lease expired', 'lease_expires_at': None,
+              'updated_at': now()}, synchronize_session=False)
+    s.commit()
+
+    job = s.query(HarvestJob).filter(
+        or_(
+            and_(HarvestJob.status == JobStatus.PENDING, HarvestJob.available_at <= now()),
+            and_(HarvestJob.status == JobStatus.RUNNING, HarvestJob.lease_expires_at < now())
+        )
+    ).order_by(
+        HarvestJob.priority.desc(), HarvestJob.created_at
+    ).with_for_update(skip_locked=True).first()
+
+    if job is None:
+        s.rollback()
+        return None
+
+    job.update(status=JobStatus.RUNNING, attempts=job.attempts + 1, worker=worker,
+               lease_expires_at=now() + datetime.timedelta(seconds=lease_duration))
+    s.commit()
+
+    return job
+
+
+def renew(s, job_id, worker, lease_duration=LEASE_DURATION):
+    # returns False if the job is no longer leased to the worker
+    num_renewed = s.query(HarvestJob).filter(
+        HarvestJob.id == job_id,
+        HarvestJob.worker == worker,
+        HarvestJob.status == JobStatus.RUNNING
+    ).update({'lease_expires_at': now() + datetime.timedelta(seconds=lease_duration)}, synchronize_session=False)
+    s.commit()
+
+    return num_renewed == 1
+
+
+def release(s, job, worker, **values):
+    # updates the job only while it's still leased to the worker, it may have been claimed by another since
+    # returns False if the lease was lost
+    num_updated = s.query(HarvestJob).filter(
+        HarvestJob.id == job.id,
+        HarvestJob.worker == worker,
+        HarvestJob.status == JobStatus.RUNNING
+    ).update({**values, 'lease_expires_at': None, 'updated_at': now()}, synchronize_session=False)
+    s.commit()
+
+    return num_updated == 1
+
+
+def complete(s, job, worker):
+    return release(s, job, worker, status=JobStatus.DONE.value, error=None)
+
+
+def fail(s, job, worker, error):
+    # back to the queue until out of attempts
+    if job.attempts < job.max_attempts:
+        delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+        return release(s, job, worker, status=JobStatus.PENDING.value, error=error,
+                       available_at=now() + datetime.timedelta(seconds=delay))
+
+    return release(s, job, worker, status=JobStatus.FAILED.value, error=error)
+
+
+class Lease:
+    """Renews the lease of a job in the background while it runs"""
+
+    def __init__(self, job, worker, lease_duration=LEASE_DURATION, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.job_id = job.id
+        self.worker = worker
+        self.lease_duration = lease_duration
+        self.heartbeat_interval = heartbeat_interval
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self.heartbeat, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+
+        return self
+
+    def __exit__(self, *args):
+        self.finished.set()
+        self.thread.join()
+
+    def heartbeat(self):
+        while not self.finished.wait(self.heartbeat_interval):
+            try:
+                with db_session() as s:
+                    if not renew(s, self.job_id, self.worker, self.lease_duration):
+                        print(f'\nLost the lease of job {self.job_id}')
+                        return
+            except Exception as e:
+                print(f'\nFailed to renew the lease of job {self.job_id}: {e}')
@@ -1 +1,3 @@
 from .video import VideoMixin
+
+__all__ = ['VideoMixin']
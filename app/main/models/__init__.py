@@ -1,4 +1,7 @@
 from .base import Base
+from .harvest_job import HarvestJob
 from .segment import Segment
 from .video import Video
 from .word import Word
+
+__all__ = ['Base', 'HarvestJob', 'Segment', 'Video', 'Word']
@@ -0,0 +1,29 @@
+import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, JSON, String
+
+from .base import Base
+from main.utils.enums import JobStatus
+from main.utils.fields import IntEnum
+
+
+class HarvestJob(Base):
+
+    __tablename__ = 'harvest_jobs'
+    __table_args__ = (
+        Index('ix_harvest_jobs_claim', 'status', 'priority', 'created_at'),
+    )
+
+    url = Column(String, unique=True, nullable=False)  # a URL is only ever queued once
+    source = Column(String)  # where the URL came from e.g. channel:<id>
+    options = Column(JSON)  # harvest options of the source e.g. manual_transcripts_only
+    priority = Column(Integer, default=0)  # higher first
+    status = Column(IntEnum(JobStatus), default=JobStatus.PENDING)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer)
+    available_at = Column(DateTime, default=datetime.datetime.utcnow)  # not claimed before e.g. retry backoff
+    lease_expires_at = Column(DateTime)  # a running job with an expired lease was abandoned by its worker
+    worker = Column(String)
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
@@ -5,14 +5,15 @@ from glob import glob
 from os.path import exists, join
 
 import cv2
+import numpy as np
 from sqlalchemy import event, Float, Integer, Time, Column, ForeignKey, String
 from sqlalchemy.dialects.postgresql import JSON, UUID
 from sqlalchemy.orm import relationship
 
 from .base import Base
 from main.mixins import VideoMixin
-from main.utils.enums import Gender, HeadPoseDirection
-from main.utils.fields import IntEnum
+from main.utils.enums import Gender, HeadPoseDirection, SegmentStage
+from main.utils.fields import IntEnum, NumpyArray
 from main.utils.file import File, JSONFile
 from main.utils.video import show as show_video
 
@@ -25,8 +26,11 @@ class Segment(Base, VideoMixin):
     start = Column(Time)
     end = Column(Time)
     text = Column(String)
-    frame_detections = Column(JSON)
+    frame_detections = Column(JSON)  # frame -> person -> box, segments harvested before detections
+    detections = Column(NumpyArray(np.int16))  # rows of frame, person, x1, y1, x2, y2
+    num_people = Column(Integer)
     sync_confidence = Column(Float)
+    sync_offset = Column(Integer)  # frames the speaker's audio was shifted by
     pitch = Column(Float)
     roll = Column(Float)
     yaw = Column(Float)
@@ -36,8 +40,10 @@ class Segment(Base, VideoMixin):
     local_identity = Column(Integer)
     asr_text = Column(String)
     asr_confidence = Column(Float)
+    asr_words = Column(JSON)  # [{word, start_time, duration}] of the best candidate
     fa_log_likelihood = Column(Float)
     fa_alignment = Column(JSON)
+    stage = Column(IntEnum(SegmentStage), default=SegmentStage.NO_STAGE)
 
     # foreign keys
     video_id = Column(UUID(as_uuid=True), ForeignKey('videos.id'))
@@ -50,6 +56,7 @@ class Segment(Base, VideoMixin):
         self.start = start
         self.end = end
         self.text = text
+        self.stage = SegmentStage.NO_STAGE
 
     @property
     def data_path(self):
@@ -107,13 +114,35 @@ class Segment(Base, VideoMixin):
 
         return (end - start).total_seconds()
 
+    @staticmethod
+    def to_detections(frame_detections):
+        # frame -> person -> box from the face detection service to rows
+        detections = [[int(frame_id), int(person_id), *box]
+                      for frame_id, people in frame_detections.items()
+                      for person_id, box in people.items()]
+
+        return np.asarray(detections, dtype=np.int16).reshape(-1, 6)
+
+    def get_detections(self):
+        if self.detections is None and self.frame_detections is not None:
+            return self.to_detections(self.frame_detections)
+
+        return self.detections
+
     def get_num_people(self):
-        frame_detections = self.frame_detections
-        people_ids = set()
-        for frame_number, detections in frame_detections.items():
-            people_ids = people_ids.union(set(list(detections.keys())))
+        if self.num_people is None:
+            return len(np.unique(self.get_detections()[:, 1]))
+
+        return self.num_people
+
+    def get_tracks(self):
+        # person -> rows of frame, x1, y1, x2, y2 in frame order
+        detections = self.get_detections()
+        detections = detections[np.lexsort((detections[:, 0], detections[:, 1]))]
+        person_ids, starts = np.unique(detections[:, 1], return_index=True)
 
-        return len(people_ids)
+        return {int(person_id): track
+                for person_id, track in zip(person_ids, np.split(detections[:, [0, 2, 3, 4, 5]], starts[1:]))}
 
     def show(self):
         def f(**kwargs):
@@ -128,6 +157,10 @@ class Segment(Base, VideoMixin):
 
     def update(self, **kwargs):
         direction = kwargs.pop('direction', None)
+        if kwargs.get('frame_detections') is not None:
+            kwargs['detections'] = self.to_detections(kwargs.pop('frame_detections'))
+        if kwargs.get('detections') is not None:
+            kwargs['num_people'] = len(np.unique(kwargs['detections'][:, 1]))
         super().update(**kwargs)
         if direction:
             self.direction = HeadPoseDirection.get(direction)
@@ -11,7 +11,7 @@ from sqlalchemy.orm import relationship
 from .base import Base
 from main import config
 from main.mixins import VideoMixin
-from main.utils.enums import TranscriptType
+from main.utils.enums import TranscriptType, VideoStage
 from main.utils.fields import IntEnum
 from main.utils.file import JSONFile
 from main.utils.video import show as show_video, get_centre_frame
@@ -25,12 +25,14 @@ class Video(Base, VideoMixin):
     url = Column(String)
     transcript_type = Column(IntEnum(TranscriptType), default=TranscriptType.NO_TYPE)
     num_people = Column(Integer)
+    stage = Column(IntEnum(VideoStage), default=VideoStage.NO_STAGE)
 
     segments = relationship('Segment', lazy='subquery')
 
     def __init__(self, url=None):
         super().__init__()
         self.url = url
+        self.stage = VideoStage.NO_STAGE
 
     @property
     def data_path(self):
@@ -48,6 +50,10 @@ class Video(Base, VideoMixin):
     def audio_path(self):
         return join(self.data_path, 'audio.wav')
 
+    def get_face_tracks_path(self, face_tracking=None):
+        # tracks of every backend are kept apart, None is the default backend of the service
+        return join(self.data_path, f'face_tracks_{face_tracking}.npy' if face_tracking else 'face_tracks.npy')
+
     @property
     def transcript_path(self):
         return join(self.data_path, 'transcript.en.vtt')
@@ -5,6 +5,7 @@ from .base import Base
 from sqlalchemy import event, Column, Integer, Float, ForeignKey, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm.attributes import set_committed_value
 
 from main.mixins import VideoMixin
 
@@ -20,10 +21,14 @@ class Word(Base, VideoMixin):
     segment_id = Column(UUID(as_uuid=True), ForeignKey('segments.id'))
     segment = relationship('Segment', back_populates='words', lazy='joined')
 
-    def __init__(self, text, segment_id):
+    def __init__(self, text, segment_id, segment=None):
         super().__init__()
         self.text = text
         self.segment_id = segment_id
+        if segment is not None:
+            # link to the segment for paths without adding to segment.words or the session
+            # i.e. words can be built outside of the session and inserted in bulk later
+            set_committed_value(self, 'segment', segment)
 
     @property
     def data_path(self):
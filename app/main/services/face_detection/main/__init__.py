@@ -1,5 +1,3 @@
-import os
-
 from flask import Flask
 from flask_restx import Api
 
@@ -22,6 +20,12 @@ def create_app():
 
     app.url_map.strict_slashes = False
 
+    # load the face detector once instead of on every request
+    # so do the processes tracking chunks of long videos
+    from main.utils.detection import load_face_detector, start_tracking_pool
+    load_face_detector()
+    start_tracking_pool()
+
     # if not os.path.exists(configuration.UPLOADS_PATH):
     #     os.mkdir(configuration.UPLOADS_PATH)
 
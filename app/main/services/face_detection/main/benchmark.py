@@ -0,0 +1,140 @@
+"""
+Face tracking benchmarks
+
+association: per-frame cost of matching detections to trackers and tracker NMS with 1, 5 and 20 faces,
+vectorised against the previous pairwise Python loops
+tracking: speed of the interpolation backend against the correlation trackers on real videos, and how well their
+boxes agree
+
+python3 main/benchmark.py association
+python3 main/benchmark.py tracking video_1.mp4 video_2.mp4
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from main.utils.detection import associate, bb_intersection_over_union, interpolate_frames, iou_matrix, \
+    load_face_detector, match, suppress, track_frames, IOU_THRESHOLD
+
+FRAME_WIDTH, FRAME_HEIGHT = 1920, 1080
+FACE_SIZE = 120
+JITTER = 10  # pixels between tracker and detection boxes
+NUM_FACES = [1, 5, 20]
+
+
+def associate_loop(detection_boxes, tracker_boxes):
+    # previous implementation, a detection matches the first tracker it overlaps
+    unmatched = []
+    for i, box in enumerate(detection_boxes):
+        if not any([bb_intersection_over_union(box, tracker_box) > IOU_THRESHOLD for tracker_box in tracker_boxes]):
+            unmatched.append(i)
+
+    return unmatched
+
+
+def suppress_loop(tracker_boxes):
+    # previous implementation, pairs of overlapping trackers
+    to_replace = []
+    for i in range(len(tracker_boxes)-1):
+        for j in range(i+1, len(tracker_boxes)):
+            if bb_intersection_over_union(tracker_boxes[i], tracker_boxes[j]) > IOU_THRESHOLD:
+                to_replace.append([i, j])
+
+    return to_replace
+
+
+def generate_boxes(num_faces, rng):
+    # faces on a grid like a panel show, detections are the tracker boxes moved slightly
+    columns = int(np.ceil(np.sqrt(num_faces * FRAME_WIDTH / FRAME_HEIGHT)))
+    step_x = FRAME_WIDTH // columns
+    step_y = FRAME_HEIGHT // int(np.ceil(num_faces / columns))
+    tracker_boxes = []
+    for i in range(num_faces):
+        x1, y1 = (i % columns) * step_x, (i // columns) * step_y
+        tracker_boxes.append([x1, y1, x1 + FACE_SIZE, y1 + FACE_SIZE])
+    tracker_boxes = np.asarray(tracker_boxes)
+    detection_boxes = tracker_boxes + rng.integers(-JITTER, JITTER + 1, size=tracker_boxes.shape)
+
+    return tracker_boxes.tolist(), detection_boxes.tolist()
+
+
+def time_per_call(f, args_list):
+    start_time = time.perf_counter()
+    for args in args_list:
+        f(*args)
+
+    return (time.perf_counter() - start_time) / len(args_list)
+
+
+def benchmark_association(args):
+    rng = np.random.default_rng(args.seed)
+    print(f'{"faces":>6}{"associate loop":>18}{"associate":>12}{"nms loop":>12}{"nms":>12}  (microseconds)')
+    for num_faces in NUM_FACES:
+        frames = [generate_boxes(num_faces, rng) for _ in range(args.num_frames)]
+        for tracker_boxes, detection_boxes in frames:
+            assert associate(detection_boxes, tracker_boxes) == associate_loop(detection_boxes, tracker_boxes)
+
+        timings = [
+            time_per_call(associate_loop, [(d, t) for t, d in frames]),
+            time_per_call(associate, [(d, t) for t, d in frames]),
+            time_per_call(suppress_loop, [(t,) for t, d in frames]),
+            time_per_call(suppress, [(t,) for t, d in frames])
+        ]
+        print(f'{num_faces:>6}{timings[0] * 1e6:>18.1f}' + ''.join([f'{t * 1e6:>12.1f}' for t in timings[1:]]))
+
+
+def agreement(frame_tracks, other_frame_tracks):
+    # boxes matched one-to-one per frame: mean IoU, fraction of the boxes of each matched
+    ious, num_boxes, num_other_boxes = [], 0, 0
+    for frame_id, tracks in frame_tracks.items():
+        boxes, other_boxes = list(tracks.values()), list(other_frame_tracks.get(frame_id, {}).values())
+        frame_ious = iou_matrix(boxes, other_boxes)
+        ious.extend([frame_ious[i, j] for i, j in match(boxes, other_boxes)])
+        num_boxes += len(boxes)
+        num_other_boxes += len(other_boxes)
+
+    return float(np.mean(ious)) if ious else 0, len(ious) / max(num_boxes, 1), len(ious) / max(num_other_boxes, 1)
+
+
+def benchmark_tracking(args):
+    load_face_detector()  # not part of the timings
+
+    print(f'{"video":<32}{"frames":>8}{"correlation fps":>18}{"interpolation fps":>20}{"mean IoU":>10}'
+          f'{"recall":>8}{"precision":>11}')
+    for video_path in args.video_paths:
+        start_time = time.perf_counter()
+        correlation_tracks = track_frames(video_path)
+        correlation_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        interpolation_tracks = interpolate_frames(video_path)
+        interpolation_time = time.perf_counter() - start_time
+
+        # correlation boxes as the reference
+        mean_iou, recall, precision = agreement(correlation_tracks, interpolation_tracks)
+        num_frames = len(correlation_tracks)
+        print(f'{os.path.basename(video_path)[:31]:<32}{num_frames:>8}{num_frames / correlation_time:>18.1f}'
+              f'{num_frames / interpolation_time:>20.1f}{mean_iou:>10.3f}{recall:>8.3f}{precision:>11.3f}')
+
+
+def main(args):
+    {
+        'association': benchmark_association,
+        'tracking': benchmark_tracking
+    }[args.run_type](args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    sub_parsers = parser.add_subparsers(dest='run_type')
+
+    parser_1 = sub_parsers.add_parser('association')
+    parser_1.add_argument('--num_frames', type=int, default=1000)
+    parser_1.add_argument('--seed', type=int, default=0)
+
+    parser_2 = sub_parsers.add_parser('tracking')
+    parser_2.add_argument('video_paths', nargs='+')
+
+    main(parser.parse_args())
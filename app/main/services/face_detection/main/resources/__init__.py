@@ -1 +1,3 @@
 from .face_detection import face_detection_namespace
+
+__all__ = ['face_detection_namespace']
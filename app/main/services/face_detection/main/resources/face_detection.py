@@ -1,30 +1,63 @@
-import tempfile
+from http import HTTPStatus
 
-from flask import request
+import cv2
+from flask import abort, request
 from flask_restx import Namespace, reqparse, Resource
-from main.utils.detection import track
+from main.utils.detection import track, TRACKING_BACKEND, TRACKING_BACKENDS
+from main.utils.upload import uploaded_file
 from werkzeug.datastructures import FileStorage
 
 face_detection_namespace = Namespace('Face Detection', path='/detect')
 
 
+def get_backend():
+    backend = request.form.get('backend', TRACKING_BACKEND)
+    if backend not in TRACKING_BACKENDS:
+        abort(HTTPStatus.BAD_REQUEST)
+
+    return backend
+
+
 @face_detection_namespace.route('/')
 class FaceDetection(Resource):
 
     parser = reqparse.RequestParser(bundle_errors=True)
-    parser.add_argument('video', location='files', type=FileStorage,
-                        required=True)
+    parser.add_argument('video', location='files', type=FileStorage)
+    parser.add_argument('video_path', location='form', type=str)  # read in place from the shared volume instead
+    parser.add_argument('backend', location='form', type=str, choices=TRACKING_BACKENDS)
 
     @face_detection_namespace.expect(parser)
     def post(self):
-        video_file = request.files['video']
+        backend = get_backend()
+        with uploaded_file('video') as video_path:
+            frame_trackings = track(video_path, backend=backend)
 
-        # create temporary file on disk - deleted automatically afterwards
-        with tempfile.NamedTemporaryFile('wb+') as f:
-            f.write(video_file.read())
-            f.seek(0)
-            frame_trackings = track(f.name)
+        return frame_trackings
 
-        video_file.close()
 
-        return frame_trackings
+@face_detection_namespace.route('/video')
+class VideoFaceDetection(Resource):
+    """Tracks faces over a whole video, the detections come back as rows instead of a dict per frame"""
+
+    parser = reqparse.RequestParser(bundle_errors=True)
+    parser.add_argument('video', location='files', type=FileStorage)
+    parser.add_argument('video_path', location='form', type=str)  # read in place from the shared volume instead
+    parser.add_argument('backend', location='form', type=str, choices=TRACKING_BACKENDS)
+
+    @face_detection_namespace.expect(parser)
+    def post(self):
+        backend = get_backend()
+        with uploaded_file('video') as video_path:
+            video_reader = cv2.VideoCapture(video_path)
+            fps = video_reader.get(cv2.CAP_PROP_FPS)
+            video_reader.release()
+
+            frame_trackings = track(video_path, backend=backend)
+
+        return {
+            'fps': fps,
+            'num_frames': len(frame_trackings),
+            'detections': [[frame_id, face_id, *box]
+                           for frame_id, trackings in frame_trackings.items()
+                           for face_id, box in trackings.items()]  # frame, face id, x1, y1, x2, y2
+        }
@@ -1,9 +1,14 @@
 import argparse
+import multiprocessing
 import os
+import threading
+from functools import partial
 from os.path import dirname as up
 
 import cv2
 import dlib
+import numpy as np
+from scipy.optimize import linear_sum_assignment
 # from pyopenface.openface import detect_landmarks, FaceModel, FaceParams
 # from pyopenface.models import install_models as install_openface_models
 
@@ -12,6 +17,22 @@ DETECT_FACE_EVERY = 10
 TRACKING_QUALITY = 7
 MIN_FACE_DETECTION_CONFIDENCE_SCORE = 1
 BB_ADD = 0
+DETECTION_SCALE = float(os.environ.get('DETECTION_SCALE', 1.0))  # e.g. 0.5 downscales frames before detection
+DETECTION_UPSAMPLE = 1
+DETECTION_BATCH_SIZE = int(os.environ.get('DETECTION_BATCH_SIZE', 8))  # frames per detector call
+MAX_TRACKING_WORKERS = 4  # every worker loads its own detector, a CUDA context each on the GPU build
+# processes tracking chunks of a video, the GPU build tracks in the service process by default
+TRACKING_WORKERS = int(os.environ.get('TRACKING_WORKERS',
+                                      1 if dlib.DLIB_USE_CUDA else min(os.cpu_count(), MAX_TRACKING_WORKERS)))
+TRACKING_CHUNK_SIZE = DETECT_FACE_EVERY * 75  # frames per chunk, starts on a detection frame
+TRACKING_BACKENDS = ['correlation', 'interpolation']
+TRACKING_BACKEND = os.environ.get('TRACKING_BACKEND', 'correlation')
+
+# interpolation backend
+THUMBNAIL_SIZE = (64, 36)  # grayscale frames compared for motion and shot changes
+MOTION_THRESHOLD = 10  # mean abs. pixel difference from the last keyframe that makes a frame a keyframe
+SHOT_CHANGE_THRESHOLD = 30  # mean abs. pixel difference from the previous frame, tracks don't cross shot changes
+SMOOTHING_WINDOW = 3  # keyframe boxes of a track are averaged over this many keyframes
 
 FILE_DIRECTORY = up(os.path.abspath(__file__))
 MODELS_DIRECTORY = os.path.join(up(up(FILE_DIRECTORY)), 'models')
@@ -21,31 +42,101 @@ FACE_DETECTOR_MODEL_PATH = os.path.join(MODELS_DIRECTORY, 'mmod_human_face_detec
 # face_model = FaceModel()
 # face_params = FaceParams()
 
+face_detector = None
+face_detector_lock = threading.Lock()  # requests share the detector
+tracking_pool = None  # shared by requests, started with the service
 
-def detect(video_path, debug=False):
-    cnn_face_detector = dlib.cnn_face_detection_model_v1(FACE_DETECTOR_MODEL_PATH)
 
+def load_face_detector():
+    # loaded once, on startup
+    global face_detector
+
+    if face_detector is None:
+        face_detector = dlib.cnn_face_detection_model_v1(FACE_DETECTOR_MODEL_PATH)
+
+    return face_detector
+
+
+def start_tracking_pool(num_workers=TRACKING_WORKERS):
+    # spawned so the workers don't inherit the detector's (GPU) state, each loads its own once
+    global tracking_pool
+
+    if tracking_pool is None and num_workers > 1:
+        tracking_pool = multiprocessing.get_context('spawn').Pool(num_workers, initializer=load_face_detector)
+
+    return tracking_pool
+
+
+def detect_faces(frames, scale=DETECTION_SCALE, upsample=DETECTION_UPSAMPLE, batch_size=DETECTION_BATCH_SIZE):
+    # [[(x1, y1, x2, y2, confidence)]] of every frame, boxes in the coordinates of the original frames
+    if not frames:
+        return []
+
+    cnn_face_detector = load_face_detector()
+    if scale != 1:
+        frames = [cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) for frame in frames]
+
+    # frames of a video are the same size so they're detected in batches
+    with face_detector_lock:
+        batch_faces = cnn_face_detector(frames, upsample, batch_size=batch_size)
+
+    return [[(*[int(round(p / scale)) for p in rect_to_bb(face.rect)], face.confidence) for face in faces]
+            for faces in batch_faces]
+
+
+def read_frames_with_detections(video_reader, scale=DETECTION_SCALE, batch_size=DETECTION_BATCH_SIZE,
+                                max_frames=None):
+    """Yields every frame with its face detections if it's a detection frame, None otherwise
+
+    Reads far enough ahead to detect faces in a batch of detection frames at a time
+    """
+    frame_counter = 0
+    while max_frames is None or frame_counter < max_frames:
+        frames = []
+        while len(frames) < DETECT_FACE_EVERY * batch_size and \
+                (max_frames is None or frame_counter + len(frames) < max_frames):
+            success, frame = video_reader.read()
+            if not success:
+                break
+            frames.append(frame)
+        if not frames:
+            return
+
+        detection_ids = [i for i in range(len(frames)) if (frame_counter + i) % DETECT_FACE_EVERY == 0]
+        detections = dict(zip(detection_ids, detect_faces([frames[i] for i in detection_ids], scale=scale,
+                                                          batch_size=batch_size)))
+        for i, frame in enumerate(frames):
+            yield frame, detections.get(i)
+
+        frame_counter += len(frames)
+
+
+def detect(video_path, debug=False, scale=DETECTION_SCALE, batch_size=DETECTION_BATCH_SIZE):
     # get video frames
     video_reader = cv2.VideoCapture(video_path)
     fps = int(video_reader.get(cv2.CAP_PROP_FPS))
     detections = []
     while True:
-        success, frame = video_reader.read()
-        if not success:
+        frames = []
+        while len(frames) < batch_size:
+            success, frame = video_reader.read()
+            if not success:
+                break
+            frames.append(frame)
+        if not frames:
             break
 
-        frame_detections = []
-        faces = cnn_face_detector(frame, 1)
-        for face in faces:
-            x1, y1, x2, y2 = face.rect.left(), face.rect.top(), face.rect.right(), face.rect.bottom()
-            frame_detections.append([x1, y1, x2, y2])
-            if debug:
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-        detections.append(frame_detections)
+        for frame, faces in zip(frames, detect_faces(frames, scale=scale, batch_size=batch_size)):
+            frame_detections = []
+            for x1, y1, x2, y2, confidence in faces:
+                frame_detections.append([x1, y1, x2, y2])
+                if debug:
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+            detections.append(frame_detections)
 
-        if debug:
-            cv2.imshow(video_path, frame)
-            cv2.waitKey(fps)
+            if debug:
+                cv2.imshow(video_path, frame)
+                cv2.waitKey(fps)
 
     video_reader.release()
     if debug:
@@ -65,11 +156,86 @@ def bb_intersection_over_union(boxA, boxB):
     boxAArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
     boxBArea = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
 
-    iou = interArea / float(boxAArea + boxBArea - interArea)
+    unionArea = float(boxAArea + boxBArea - interArea)
+    if unionArea <= 0:
+        return 0
+
+    iou = interArea / unionArea
 
     return iou
 
 
+def iou_matrix(boxes_a, boxes_b):
+    # IoU of every box in boxes_a against every box in boxes_b, boxes are rows of x1, y1, x2, y2
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter_areas = np.maximum(0, x2 - x1) * np.maximum(0, y2 - y1)
+
+    areas_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    areas_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union_areas = areas_a[:, None] + areas_b[None, :] - inter_areas
+
+    return np.divide(inter_areas, union_areas, out=np.zeros_like(inter_areas), where=union_areas > 0)
+
+
+def match(boxes_a, boxes_b, iou_threshold=IOU_THRESHOLD):
+    # one-to-one pairs (i, j) of overlapping boxes, maximising the total IoU
+    if not len(boxes_a) or not len(boxes_b):
+        return []
+    if len(boxes_a) == 1 or len(boxes_b) == 1:
+        # a single box only pairs with the box it overlaps most, cheaper without numpy for the usual single face
+        iou, i, j = max([(bb_intersection_over_union(box_a, box_b), i, j)
+                         for i, box_a in enumerate(boxes_a) for j, box_b in enumerate(boxes_b)],
+                        key=lambda pair: pair[0])
+
+        return [(i, j)] if iou > iou_threshold else []
+
+    ious = iou_matrix(boxes_a, boxes_b)
+
+    ids_a, ids_b = linear_sum_assignment(ious, maximize=True)
+    overlapping = ious[ids_a, ids_b] > iou_threshold
+
+    return list(zip(ids_a[overlapping].tolist(), ids_b[overlapping].tolist()))
+
+
+def associate(detection_boxes, tracker_boxes, iou_threshold=IOU_THRESHOLD):
+    """Matches detections to trackers one-to-one, maximising the total IoU
+
+    Returns the indices of the detections without a tracker
+    """
+    matched = {i for i, j in match(detection_boxes, tracker_boxes, iou_threshold=iou_threshold)}
+
+    return [i for i in range(len(detection_boxes)) if i not in matched]
+
+
+def suppress(tracker_boxes, iou_threshold=IOU_THRESHOLD):
+    """NMS of trackers
+
+    Returns {i: [j, ...]} where the later trackers j overlap tracker i. Tracker i keeps its face id and takes over
+    the latest of them, the rest are removed
+    """
+    if len(tracker_boxes) < 2:
+        return {}
+
+    overlaps = np.triu(iou_matrix(tracker_boxes, tracker_boxes), k=1) > iou_threshold
+    removed = np.zeros(len(overlaps), dtype=bool)
+    groups = {}
+    for i in np.flatnonzero(overlaps.any(axis=1)):
+        if removed[i]:
+            continue
+        js = np.flatnonzero(overlaps[i] & ~removed)
+        if len(js):
+            groups[int(i)] = js.tolist()
+            removed[js] = True
+
+    return groups
+
+
 def rect_to_bb(r):
     return int(r.left()), int(r.top()), int(r.right()), int(r.bottom())
 
@@ -78,21 +244,85 @@ def landmarks_to_points(landmarks):
     return [[p.x, p.y] for p in landmarks.parts()]
 
 
-def track(video_path, debug=False):
-    # https://www.guidodiepen.nl/2017/02/tracking-multiple-faces/
+def stitch(chunk_frame_tracks, iou_threshold=IOU_THRESHOLD):
+    """Joins the frame tracks of consecutive chunks of a video
+
+    Faces are matched across a chunk boundary by the IoU of their boxes in the last frame of one chunk and the first
+    frame of the next, unmatched faces get new ids
+    """
+    frame_tracks, last_boxes = {}, {}
+    current_face_id = 0
+    for chunk_tracks in chunk_frame_tracks:
+        if not chunk_tracks:
+            continue
+        frame_ids = sorted(chunk_tracks.keys())
+
+        face_ids, first_boxes = list(chunk_tracks[frame_ids[0]].keys()), list(chunk_tracks[frame_ids[0]].values())
+        last_face_ids, last_boxes = list(last_boxes.keys()), list(last_boxes.values())
+        new_face_ids = {face_ids[i]: last_face_ids[j] for i, j in match(first_boxes, last_boxes, iou_threshold)}
+
+        for frame_id in frame_ids:
+            frame_tracks[frame_id] = {}
+            for face_id, box in chunk_tracks[frame_id].items():
+                if face_id not in new_face_ids:
+                    new_face_ids[face_id] = current_face_id
+                    current_face_id += 1
+                frame_tracks[frame_id][new_face_ids[face_id]] = box
+        last_boxes = frame_tracks[frame_ids[-1]]
+
+    return frame_tracks
+
+
+def track(video_path, debug=False, scale=DETECTION_SCALE, batch_size=DETECTION_BATCH_SIZE,
+          num_workers=TRACKING_WORKERS, chunk_size=TRACKING_CHUNK_SIZE, backend=TRACKING_BACKEND):
+    """Tracks faces over the video, long videos are split into chunks tracked in parallel processes
 
-    cnn_face_detector = dlib.cnn_face_detection_model_v1(FACE_DETECTOR_MODEL_PATH)
+    Chunks start on detection frames and are stitched back together by IoU (see stitch)
+    They're tracked by the service's pool (see start_tracking_pool), or a pool made for the call outside the service
+    backend is correlation (track_frames) or interpolation (interpolate_frames)
+    """
+    if debug:
+        return track_frames(video_path, debug=debug, scale=scale, batch_size=batch_size)
+    track_chunk = partial({
+        'correlation': track_frames,
+        'interpolation': interpolate_frames
+    }[backend], scale=scale, batch_size=batch_size)
+
+    video_reader = cv2.VideoCapture(video_path)
+    num_frames = int(video_reader.get(cv2.CAP_PROP_FRAME_COUNT))
+    video_reader.release()
+
+    if num_workers <= 1 or num_frames <= chunk_size:
+        return track_chunk(video_path)
+
+    chunks = [(video_path, start_frame, start_frame + chunk_size if start_frame + chunk_size < num_frames else None)
+              for start_frame in range(0, num_frames, chunk_size)]
+    if tracking_pool is not None:
+        chunk_frame_tracks = tracking_pool.starmap(track_chunk, chunks)
+    else:
+        # run outside of the service e.g. from the command line
+        with multiprocessing.get_context('spawn').Pool(min(num_workers, len(chunks)),
+                                                       initializer=load_face_detector) as pool:
+            chunk_frame_tracks = pool.starmap(track_chunk, chunks)
+
+    return stitch(chunk_frame_tracks)
+
+
+def track_frames(video_path, start_frame=0, end_frame=None, debug=False, scale=DETECTION_SCALE,
+                 batch_size=DETECTION_BATCH_SIZE):
+    # https://www.guidodiepen.nl/2017/02/tracking-multiple-faces/
+    # frames from start_frame up to end_frame, or the end of the video if None
 
     video_reader = cv2.VideoCapture(video_path)
     fps = int(video_reader.get(cv2.CAP_PROP_FPS))
+    if start_frame:
+        video_reader.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
 
-    frame_counter, current_face_id = 0, 0
+    frame_counter, current_face_id = start_frame, 0
     frame_tracks, face_trackers = {}, {}
-    while True:
-        success, frame = video_reader.read()
-        if not success:
-            break
-
+    for frame, face_detections in read_frames_with_detections(
+            video_reader, scale=scale, batch_size=batch_size,
+            max_frames=end_frame - start_frame if end_frame is not None else None):
         frame_tracks[frame_counter] = {}
 
         # updates trackers and removes bad quality trackers
@@ -103,59 +333,32 @@ def track(video_path, debug=False):
                 face_ids_to_delete.append(face_id)
         for face_id in face_ids_to_delete:
             del face_trackers[face_id]
+        face_boxes = {face_id: rect_to_bb(tracker.get_position()) for face_id, tracker in face_trackers.items()}
 
-        if frame_counter % DETECT_FACE_EVERY == 0:
-            face_detections = cnn_face_detector(frame, 1)
-            for face in face_detections:
-                if face.confidence < MIN_FACE_DETECTION_CONFIDENCE_SCORE:
-                    continue
-
-                x1, y1, x2, y2 = rect_to_bb(face.rect)
-                bb_center_x = (x1 + x2) / 2
-                bb_center_y = (y1 + y2) / 2
-
-                matched_id = None
-                for face_id, tracker in face_trackers.items():
-                    t_x1, t_y1, t_x2, t_y2 = rect_to_bb(tracker.get_position())
-                    t_center_x = (t_x1 + t_x2) / 2
-                    t_center_y = (t_y1 + t_y2) / 2
-
-                    # # check face cp in tracker region
-                    # # check tracker cp in face region
-                    # if (t_x1 <= bb_center_x <= t_x2) and \
-                    #         (t_y1 <= bb_center_y <= t_y2) and \
-                    #         (x1 <= t_center_x <= x2) and \
-                    #         (y1 <= t_center_y <= y2):
-                    #     matched_id = face_id
-                    #     break
-                    iou = bb_intersection_over_union([x1, y1, x2, y2], [t_x1, t_y1, t_x2, t_y2])
-                    if iou > IOU_THRESHOLD:
-                        matched_id = face_id
-                        break
-
-                if matched_id is None:
-                    tracker = dlib.correlation_tracker()
-                    tracker.start_track(frame, dlib.rectangle(x1-BB_ADD, y1-BB_ADD, x2+BB_ADD, y2+BB_ADD))
-                    face_trackers[current_face_id] = tracker
-                    current_face_id += 1
+        if face_detections is not None:  # every DETECT_FACE_EVERY frames
+            detection_boxes = [[x1, y1, x2, y2] for x1, y1, x2, y2, confidence in face_detections
+                               if confidence >= MIN_FACE_DETECTION_CONFIDENCE_SCORE]
+
+            # detections not matched to a tracker are new faces
+            for i in associate(detection_boxes, list(face_boxes.values())):
+                x1, y1, x2, y2 = detection_boxes[i]
+                tracker = dlib.correlation_tracker()
+                tracker.start_track(frame, dlib.rectangle(x1-BB_ADD, y1-BB_ADD, x2+BB_ADD, y2+BB_ADD))
+                face_trackers[current_face_id] = tracker
+                face_boxes[current_face_id] = rect_to_bb(tracker.get_position())
+                current_face_id += 1
 
         # perform NMS on trackers
-        face_ids = list(face_trackers.keys())
-        to_replace = []
-        for i in range(len(face_ids)-1):
-            for j in range(i+1, len(face_ids)):
-                tracker_1 = face_trackers[face_ids[i]].get_position()
-                tracker_2 = face_trackers[face_ids[j]].get_position()
-                iou = bb_intersection_over_union(rect_to_bb(tracker_1), rect_to_bb(tracker_2))
-                if iou > IOU_THRESHOLD:
-                    to_replace.append([face_ids[i], face_ids[j]])
-        for bad_face_id, good_face_id in to_replace:
-            face_trackers[bad_face_id] = face_trackers[good_face_id]
-            del face_trackers[good_face_id]
+        face_ids = list(face_boxes.keys())
+        for i, js in suppress(list(face_boxes.values())).items():
+            face_trackers[face_ids[i]] = face_trackers[face_ids[js[-1]]]
+            face_boxes[face_ids[i]] = face_boxes[face_ids[js[-1]]]
+            for j in js:
+                del face_trackers[face_ids[j]]
+                del face_boxes[face_ids[j]]
 
         # draw if applicable
-        for face_id, tracker in face_trackers.items():
-            t_x1, t_y1, t_x2, t_y2 = rect_to_bb(tracker.get_position())
+        for face_id, (t_x1, t_y1, t_x2, t_y2) in face_boxes.items():
             if debug:
                 cv2.rectangle(frame, (t_x1, t_y1), (t_x2, t_y2), (255, 0, 0), 2)
                 cv2.putText(frame, f'ID: {face_id}', (t_x1, t_y1-20), cv2.FONT_HERSHEY_SIMPLEX, 1, 255, 2)
@@ -187,13 +390,119 @@ def track(video_path, debug=False):
     return frame_tracks
 
 
+def smooth(frame_ids, boxes, window=SMOOTHING_WINDOW):
+    """Damps detector jitter of the keyframe boxes of a track
+
+    Each box is replaced by a straight line fitted over time to the boxes of the window keyframes around it, so
+    unevenly spaced keyframes of a moving face aren't pulled towards their neighbours. The first and last
+    keyframes keep their detections, a window there would only reach to one side
+    """
+    boxes = boxes.copy()
+    half_window = window // 2
+    for i in range(1, len(boxes) - 1):
+        start, end = max(i - half_window, 0), min(i + half_window + 1, len(boxes))
+        coefficients = np.polyfit(frame_ids[start:end], boxes[start:end], deg=1)
+        boxes[i] = coefficients[0] * frame_ids[i] + coefficients[1]
+
+    return boxes
+
+
+def fill_frames(tracks, keyframe_ids, start_frame, end_frame):
+    """Frame tracks from the keyframe boxes of every track
+
+    tracks are lists of (keyframe id, box). Boxes are interpolated between the keyframes of a track, after its last
+    keyframe it keeps its box up to the next keyframe
+    """
+    next_keyframe_ids = dict(zip(keyframe_ids, keyframe_ids[1:] + [end_frame]))
+    frame_tracks = {frame_id: {} for frame_id in range(start_frame, end_frame)}
+    for face_id, face_track in enumerate(tracks):
+        frame_ids = np.asarray([frame_id for frame_id, box in face_track])
+        boxes = smooth(frame_ids, np.asarray([box for frame_id, box in face_track], dtype=np.float64))
+
+        interpolated_ids = np.arange(frame_ids[0], next_keyframe_ids[frame_ids[-1]])
+        interpolated_boxes = np.stack([np.interp(interpolated_ids, frame_ids, boxes[:, i]) for i in range(4)], axis=1)
+        for frame_id, box in zip(interpolated_ids.tolist(), np.rint(interpolated_boxes).astype(int).tolist()):
+            frame_tracks[frame_id][face_id] = box
+
+    return frame_tracks
+
+
+def interpolate_frames(video_path, start_frame=0, end_frame=None, scale=DETECTION_SCALE,
+                       batch_size=DETECTION_BATCH_SIZE):
+    """Tracks faces by detecting them on keyframes and interpolating their boxes in between
+
+    Keyframes are every DETECT_FACE_EVERY frames, sooner if the frame has moved away from the last keyframe or
+    the shot changed. Detections of consecutive keyframes in the same shot are linked by IoU. A face keeps its last
+    box until the next keyframe. Returns the same frame tracks as track_frames without running a tracker per face
+    """
+    video_reader = cv2.VideoCapture(video_path)
+    if start_frame:
+        video_reader.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    # pick keyframes on small grayscale frames, detect faces on them in batches
+    keyframe_ids, keyframe_shots, keyframes, detections = [], [], [], []
+    frame_counter, shot = start_frame, 0
+    last_thumbnail = keyframe_thumbnail = None
+    while end_frame is None or frame_counter < end_frame:
+        success, frame = video_reader.read()
+        if not success:
+            break
+
+        thumbnail = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), THUMBNAIL_SIZE,
+                               interpolation=cv2.INTER_AREA).astype(np.int16)
+        is_shot_change = last_thumbnail is not None and \
+            np.abs(thumbnail - last_thumbnail).mean() > SHOT_CHANGE_THRESHOLD
+        shot += int(is_shot_change)
+        if keyframe_thumbnail is None or is_shot_change or \
+                frame_counter - keyframe_ids[-1] >= DETECT_FACE_EVERY or \
+                np.abs(thumbnail - keyframe_thumbnail).mean() > MOTION_THRESHOLD:
+            keyframe_ids.append(frame_counter)
+            keyframe_shots.append(shot)
+            keyframes.append(frame)
+            keyframe_thumbnail = thumbnail
+            if len(keyframes) == batch_size:
+                detections.extend(detect_faces(keyframes, scale=scale, batch_size=batch_size))
+                keyframes = []
+        last_thumbnail = thumbnail
+        frame_counter += 1
+    detections.extend(detect_faces(keyframes, scale=scale, batch_size=batch_size))
+    video_reader.release()
+
+    # link the faces of consecutive keyframes
+    tracks, last_boxes, last_shot = [], {}, None
+    for frame_id, shot, faces in zip(keyframe_ids, keyframe_shots, detections):
+        boxes = [[x1, y1, x2, y2] for x1, y1, x2, y2, confidence in faces
+                 if confidence >= MIN_FACE_DETECTION_CONFIDENCE_SCORE]
+        if shot != last_shot:
+            last_boxes = {}
+        track_ids = list(last_boxes.keys())
+        matched_ids = {i: track_ids[j] for i, j in match(boxes, list(last_boxes.values()))}
+
+        last_boxes, last_shot = {}, shot
+        for i, box in enumerate(boxes):
+            track_id = matched_ids.get(i)
+            if track_id is None:
+                track_id = len(tracks)
+                tracks.append([])
+            tracks[track_id].append((frame_id, box))
+            last_boxes[track_id] = box
+
+    # fill in the frames between keyframes
+    return fill_frames(tracks, keyframe_ids, start_frame, frame_counter)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('video_path')
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--scale', type=float, default=DETECTION_SCALE)
+    parser.add_argument('--batch_size', type=int, default=DETECTION_BATCH_SIZE)
+    parser.add_argument('--num_workers', type=int, default=TRACKING_WORKERS)
+    parser.add_argument('--backend', choices=TRACKING_BACKENDS, default=TRACKING_BACKEND)
     args = parser.parse_args()
 
-    frame_tracks = track(args.video_path, args.debug)
+    frame_tracks = track(args.video_path, args.debug, scale=args.scale, batch_size=args.batch_size,
+                         num_workers=args.num_workers, backend=args.backend)
     print(frame_tracks)
 
     # running X11 in docker container
@@ -1,2 +1,4 @@
 from .compare import compare_namespace
 from .embeddings import embeddings_namespace
+
+__all__ = ['compare_namespace', 'embeddings_namespace']
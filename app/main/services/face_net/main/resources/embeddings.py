@@ -1,5 +1,3 @@
-import tempfile
-
 import cv2
 import numpy as np
 from flask import request
@@ -7,6 +5,7 @@ from flask_restx import Namespace, reqparse, Resource
 from werkzeug.datastructures import FileStorage
 
 from main.utils.compare import get_embeddings
+from main.utils.upload import uploaded_file
 
 embeddings_namespace = Namespace('Embeddings', path='/embeddings')
 
@@ -15,17 +14,13 @@ embeddings_namespace = Namespace('Embeddings', path='/embeddings')
 class VideoEmbeddings(Resource):
 
     parser = reqparse.RequestParser(bundle_errors=True)
-    parser.add_argument('video', location='files', type=FileStorage, required=True)
+    parser.add_argument('video', location='files', type=FileStorage)
+    parser.add_argument('video_path', location='form', type=str)  # read in place from the shared volume instead
 
     @embeddings_namespace.expect(parser)
     def post(self):
-        video = request.files['video']
-
-        with tempfile.NamedTemporaryFile('wb+') as f:
-            f.write(video.read())
-            f.seek(0)
-
-            video_reader = cv2.VideoCapture(f.name)
+        with uploaded_file('video') as video_path:
+            video_reader = cv2.VideoCapture(video_path)
             frames = []
             while True:
                 success, frame = video_reader.read()
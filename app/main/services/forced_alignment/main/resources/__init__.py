@@ -1 +1,3 @@
 from .forced_alignment import forced_alignment_namespace
+
+__all__ = ['forced_alignment_namespace']
@@ -1 +1,3 @@
 from .head_pose_estimation import head_pose_estimation_namespace
+
+__all__ = ['head_pose_estimation_namespace']
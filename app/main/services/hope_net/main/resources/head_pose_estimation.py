@@ -1,10 +1,8 @@
-import tempfile
-
-from flask import request
 from flask_restx import Namespace, reqparse, Resource
 from werkzeug.datastructures import FileStorage
 
 from main.utils.estimation import estimate
+from main.utils.upload import uploaded_file
 
 head_pose_estimation_namespace = Namespace('Head Pose Estimation', path='/estimate')
 
@@ -13,19 +11,12 @@ head_pose_estimation_namespace = Namespace('Head Pose Estimation', path='/estima
 class FaceDetection(Resource):
 
     parser = reqparse.RequestParser(bundle_errors=True)
-    parser.add_argument('video', location='files', type=FileStorage,
-                        required=True)
+    parser.add_argument('video', location='files', type=FileStorage)
+    parser.add_argument('video_path', location='form', type=str)  # read in place from the shared volume instead
 
     @head_pose_estimation_namespace.expect(parser)
     def post(self):
-        video_file = request.files['video']
-
-        # create temporary file on disk - deleted automatically afterwards
-        with tempfile.NamedTemporaryFile('wb+') as f:
-            f.write(video_file.read())
-            f.seek(0)
-            result = estimate(f.name)
-
-        video_file.close()
+        with uploaded_file('video') as video_path:
+            result = estimate(video_path)
 
         return result
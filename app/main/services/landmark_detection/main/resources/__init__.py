@@ -1 +1,3 @@
 from .landmark_detection import landmark_detection_namespace
+
+__all__ = ['landmark_detection_namespace']
@@ -1,5 +1,3 @@
-import os
-
 from deepspeech import Model
 from flask import Flask
 from flask_restx import Api
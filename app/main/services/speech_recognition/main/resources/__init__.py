@@ -1 +1,3 @@
 from .speech_recognition import speech_recognition_namespace
+
+__all__ = ['speech_recognition_namespace']
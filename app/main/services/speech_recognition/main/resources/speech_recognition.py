@@ -1,10 +1,14 @@
-import tempfile
-
-from main.utils.transcribe import run_recognition
+from main.utils.transcribe import run_batch_recognition, run_recognition
+from main.utils.upload import uploaded_file, uploaded_files
 from flask import request
 from flask_restx import Namespace, reqparse, Resource
 from werkzeug.datastructures import FileStorage
 
+
+def to_seconds(value):
+    return float(value) if value not in [None, ''] else None
+
+
 speech_recognition_namespace = Namespace('Speech Recognition',
                                          description='',
                                          path='/transcribe')
@@ -14,19 +18,45 @@ speech_recognition_namespace = Namespace('Speech Recognition',
 class Transcribe(Resource):
 
     parser = reqparse.RequestParser(bundle_errors=True)
-    parser.add_argument('audio', location='files', type=FileStorage, required=True)
+    parser.add_argument('audio', location='files', type=FileStorage)
+    parser.add_argument('audio_path', location='form', type=str)  # read in place from the shared volume instead
     parser.add_argument('num_candidates', location='form', type=int, default=3)
+    parser.add_argument('start', location='form', type=float)  # seconds, transcribe a clip of the audio
+    parser.add_argument('end', location='form', type=float)
 
     @speech_recognition_namespace.expect(parser)
     def post(self):
-        audio_file = request.files['audio']
-        num_candidates = int(request.form['num_candidates'])
+        num_candidates = int(request.form.get('num_candidates', 3))
+        start, end = to_seconds(request.form.get('start')), to_seconds(request.form.get('end'))
 
-        with tempfile.NamedTemporaryFile('wb+') as f:
-            f.write(audio_file.read())
-            f.seek(0)
-            result = run_recognition(audio_path=f.name, num_candidates=num_candidates)
-
-        audio_file.close()
+        with uploaded_file('audio') as audio_path:
+            result = run_recognition(audio_path=audio_path, num_candidates=num_candidates, start=start, end=end)
 
         return result
+
+
+@speech_recognition_namespace.route('/batch')
+class TranscribeBatch(Resource):
+
+    parser = reqparse.RequestParser(bundle_errors=True)
+    parser.add_argument('audio', location='files', type=FileStorage, action='append')
+    parser.add_argument('audio_path', location='form', type=str, action='append')  # on the shared volume
+    parser.add_argument('audio_tar', location='files', type=FileStorage)  # tar of clips, in order
+    parser.add_argument('num_candidates', location='form', type=int, default=3)
+    parser.add_argument('start', location='form', type=str, action='append')  # seconds, one per audio_path
+    parser.add_argument('end', location='form', type=str, action='append')  # empty for the whole file
+
+    @speech_recognition_namespace.expect(parser)
+    def post(self):
+        num_candidates = int(request.form.get('num_candidates', 3))
+
+        # clips of shared files, only the audio of each clip is read and resampled
+        spans = [(to_seconds(start), to_seconds(end))
+                 for start, end in zip(request.form.getlist('start'), request.form.getlist('end'))]
+
+        # one result per clip in the order they were sent: shared paths, uploads then the tar
+        with uploaded_files('audio') as audio_paths:
+            spans += [(None, None)] * (len(audio_paths) - len(spans))
+            results = run_batch_recognition(audio_paths=audio_paths, spans=spans, num_candidates=num_candidates)
+
+        return results
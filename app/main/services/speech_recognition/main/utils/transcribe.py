@@ -1,14 +1,22 @@
+import math
 import wave
 import shlex
 import subprocess
+import threading
 
 import numpy as np
+from scipy.signal import resample_poly
 
 try:
     from shlex import quote
 except ImportError:
     from pipes import quote
 
+model_lock = threading.Lock()  # the model can't run requests concurrently
+
+BLOCK_DURATION = 60  # seconds of audio resampled at a time
+PAD_DURATION = 0.1  # seconds read either side of a block, the resampling filter's context at its edges
+
 
 def convert_samplerate(audio_path, desired_sample_rate):
     sox_cmd = 'sox {} --type raw --bits 16 --channels 1 --rate {} ' \
@@ -27,6 +35,66 @@ def convert_samplerate(audio_path, desired_sample_rate):
     return np.frombuffer(output, np.int16)
 
 
+def read_frames(f, start, end):
+    # frames start to end of an open 16-bit wave file, mixed down to mono float32
+    f.setpos(start)
+    audio = np.frombuffer(f.readframes(end - start), np.int16)
+
+    return audio.reshape(-1, f.getnchannels()).mean(axis=1, dtype=np.float32)
+
+
+def read_audio(audio_path, desired_sample_rate, start=None, end=None):
+    """16-bit mono PCM at the desired sample rate, what sox would convert the file to
+
+    start and end (seconds) read a clip of the file, only its frames are read. Audio is resampled a block at a time
+    with polyphase filtering, so an hour long file never needs more than a block in memory besides the result.
+    Blocks start on output samples of the whole file and are padded with the audio around them, they join up into
+    the same samples as resampling the whole file at once.
+    """
+    with wave.open(audio_path, 'rb') as f:
+        sample_rate, num_channels, sample_width = f.getframerate(), f.getnchannels(), f.getsampwidth()
+        num_frames = f.getnframes()
+        if sample_width != 2:
+            audio = convert_samplerate(audio_path=audio_path, desired_sample_rate=desired_sample_rate)
+            start = int(round((start or 0) * desired_sample_rate))
+            end = int(round(end * desired_sample_rate)) if end is not None else len(audio)
+
+            return audio[start:end]
+
+        if num_channels == 1 and sample_rate == desired_sample_rate:
+            start = min(int(round((start or 0) * sample_rate)), num_frames)
+            end = min(int(round(end * sample_rate)), num_frames) if end is not None else num_frames
+            f.setpos(start)
+
+            return np.frombuffer(f.readframes(max(end - start, 0)), np.int16)
+
+        # output sample i is at input frame i * down / up
+        gcd = math.gcd(sample_rate, desired_sample_rate)
+        up, down = desired_sample_rate // gcd, sample_rate // gcd
+        num_samples = math.ceil(num_frames * up / down)
+        start = min(int(round((start or 0) * desired_sample_rate)), num_samples)
+        end = min(int(round(end * desired_sample_rate)), num_samples) if end is not None else num_samples
+
+        # block boundaries are multiples of up output samples i.e. whole input frames
+        block_size = max(BLOCK_DURATION * desired_sample_rate // up, 1) * up
+        pad = math.ceil(PAD_DURATION * sample_rate / down) * down
+        first_sample = start // up * up
+        blocks = []
+        for block_start in range(first_sample, end, block_size):
+            block_end = min(block_start + block_size, num_samples)
+            frame_start, frame_end = block_start // up * down, math.ceil(block_end * down / up)
+            read_start, read_end = max(frame_start - pad, 0), min(frame_end + pad, num_frames)
+
+            block = resample_poly(read_frames(f, read_start, read_end), up, down)
+            offset = (frame_start - read_start) // down * up
+            block = block[offset:offset + block_end - block_start]
+            blocks.append(np.clip(np.round(block), -32768, 32767).astype(np.int16))
+
+    audio = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.int16)
+
+    return audio[start - first_sample:end - first_sample]
+
+
 def words_from_candidate_transcript(metadata):
     word = ""
     word_list = []
@@ -60,20 +128,17 @@ def words_from_candidate_transcript(metadata):
     return word_list
 
 
-def run_recognition(audio_path, num_candidates=3):
+def run_recognition(audio_path, num_candidates=3, start=None, end=None):
+    # start and end (seconds) transcribe a clip of the file
     from main import model
 
     desired_sample_rate = model.sampleRate()
 
-    with wave.open(audio_path, 'rb') as f:
-        frame_rate = f.getframerate()
-        if frame_rate != desired_sample_rate:
-            audio = convert_samplerate(audio_path=audio_path,
-                                       desired_sample_rate=desired_sample_rate)
-        else:
-            audio = np.frombuffer(f.readframes(f.getnframes()), np.int16)
+    # clips are read without the rest of the file
+    audio = read_audio(audio_path=audio_path, desired_sample_rate=desired_sample_rate, start=start, end=end)
 
-    output = model.sttWithMetadata(audio, int(num_candidates))
+    with model_lock:
+        output = model.sttWithMetadata(audio, int(num_candidates))
 
     result = []
     for transcript in output.transcripts:
@@ -84,3 +149,19 @@ def run_recognition(audio_path, num_candidates=3):
         })
 
     return result
+
+
+def run_batch_recognition(audio_paths, spans=None, num_candidates=3):
+    # candidates of every clip in order, None for clips that failed
+    # spans are the (start, end) of each clip within its file, (None, None) for the whole file
+    spans = spans or [(None, None)] * len(audio_paths)
+    results = []
+    for audio_path, (start, end) in zip(audio_paths, spans):
+        try:
+            results.append(run_recognition(audio_path=audio_path, num_candidates=num_candidates, start=start,
+                                           end=end))
+        except Exception as e:
+            print(f'Failed to transcribe clip: {e}')
+            results.append(None)
+
+    return results
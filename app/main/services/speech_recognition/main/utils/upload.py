@@ -0,0 +1,72 @@
+import os
+import tarfile
+import tempfile
+from contextlib import contextmanager
+from http import HTTPStatus
+
+from flask import abort, request
+
+SHARED_PATH = os.environ.get('SHARED_PATH', '/shared')  # volume mounted in every container
+
+
+@contextmanager
+def uploaded_file(name):
+    """Local path of a file sent with the request
+
+    Files on the shared volume are passed by path (<name>_path form field) and read in place.
+    Anything else is uploaded and written to a temporary file that's deleted afterwards.
+    """
+    shared_path = request.form.get(f'{name}_path')
+    if shared_path:
+        shared_path = os.path.realpath(shared_path)
+        if not shared_path.startswith(os.path.join(SHARED_PATH, '')) or not os.path.exists(shared_path):
+            abort(HTTPStatus.BAD_REQUEST)
+
+        yield shared_path
+        return
+
+    file = request.files.get(name)
+    if file is None:
+        abort(HTTPStatus.BAD_REQUEST)
+
+    # create temporary file on disk - deleted automatically afterwards
+    with tempfile.NamedTemporaryFile('wb+') as f:
+        f.write(file.read())
+        f.seek(0)
+        file.close()
+
+        yield f.name
+
+
+@contextmanager
+def uploaded_files(name):
+    """Local paths of the files sent with the request, in order
+
+    Files are uploaded under the same name, passed by path (<name>_path form fields) or sent as a tar (<name>_tar)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for shared_path in request.form.getlist(f'{name}_path'):
+            shared_path = os.path.realpath(shared_path)
+            if not shared_path.startswith(os.path.join(SHARED_PATH, '')) or not os.path.exists(shared_path):
+                abort(HTTPStatus.BAD_REQUEST)
+            paths.append(shared_path)
+
+        for i, file in enumerate(request.files.getlist(name)):
+            path = os.path.join(directory, f'{i}')
+            file.save(path)
+            file.close()
+            paths.append(path)
+
+        archive = request.files.get(f'{name}_tar')
+        if archive:
+            with tarfile.open(fileobj=archive.stream, mode='r|*') as f:
+                for i, member in enumerate(f):
+                    if not member.isfile():
+                        continue
+                    path = os.path.join(directory, f'tar_{i}')
+                    with open(path, 'wb') as _f:
+                        _f.write(f.extractfile(member).read())
+                    paths.append(path)
+
+        yield paths
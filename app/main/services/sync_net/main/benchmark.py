@@ -0,0 +1,131 @@
+"""
+SyncNet benchmarks
+
+pdist: offset search of calc_pdist against the previous per-frame loop on random features of 10 and 60 second
+clips, checks the offset, confidence and min. distance are identical
+inference: segments/sec of the float model against TorchScript and int8 quantisation on cropped segment videos
+(video_combined.avi), with the change in confidence and offset against the float model
+
+python3 main/benchmark.py pdist
+python3 main/benchmark.py inference video_combined_1.avi video_combined_2.avi --device cpu --num_threads 4
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+import torch
+
+from main.utils.SyncNetInstance import calc_pdist, SyncNetInstance
+
+MODEL_PATH = 'models/syncnet_v2.model'
+
+FPS = 25
+FEATURE_SIZE = 1024
+CLIP_DURATIONS = [10, 60]  # seconds
+
+
+def calc_pdist_loop(feat1, feat2, vshift=10):
+    # previous implementation, a list of distances per frame
+    win_size = vshift*2+1
+    feat2p = torch.nn.functional.pad(feat2, (0, 0, vshift, vshift))
+
+    return [torch.nn.functional.pairwise_distance(feat1[[i], :].repeat(win_size, 1), feat2p[i:i+win_size, :])
+            for i in range(0, len(feat1))]
+
+
+def get_offset(mdist, vshift):
+    minval, minidx = torch.min(mdist, 0)
+
+    return (vshift - minidx).item(), (torch.median(mdist) - minval).item(), minval.item()
+
+
+def benchmark_pdist(args):
+    torch.manual_seed(args.seed)
+    print(f'{"clip":>6}{"frames":>8}{"loop (ms)":>12}{"batched (ms)":>14}{"speedup":>9}  identical')
+    for duration in CLIP_DURATIONS:
+        num_frames = duration * FPS - 5  # features of 5 frame windows
+        im_feat, cc_feat = torch.randn(num_frames, FEATURE_SIZE), torch.randn(num_frames, FEATURE_SIZE)
+
+        timings, results = [], []
+        for f, reduce in [
+            (calc_pdist_loop, lambda dists: torch.mean(torch.stack(dists, 1), 1)),
+            (calc_pdist, lambda dists: torch.mean(dists, 1))
+        ]:
+            start_time = time.perf_counter()
+            for _ in range(args.repeats):
+                mdist = reduce(f(im_feat, cc_feat, vshift=args.vshift))
+            timings.append((time.perf_counter() - start_time) / args.repeats)
+            results.append(get_offset(mdist, args.vshift))
+
+        print(f'{duration:>5}s{num_frames:>8}{timings[0] * 1000:>12.1f}{timings[1] * 1000:>14.1f}'
+              f'{timings[0] / timings[1]:>8.1f}x  {results[0] == results[1]}')
+
+
+class Options:
+
+    def __init__(self, batch_size, vshift):
+        self.batch_size = batch_size
+        self.vshift = vshift
+
+
+def benchmark_inference(args):
+    torch.set_num_threads(args.num_threads)
+    opt = Options(batch_size=args.batch_size, vshift=args.vshift)
+
+    print(f'{"model":<20}{"segments/sec":>14}{"mean conf. change":>19}{"max conf. change":>18}{"offsets changed":>17}')
+    baseline = None
+    for name, trace, quantise in [
+        ('float', False, False),
+        ('traced', True, False),
+        ('traced + int8', True, True)
+    ]:
+        if quantise and args.device != 'cpu':
+            continue
+
+        s = SyncNetInstance(device=args.device)
+        s.loadParameters(args.model_path)
+        s.optimise(batch_size=args.batch_size, trace=trace, quantise=quantise)
+
+        with contextlib.redirect_stdout(io.StringIO()):  # per segment logs
+            s.evaluate(opt, videofile=args.video_paths[0])  # warm up, not part of the timings
+
+            start_time = time.perf_counter()
+            results = np.array([[r.item() for r in s.evaluate(opt, videofile=video_path)]
+                                for video_path in args.video_paths])  # offset, confidence, min. distance
+            segments_per_second = len(args.video_paths) / (time.perf_counter() - start_time)
+
+        if baseline is None:
+            baseline = results
+        confidence_changes = np.abs(results[:, 1] - baseline[:, 1])
+        num_offsets_changed = int(np.sum(results[:, 0] != baseline[:, 0]))
+        print(f'{name:<20}{segments_per_second:>14.2f}{confidence_changes.mean():>19.4f}'
+              f'{confidence_changes.max():>18.4f}{num_offsets_changed:>17}')
+
+
+def main(args):
+    {
+        'pdist': benchmark_pdist,
+        'inference': benchmark_inference
+    }[args.run_type](args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    sub_parsers = parser.add_subparsers(dest='run_type')
+
+    parser_1 = sub_parsers.add_parser('pdist')
+    parser_1.add_argument('--vshift', type=int, default=15)
+    parser_1.add_argument('--repeats', type=int, default=5)
+    parser_1.add_argument('--seed', type=int, default=0)
+
+    parser_2 = sub_parsers.add_parser('inference')
+    parser_2.add_argument('video_paths', nargs='+')
+    parser_2.add_argument('--model_path', default=MODEL_PATH)
+    parser_2.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser_2.add_argument('--batch_size', type=int, default=20)
+    parser_2.add_argument('--num_threads', type=int, default=torch.get_num_threads())
+    parser_2.add_argument('--vshift', type=int, default=15)
+
+    main(parser.parse_args())
@@ -1,2 +1,4 @@
 from .crop import crop_namespace
 from .sync import synchronisation_namespace
+
+__all__ = ['crop_namespace', 'synchronisation_namespace']
@@ -1,10 +1,10 @@
 import os
 from http import HTTPStatus
 
-from flask import abort, send_file
+from flask import abort, request, send_file
 from flask_restx import Namespace, Resource
 
-from main.resources.sync import opt
+from main.utils.workspace import get_work_dir
 
 crop_namespace = Namespace('Crop', path='/crop')
 
@@ -13,7 +13,16 @@ crop_namespace = Namespace('Crop', path='/crop')
 class Crop(Resource):
 
     def get(self):
-        cropped_video_path = os.path.join(opt.ref_dir, 'video_combined.avi')
+        # the crop of a synchronisation request, of a person from /synchronise/multi/ if given
+        work_dir = get_work_dir(request.args.get('request_id'))
+        if work_dir is None:
+            return abort(HTTPStatus.BAD_REQUEST)
+
+        person_id = request.args.get('person_id', type=int)
+        if person_id is None:
+            cropped_video_path = os.path.join(work_dir, 'video_combined.avi')
+        else:
+            cropped_video_path = os.path.join(work_dir, f'video_combined_{person_id}.avi')
         if not os.path.exists(cropped_video_path):
             return abort(HTTPStatus.NOT_FOUND)
 
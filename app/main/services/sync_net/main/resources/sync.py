@@ -1,42 +1,142 @@
 import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import abort, request
 from flask_restx import Namespace, reqparse, Resource
+import torch
 from werkzeug.datastructures import FileStorage
 
-from main.utils.preprocessing import preprocess_video_and_audio, \
-    extract_audio, reset_scale_and_frame_rate
+from main.utils.preprocessing import combine_video_and_audio, crop_audio, crop_videos, \
+    preprocess_video_and_audio, extract_audio, reset_scale_and_frame_rate
 from main.utils.SyncNetInstance import *
+from main.utils.upload import uploaded_file
+from main.utils.workspace import create_work_dir, finish_work_dir, keep_only
 
 MODEL_PATH = 'models/syncnet_v2.model'
+DEVICE = os.environ.get('DEVICE', 'cuda' if torch.cuda.is_available() else 'cpu')
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 20))  # 5 frame windows per forward pass
+NUM_THREADS = int(os.environ.get('NUM_THREADS', torch.get_num_threads()))  # of each forward pass on the CPU
+TRACE = os.environ.get('TRACE', 'true').lower() == 'true'  # TorchScript forward passes
+QUANTISE = os.environ.get('QUANTISE', 'false').lower() == 'true'  # int8 fully connected layers, CPU only
+NUM_WORKERS = int(os.environ.get('SYNC_WORKERS', 2))  # requests synchronised at the same time
 
 synchronisation_namespace = Namespace('Synchronisation', path='/synchronise')
 
+torch.set_num_threads(NUM_THREADS)
+
 # load sync_net model weights
-s = SyncNetInstance()
+s = SyncNetInstance(device=DEVICE)
 s.loadParameters(MODEL_PATH)
+s.optimise(batch_size=BATCH_SIZE, trace=TRACE, quantise=QUANTISE)
 
 
 class ArgNamespace:
 
     def __init__(self):
-        self.batch_size = 20
+        self.batch_size = BATCH_SIZE
         self.vshift = 15
-        self.tmp_dir = '/var/www/data'
-        self.reference = 'input'
-        self.ref_dir = os.path.join(self.tmp_dir, self.reference)
 
 
 opt = ArgNamespace()
 
+workers = ThreadPoolExecutor(max_workers=NUM_WORKERS)
+
+
+def run(f, *args):
+    # runs a synchronisation in a new working directory, only the crops are kept for /crop/
+    request_id, work_dir = create_work_dir()
+    try:
+        results = workers.submit(f, work_dir, *args).result()
+        keep_only(work_dir, 'video_combined')
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    finally:
+        finish_work_dir(request_id)
+
+    return {'request_id': request_id, **results}
+
+
+def synchronise(work_dir, video_path, track):
+    # scale video
+    scaled_video_path = os.path.join(work_dir, 'video_scaled.avi')
+    reset_scale_and_frame_rate(video_path, scaled_video_path)
+
+    # extract audio from video
+    audio_path = os.path.join(work_dir, 'extracted_audio.wav')
+    extract_audio(scaled_video_path, audio_path)
+
+    # preprocess video and audio
+    preprocessed_video = os.path.join(work_dir, 'video_preprocessed.avi')
+    preprocessed_audio = os.path.join(work_dir, 'audio_preprocessed.wav')
+    combined_output_path = os.path.join(work_dir, 'video_combined.avi')
+    preprocess_video_and_audio(
+        video_input_path=scaled_video_path,
+        video_output_path=preprocessed_video,
+        track=track,
+        audio_input_path=audio_path,
+        audio_output_path=preprocessed_audio,
+        combined_output_path=combined_output_path
+    )
+
+    offset, confidence, min_distance = s.evaluate(opt, videofile=combined_output_path)
+
+    return {
+        'offset': offset.item(),  # frame offset e.g -3 frames indicates 3/25 = 0.12 seconds offset
+        'confidence': confidence.item(),
+        'min_distance': min_distance.item()
+    }
+
+
+def synchronise_tracks(work_dir, video_path, tracks):
+    person_ids = list(tracks.keys())
+
+    # scale video
+    scaled_video_path = os.path.join(work_dir, 'video_scaled.avi')
+    reset_scale_and_frame_rate(video_path, scaled_video_path)
+
+    # extract audio from video
+    audio_path = os.path.join(work_dir, 'extracted_audio.wav')
+    extract_audio(scaled_video_path, audio_path)
+
+    # crop every person in one pass, the audio is the same for all of them
+    preprocessed_videos = [os.path.join(work_dir, f'video_preprocessed_{person_id}.avi')
+                           for person_id in person_ids]
+    preprocessed_audio = os.path.join(work_dir, 'audio_preprocessed.wav')
+    person_tracks = [(tracks[person_id], preprocessed_video)
+                     for person_id, preprocessed_video in zip(person_ids, preprocessed_videos)]
+    num_frames = crop_videos(scaled_video_path, person_tracks)
+    crop_audio(audio_path, preprocessed_audio, num_frames)
+    for person_id, preprocessed_video in zip(person_ids, preprocessed_videos):
+        combine_video_and_audio(preprocessed_video, preprocessed_audio,
+                                os.path.join(work_dir, f'video_combined_{person_id}.avi'))
+
+    results = s.evaluate_tracks(opt, videofiles=preprocessed_videos, audiofile=preprocessed_audio)
+
+    return {
+        'results': {
+            str(person_id): {
+                'offset': offset.item(),
+                'confidence': confidence.item(),
+                'min_distance': min_distance.item()
+            }
+            for person_id, (offset, confidence, min_distance) in zip(person_ids, results)
+        }
+    }
+
 
 @synchronisation_namespace.route('/')
 class Synchronisation(Resource):
+    """Synchronises a person of a video
+
+    The crop of the person is downloaded from /crop/?request_id=<request id>
+    """
 
     parser = reqparse.RequestParser(bundle_errors=True)
-    parser.add_argument('video', location='files', type=FileStorage, required=True)
+    parser.add_argument('video', location='files', type=FileStorage)
+    parser.add_argument('video_path', location='form', type=str)  # read in place from the shared volume instead
     parser.add_argument('track', location='form', type=str, required=True)
 
     @synchronisation_namespace.expect(parser, validate=True)
@@ -48,42 +148,31 @@ class Synchronisation(Resource):
 
         track = [[d['x1'], d['y1'], d['x2'], d['y2']] for d in track]
 
-        video_file = request.files['video']
-        video_save_path = os.path.join(opt.tmp_dir, 'video.mp4')
-        video_file.save(video_save_path)
-
-        # remove previous files
-        if os.path.exists(opt.ref_dir):
-            shutil.rmtree(opt.ref_dir)
-        os.mkdir(opt.ref_dir)
-
-        # scale video
-        scaled_video_path = os.path.join(opt.ref_dir, 'video_scaled.avi')
-        reset_scale_and_frame_rate(video_save_path, scaled_video_path)
-
-        # extract audio from video
-        audio_path = os.path.join(opt.ref_dir, 'extracted_audio.wav')
-        extract_audio(scaled_video_path, audio_path)
-
-        # preprocess video and audio
-        preprocessed_video = os.path.join(opt.ref_dir, 'video_preprocessed.avi')
-        preprocessed_audio = os.path.join(opt.ref_dir, 'audio_preprocessed.wav')
-        combined_output_path = os.path.join(opt.ref_dir, 'video_combined.avi')
-        preprocess_video_and_audio(
-            video_input_path=scaled_video_path,
-            video_output_path=preprocessed_video,
-            track=track,
-            audio_input_path=audio_path,
-            audio_output_path=preprocessed_audio,
-            combined_output_path=combined_output_path
-        )
-
-        offset, confidence, min_distance = s.evaluate(opt, videofile=combined_output_path)
-
-        video_file.close()
-
-        return {
-            'offset': offset.item(),  # frame offset e.g -3 frames indicates 3/25 = 0.12 seconds offset
-            'confidence': confidence.item(),
-            'min_distance': min_distance.item()
-        }
+        with uploaded_file('video') as video_path:
+            return run(synchronise, video_path, track)
+
+
+@synchronisation_namespace.route('/multi')
+class MultiSynchronisation(Resource):
+    """Synchronises every person of a video at once
+
+    The video is scaled, decoded and cropped once for all the tracks and the audio features are computed once.
+    The crop of each person is downloaded from /crop/?request_id=<request id>&person_id=<person id>
+    """
+
+    parser = reqparse.RequestParser(bundle_errors=True)
+    parser.add_argument('video', location='files', type=FileStorage)
+    parser.add_argument('video_path', location='form', type=str)  # read in place from the shared volume instead
+    parser.add_argument('tracks', location='form', type=str, required=True)  # {person id: [{}, {}, {}]}
+
+    @synchronisation_namespace.expect(parser, validate=True)
+    def post(self):
+        try:
+            tracks = json.loads(request.form['tracks'])
+            tracks = {int(person_id): [[d['x1'], d['y1'], d['x2'], d['y2']] for d in track]
+                      for person_id, track in tracks.items()}
+        except (json.JSONDecodeError, ValueError, KeyError, TypeError):
+            abort(400)
+
+        with uploaded_file('video') as video_path:
+            return run(synchronise_tracks, video_path, tracks)
@@ -17,7 +17,7 @@ def main(args):
     api.add_namespace(synchronisation_namespace)
     app.url_map.strict_slashes = False
 
-    app.run(host='0.0.0.0', port=args.port)
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
 
 
 if __name__ == '__main__':
@@ -4,124 +4,186 @@
 
 import torch
 import numpy
-import time, pdb, argparse, subprocess, os, math, glob
+import time, pdb, argparse, subprocess, math
 import cv2
 import python_speech_features
 
 from scipy import signal
-from scipy.io import wavfile
 from main.utils.SyncNetModel import *
 from shutil import rmtree
 
 
+WIDTH, HEIGHT = 224, 224  # of the cropped faces
+NUM_MFCC = 13
+
+
 # ==================== Get OFFSET ====================
 
 def calc_pdist(feat1, feat2, vshift=10):
+    # distances of every frame of feat1 to feat2 shifted by -vshift..vshift frames, (shifts, frames)
+    # one batched distance over all frames per shift, rather than one per frame
     
     win_size = vshift*2+1
 
     feat2p = torch.nn.functional.pad(feat2,(0,0,vshift,vshift))
 
-    dists = []
+    dists = [torch.nn.functional.pairwise_distance(feat1, feat2p[shift:shift+len(feat1),:]) for shift in range(0,win_size)]
+
+    return torch.stack(dists,0)
+
+# ==================== Load video and audio ====================
+
+def load_frames(videofile):
+    # frames decoded straight into a uint8 (frames, height, width, 3) buffer
+    # converted to float a batch at a time
+
+    cap = cv2.VideoCapture(videofile)
+    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+
+    frames = numpy.empty((max(num_frames,1),height,width,3),dtype=numpy.uint8)
+    frame_num = 0
+    while True:
+        ret, image = cap.read()
+        if ret == 0:
+            break
+
+        # the frame count of the container is only an estimate
+        if frame_num == len(frames):
+            frames = numpy.concatenate([frames,numpy.empty_like(frames)])
+
+        frames[frame_num] = image
+        frame_num += 1
+
+    cap.release()
+
+    return frames[:frame_num]
+
+def load_audio(videofile, sample_rate=16000):
+    # mono 16-bit PCM read from an ffmpeg pipe
+
+    command = ['ffmpeg','-hide_banner','-loglevel','error','-i',videofile,'-async','1','-ac','1','-vn',
+               '-acodec','pcm_s16le','-ar',str(sample_rate),'-f','s16le','pipe:1']
+    output = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout
 
-    for i in range(0,len(feat1)):
+    return sample_rate, numpy.frombuffer(output,dtype=numpy.int16)
 
-        dists.append(torch.nn.functional.pairwise_distance(feat1[[i],:].repeat(win_size, 1), feat2p[i:i+win_size,:]))
+def to_video_tensor(frames):
+    # (frames, height, width, 3) -> (1, 3, frames, height, width) view, no copy
 
-    return dists
+    return torch.from_numpy(frames).permute(3,0,1,2).unsqueeze(0)
 
 # ==================== MAIN DEF ====================
 
 class SyncNetInstance(torch.nn.Module):
 
-    def __init__(self, dropout = 0, num_layers_in_fc_layers = 1024):
+    def __init__(self, dropout = 0, num_layers_in_fc_layers = 1024, device = 'cpu'):
         super(SyncNetInstance, self).__init__();
 
-        self.__S__ = S(num_layers_in_fc_layers = num_layers_in_fc_layers).cuda();
+        self.device = torch.device(device)
+        self.__S__ = S(num_layers_in_fc_layers = num_layers_in_fc_layers).to(self.device);
 
-    def evaluate(self, opt, videofile):
+    def optimise(self, batch_size, trace=True, quantise=False):
+        # after loadParameters - int8 fully connected layers, forward passes compiled with TorchScript
 
         self.__S__.eval();
 
-        # ========== ==========
-        # Convert files
-        # ========== ==========
+        if quantise:
+            if self.device.type != 'cpu':
+                raise ValueError('Dynamic quantisation is only supported on the CPU')
+            self.__S__ = torch.quantization.quantize_dynamic(self.__S__, {torch.nn.Linear}, dtype=torch.qint8)
+
+        if trace:
+            # traced with full batches, the smaller last batch of a clip gives the same results
+            lip_example = torch.zeros(batch_size, 3, 5, HEIGHT, WIDTH, device=self.device)
+            aud_example = torch.zeros(batch_size, 1, NUM_MFCC, 20, device=self.device)
+            with torch.no_grad():
+                self.__S__ = torch.jit.trace_module(self.__S__, {
+                    'forward_lip': lip_example,
+                    'forward_aud': aud_example,
+                    'forward_lipfeat': lip_example
+                })
 
-        # if os.path.exists(os.path.join(opt.tmp_dir,opt.reference)):
-        #   rmtree(os.path.join(opt.tmp_dir,opt.reference))
-        #
-        # os.makedirs(os.path.join(opt.tmp_dir,opt.reference))
+    def evaluate(self, opt, videofile):
 
-        # split video into frames
-        command = ("ffmpeg -hide_banner -loglevel error -y -i %s -threads 1 -f image2 %s" % (videofile,os.path.join(opt.tmp_dir,opt.reference,'%06d.jpg')))
-        output = subprocess.call(command, shell=True, stdout=None)
+        self.__S__.eval();
 
-        # extracts audio from video
-        command = ("ffmpeg -hide_banner -loglevel error -y -i %s -async 1 -ac 1 -vn -acodec pcm_s16le -ar 16000 %s" % (videofile,os.path.join(opt.tmp_dir,opt.reference,'audio.wav')))
-        output = subprocess.call(command, shell=True, stdout=None)
-        
-        # ========== ==========
-        # Load video 
-        # ========== ==========
+        # decoded in memory, no frames or audio are written to disk
+        images = load_frames(videofile)
+        sample_rate, audio = load_audio(videofile)
 
-        images = []
-        
-        flist = glob.glob(os.path.join(opt.tmp_dir,opt.reference,'*.jpg'))
-        flist.sort()
+        cc_feat = self.extract_audio_feature(opt, audio, sample_rate)
 
-        for fname in flist:
-            images.append(cv2.imread(fname))
+        return self.evaluate_features(opt, images, cc_feat, len(audio))
 
-        im = numpy.stack(images,axis=3)
-        im = numpy.expand_dims(im,axis=0)
-        im = numpy.transpose(im,(0,3,4,1,2))
+    def evaluate_tracks(self, opt, videofiles, audiofile):
+        # videos of every person cropped from the same clip share its audio features
 
-        imtv = torch.autograd.Variable(torch.from_numpy(im.astype(float)).float())
+        self.__S__.eval();
 
-        # ========== ==========
-        # Load audio
-        # ========== ==========
+        sample_rate, audio = load_audio(audiofile)
+        cc_feat = self.extract_audio_feature(opt, audio, sample_rate)
+
+        return [self.evaluate_features(opt, load_frames(videofile), cc_feat, len(audio)) for videofile in videofiles]
+
+    @torch.no_grad()
+    def extract_audio_feature(self, opt, audio, sample_rate=16000):
+        # audio features of every 5 frame window of the audio, 640 samples per frame
 
-        sample_rate, audio = wavfile.read(os.path.join(opt.tmp_dir,opt.reference,'audio.wav'))
         mfcc = zip(*python_speech_features.mfcc(audio,sample_rate))
         mfcc = numpy.stack([numpy.array(i) for i in mfcc])
 
         cc = numpy.expand_dims(numpy.expand_dims(mfcc,axis=0),axis=0)
         cct = torch.autograd.Variable(torch.from_numpy(cc.astype(float)).float())
 
+        lastframe = math.floor(len(audio)/640)-5
+        cc_feat = []
+
+        tS = time.time()
+        for i in range(0,lastframe,opt.batch_size):
+
+            cc_batch = [ cct[:,:,:,vframe*4:vframe*4+20] for vframe in range(i,min(lastframe,i+opt.batch_size)) ]
+            cc_in = torch.cat(cc_batch,0)
+            cc_out  = self.__S__.forward_aud(cc_in.to(self.device))
+            cc_feat.append(cc_out.cpu())
+
+        print('Audio compute time %.3f sec.' % (time.time()-tS))
+
+        return torch.cat(cc_feat,0)
+
+    @torch.no_grad()
+    def evaluate_features(self, opt, images, cc_feat, num_audio_samples):
+
+        imtv = to_video_tensor(images)
+
         # ========== ==========
         # Check audio and video input length
         # ========== ==========
 
-        print((float(len(audio))/16000), (float(len(images))/25), flush=True)
-        if (float(len(audio))/16000) != (float(len(images))/25) :
-            print("WARNING: Audio (%.4fs) and video (%.4fs) lengths are different."%(float(len(audio))/16000,float(len(images))/25))
+        print((float(num_audio_samples)/16000), (float(len(images))/25), flush=True)
+        if (float(num_audio_samples)/16000) != (float(len(images))/25) :
+            print("WARNING: Audio (%.4fs) and video (%.4fs) lengths are different."%(float(num_audio_samples)/16000,float(len(images))/25))
 
-        min_length = min(len(images),math.floor(len(audio)/640))
+        min_length = min(len(images),math.floor(num_audio_samples/640))
         
         # ========== ==========
-        # Generate video and audio feats
+        # Generate video feats
         # ========== ==========
 
         lastframe = min_length-5
         im_feat = []
-        cc_feat = []
 
         tS = time.time()
         for i in range(0,lastframe,opt.batch_size):
             
             im_batch = [ imtv[:,:,vframe:vframe+5,:,:] for vframe in range(i,min(lastframe,i+opt.batch_size)) ]
-            im_in = torch.cat(im_batch,0)
-            im_out  = self.__S__.forward_lip(im_in.cuda());
-            im_feat.append(im_out.data.cpu())
-
-            cc_batch = [ cct[:,:,:,vframe*4:vframe*4+20] for vframe in range(i,min(lastframe,i+opt.batch_size)) ]
-            cc_in = torch.cat(cc_batch,0)
-            cc_out  = self.__S__.forward_aud(cc_in.cuda())
-            cc_feat.append(cc_out.data.cpu())
+            im_in = torch.cat(im_batch,0).float()
+            im_out  = self.__S__.forward_lip(im_in.to(self.device));
+            im_feat.append(im_out.cpu())
 
         im_feat = torch.cat(im_feat,0)
-        cc_feat = torch.cat(cc_feat,0)
+        cc_feat = cc_feat[:lastframe]
 
         # ========== ==========
         # Compute offset
@@ -130,14 +192,14 @@ class SyncNetInstance(torch.nn.Module):
         print('Compute time %.3f sec.' % (time.time()-tS))
 
         dists = calc_pdist(im_feat,cc_feat,vshift=opt.vshift)
-        mdist = torch.mean(torch.stack(dists,1),1)
+        mdist = torch.mean(dists,1)
 
         minval, minidx = torch.min(mdist,0)
 
         offset = opt.vshift-minidx
         conf   = torch.median(mdist) - minval
 
-        fdist   = numpy.stack([dist[minidx].numpy() for dist in dists])
+        fdist   = dists[minidx].numpy()
         # fdist   = numpy.pad(fdist, (3,3), 'constant', constant_values=15)
         fconf   = torch.median(mdist).numpy() - fdist
         fconfm  = signal.medfilt(fconf,kernel_size=9)
@@ -147,10 +209,11 @@ class SyncNetInstance(torch.nn.Module):
         print(fconfm)
         print('AV offset: \t%d \nMin dist: \t%.3f\nConfidence: \t%.3f' % (offset,minval,conf))
 
-        # dists_npy = numpy.array([ dist.numpy() for dist in dists ])
+        # dists_npy = dists.numpy()
 
         return offset.numpy(), conf.numpy(), minval.numpy()
 
+    @torch.no_grad()
     def extract_feature(self, opt, videofile):
 
         self.__S__.eval();
@@ -158,23 +221,8 @@ class SyncNetInstance(torch.nn.Module):
         # ========== ==========
         # Load video 
         # ========== ==========
-        cap = cv2.VideoCapture(videofile)
-
-        frame_num = 1;
-        images = []
-        while frame_num:
-            frame_num += 1
-            ret, image = cap.read()
-            if ret == 0:
-                break
-
-            images.append(image)
-
-        im = numpy.stack(images,axis=3)
-        im = numpy.expand_dims(im,axis=0)
-        im = numpy.transpose(im,(0,3,4,1,2))
-
-        imtv = torch.autograd.Variable(torch.from_numpy(im.astype(float)).float())
+        images = load_frames(videofile)
+        imtv = to_video_tensor(images)
         
         # ========== ==========
         # Generate video feats
@@ -187,9 +235,9 @@ class SyncNetInstance(torch.nn.Module):
         for i in range(0,lastframe,opt.batch_size):
             
             im_batch = [ imtv[:,:,vframe:vframe+5,:,:] for vframe in range(i,min(lastframe,i+opt.batch_size)) ]
-            im_in = torch.cat(im_batch,0)
-            im_out  = self.__S__.forward_lipfeat(im_in.cuda());
-            im_feat.append(im_out.data.cpu())
+            im_in = torch.cat(im_batch,0).float()
+            im_out  = self.__S__.forward_lipfeat(im_in.to(self.device));
+            im_feat.append(im_out.cpu())
 
         im_feat = torch.cat(im_feat,0)
 
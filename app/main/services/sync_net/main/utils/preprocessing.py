@@ -27,11 +27,7 @@ def reset_scale_and_frame_rate(input_path, output_path):
     call(command)
 
 
-def preprocess_video_and_audio(video_input_path, video_output_path, track, audio_input_path, audio_output_path,
-                               combined_output_path, width=WIDTH, height=HEIGHT, crop_scale=CROP_SCALE):
-    video_reader = cv2.VideoCapture(video_input_path)
-    video_writer = cv2.VideoWriter(video_output_path, cv2.VideoWriter_fourcc(*'XVID'), FPS, (height, width))
-
+def smooth_track(track):
     detections = {'x': [], 'y': [], 's': []}
     for x1, y1, x2, y2 in track:
         detections['s'].append(max((y2 - y1), (x2 - x1)) / 2)  # detection box size
@@ -43,41 +39,72 @@ def preprocess_video_and_audio(video_input_path, video_output_path, track, audio
     detections['x'] = signal.medfilt(detections['x'], kernel_size=13)
     detections['y'] = signal.medfilt(detections['y'], kernel_size=13)
 
+    return detections
+
+
+def crop_videos(video_input_path, tracks, width=WIDTH, height=HEIGHT, crop_scale=CROP_SCALE):
+    """Crops the face of every track out of the video in a single decode
+
+    tracks is a list of (track, video_output_path), returns the no. frames
+    """
+    video_reader = cv2.VideoCapture(video_input_path)
+    video_writers = [cv2.VideoWriter(video_output_path, cv2.VideoWriter_fourcc(*'XVID'), FPS, (height, width))
+                     for track, video_output_path in tracks]
+    track_detections = [smooth_track(track) for track, video_output_path in tracks]
+
     frame_counter = 0
     while True:
         success, frame = video_reader.read()
         if not success:
             break
 
-        bs = detections['s'][frame_counter]  # detection box size
-        bsi = int(bs * (1 + 2 * crop_scale))  # pad videos by this amount
+        for detections, video_writer in zip(track_detections, video_writers):
+            bs = detections['s'][frame_counter]  # detection box size
+            bsi = int(bs * (1 + 2 * crop_scale))  # pad videos by this amount
 
-        frame = np.pad(frame, ((bsi, bsi), (bsi, bsi), (0, 0)), 'constant', constant_values=(110, 110))
-        mx = detections['x'][frame_counter] + bsi  # bbox center X
-        my = detections['y'][frame_counter] + bsi  # bbox center Y
+            padded_frame = np.pad(frame, ((bsi, bsi), (bsi, bsi), (0, 0)), 'constant', constant_values=(110, 110))
+            mx = detections['x'][frame_counter] + bsi  # bbox center X
+            my = detections['y'][frame_counter] + bsi  # bbox center Y
 
-        face = frame[int(my - bs):int(my + bs * (1 + 2 * crop_scale)),
-                     int(mx - bs * (1 + crop_scale)):int(mx + bs * (1 + crop_scale))]
+            face = padded_frame[int(my - bs):int(my + bs * (1 + 2 * crop_scale)),
+                                int(mx - bs * (1 + crop_scale)):int(mx + bs * (1 + crop_scale))]
 
-        video_writer.write(cv2.resize(face, (height, width)))
+            video_writer.write(cv2.resize(face, (height, width)))
 
         frame_counter += 1
 
-    video_writer.release()
+    for video_writer in video_writers:
+        video_writer.release()
     video_reader.release()
 
+    return frame_counter
+
+
+def crop_audio(audio_input_path, audio_output_path, num_frames):
     audio_start = 0 / FPS
-    audio_end = (frame_counter + 1) / FPS
+    audio_end = (num_frames + 1) / FPS
 
-    # crop audio file
     command = f'ffmpeg -hide_banner -loglevel error -y -i {audio_input_path} -ss {audio_start:.3f} -to {audio_end:.3f} {audio_output_path}'
     call(command)
 
-    # combine audio and video files
-    command = f'ffmpeg -hide_banner -loglevel error -y -i {video_output_path} -i {audio_output_path} -c:v copy -c:a copy {combined_output_path}'
+
+def combine_video_and_audio(video_path, audio_path, combined_output_path):
+    command = f'ffmpeg -hide_banner -loglevel error -y -i {video_path} -i {audio_path} -c:v copy -c:a copy {combined_output_path}'
     call(command)
 
 
+def preprocess_video_and_audio(video_input_path, video_output_path, track, audio_input_path, audio_output_path,
+                               combined_output_path, width=WIDTH, height=HEIGHT, crop_scale=CROP_SCALE):
+    num_frames = crop_videos(video_input_path, [(track, video_output_path)], width=width, height=height,
+                             crop_scale=crop_scale)
+
+    # crop audio file
+    crop_audio(audio_input_path, audio_output_path, num_frames)
+
+    # combine audio and video files
+    combine_video_and_audio(video_output_path, audio_output_path, combined_output_path)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('video_input_path')
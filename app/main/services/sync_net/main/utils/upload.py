@@ -0,0 +1,37 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from http import HTTPStatus
+
+from flask import abort, request
+
+SHARED_PATH = os.environ.get('SHARED_PATH', '/shared')  # volume mounted in every container
+
+
+@contextmanager
+def uploaded_file(name):
+    """Local path of a file sent with the request
+
+    Files on the shared volume are passed by path (<name>_path form field) and read in place.
+    Anything else is uploaded and written to a temporary file that's deleted afterwards.
+    """
+    shared_path = request.form.get(f'{name}_path')
+    if shared_path:
+        shared_path = os.path.realpath(shared_path)
+        if not shared_path.startswith(os.path.join(SHARED_PATH, '')) or not os.path.exists(shared_path):
+            abort(HTTPStatus.BAD_REQUEST)
+
+        yield shared_path
+        return
+
+    file = request.files.get(name)
+    if file is None:
+        abort(HTTPStatus.BAD_REQUEST)
+
+    # create temporary file on disk - deleted automatically afterwards
+    with tempfile.NamedTemporaryFile('wb+') as f:
+        f.write(file.read())
+        f.seek(0)
+        file.close()
+
+        yield f.name
@@ -0,0 +1,67 @@
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+WORK_PATH = os.environ.get('WORK_PATH', '/var/www/data')
+RESULT_TTL = 600  # seconds the working directory of a finished request is kept for
+
+running = set()  # ids of the requests still being processed, their directories are never removed
+running_lock = threading.Lock()
+
+
+def get_work_dir(request_id):
+    # None if the request id isn't valid, it's part of a path
+    if not re.fullmatch('[0-9a-f]{32}', request_id or ''):
+        return None
+
+    return os.path.join(WORK_PATH, request_id)
+
+
+def create_work_dir():
+    # working directory of a request, named by its request id
+    remove_expired()
+
+    request_id = uuid.uuid4().hex
+    work_dir = get_work_dir(request_id)
+    with running_lock:
+        running.add(request_id)
+    os.makedirs(work_dir)
+
+    return request_id, work_dir
+
+
+def finish_work_dir(request_id):
+    # the directory expires RESULT_TTL after the request finished
+    work_dir = get_work_dir(request_id)
+    if os.path.exists(work_dir):
+        os.utime(work_dir)
+    with running_lock:
+        running.discard(request_id)
+
+
+def remove_expired(ttl=RESULT_TTL):
+    if not os.path.exists(WORK_PATH):
+        return
+
+    now = time.time()
+    for name in os.listdir(WORK_PATH):
+        with running_lock:
+            if name in running:
+                continue
+
+        path = os.path.join(WORK_PATH, name)
+        try:
+            if os.path.isdir(path) and now - os.path.getmtime(path) > ttl:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            pass  # removed by another request
+
+
+def keep_only(work_dir, prefix):
+    # removes the intermediate files of a request
+    for name in os.listdir(work_dir):
+        if not name.startswith(prefix):
+            os.remove(os.path.join(work_dir, name))
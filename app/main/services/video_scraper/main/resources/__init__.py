@@ -1,2 +1,4 @@
 from .url import url_namespace
 from .video import video_namespace
+
+__all__ = ['url_namespace', 'video_namespace']
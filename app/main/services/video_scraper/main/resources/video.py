@@ -1,6 +1,7 @@
-import glob
 import io
 import os
+import shutil
+import tempfile
 
 from flask import after_this_request, request, send_file
 from flask_restx import Namespace, reqparse, Resource
@@ -25,7 +26,17 @@ class Download(Resource):
         data = request.json
         url = data['url']
 
-        s = Scraper()
+        # separate directory per request - concurrent downloads shouldn't clean up each other
+        downloads_path = tempfile.mkdtemp(dir=DOWNLOADS_PATH)
+
+        @after_this_request
+        def clean_up_downloads(response):
+            # make sure directory clean - even if there is an error
+            shutil.rmtree(downloads_path, ignore_errors=True)
+
+            return response
+
+        s = Scraper(downloads_path=downloads_path)
         zip_path = s.download_video(url=url)
 
         # store zip in memory to delete from disk
@@ -36,12 +47,27 @@ class Download(Resource):
 
         os.remove(zip_path)
 
-        @after_this_request
-        def clean_up_downloads(response):
-            # make sure directory clean - even if there is an error
-            for file in glob.glob(os.path.join(DOWNLOADS_PATH, '*')):
-                os.remove(file)
+        return send_file(return_data, as_attachment=True, attachment_filename='video.zip')
 
-            return response
 
-        return send_file(return_data, as_attachment=True, attachment_filename='video.zip')
+@video_namespace.route('/info')
+class Info(Resource):
+
+    url_parser = reqparse.RequestParser(bundle_errors=True)
+    url_parser.add_argument('url', location='json', required=True)
+    url_parser.add_argument('transcript', location='json', type=bool, default=False)
+
+    @video_namespace.expect(url_parser)
+    def post(self):
+        data = request.json
+        url = data['url']
+        download_transcript = data.get('transcript', False)
+
+        downloads_path = tempfile.mkdtemp(dir=DOWNLOADS_PATH)
+        try:
+            s = Scraper(downloads_path=downloads_path)
+            video_info = s.get_video_info(url=url, download_transcript=download_transcript)
+        finally:
+            shutil.rmtree(downloads_path, ignore_errors=True)
+
+        return video_info
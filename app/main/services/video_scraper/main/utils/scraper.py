@@ -41,6 +41,9 @@ def find(key, dictionary):
 
 EXTENSIONS = ['en.vtt', 'info.json', 'mp4', 'wav']
 ARC_NAMES = ['transcript', 'data', 'video', 'audio']
+# left out of the info response, subtitle availability is returned separately
+LARGE_INFO_KEYS = ['formats', 'requested_formats', 'requested_subtitles', 'subtitles', 'automatic_captions',
+                   'thumbnails']
 
 
 class Scraper:
@@ -51,10 +54,11 @@ class Scraper:
     /<id>: this is the best way to find channels by user e.g. TheOfficeUS. It resolves to /c and /user
     """
 
-    def __init__(self):
+    def __init__(self, downloads_path=DOWNLOADS_PATH):
+        self.downloads_path = downloads_path
         self.options = {
             'format': 'best',
-            'outtmpl': os.path.join(DOWNLOADS_PATH, f'%(id)s.mp4'),
+            'outtmpl': os.path.join(self.downloads_path, f'%(id)s.mp4'),
             'writeinfojson': True,
             'prefer_ffmpeg': True,
             'writesubtitles': True,
@@ -78,7 +82,7 @@ class Scraper:
             video_info = dl.extract_info(url, download=False)
             video_id = video_info['id']
 
-            video_path = os.path.join(DOWNLOADS_PATH, f'{video_id}')
+            video_path = os.path.join(self.downloads_path, f'{video_id}')
             video_files = [f'{video_path}.{extension}' for extension in EXTENSIONS]
 
             # zip files together
@@ -95,6 +99,38 @@ class Scraper:
 
             return video_zip_path
 
+    def get_video_info(self, url, download_transcript=False):
+        # metadata only - the video and audio are never downloaded
+        options = {
+            'skip_download': True,
+            'outtmpl': os.path.join(self.downloads_path, '%(id)s.%(ext)s'),
+            'writesubtitles': download_transcript,
+            'writeautomaticsub': download_transcript,
+            'subtitleslangs': ['en'],
+            'subtitlesformat': 'vtt',
+            'logger': Logger(),
+            'quiet': True
+        }
+
+        with YoutubeDL(options) as dl:
+            info = dl.extract_info(url, download=download_transcript)
+
+        transcript = None
+        transcript_path = os.path.join(self.downloads_path, f'{info["id"]}.en.vtt')
+        if os.path.exists(transcript_path):
+            with open(transcript_path, 'r') as f:
+                transcript = f.read()
+            os.remove(transcript_path)
+
+        return {
+            'info': {k: v for k, v in info.items() if k not in LARGE_INFO_KEYS},
+            'subtitles': {
+                'manual': 'en' in (info.get('subtitles') or {}),
+                'auto': 'en' in (info.get('automatic_captions') or {})
+            },
+            'transcript': transcript
+        }
+
     def extract_urls(self, url):
         with YoutubeDL() as ydl:
             channel_info = ydl.extract_info(url, download=False)
@@ -0,0 +1,449 @@
+"""
+Per-segment stages of the harvest pipeline
+
+Each stage takes a segment and returns True to pass it on to the next stage or False to reject it. Stages raise
+when they fail e.g. a service error, the segment is kept at its last checkpoint instead of being rejected.
+Stages run in separate threads, so changes to the segment go through the unit of work (see utils/db.py).
+The last stage a segment completed is checkpointed so an interrupted harvest can be resumed.
+"""
+import math
+import os
+from functools import wraps
+from http import HTTPStatus
+
+import numpy as np
+
+from main.containers import FaceDetection, ForcedAlignment, HeadPoseEstimation, SpeechRecognition, SyncNet
+from main.models import Word
+from main.utils.enums import SegmentStage
+from main.utils.file import File, is_shared
+from main.utils.time import time_to_seconds
+from main.utils.transcript import is_similar
+from main.utils.video import convert, crop, extract_audio, get_fps, get_num_frames, multi_slice, precise_slice
+
+MIN_MAX_SYNCNET_CONFIDENCE = 5
+ASR_ENGLISH_CONFIDENCE = -10
+SYNC_FPS = 25  # frame rate of sync offsets
+WORD_VALIDATION_MODES = ['clips', 'timings']
+FACE_DETECTION_MODES = ['segments', 'video']  # track faces per segment or over the whole video once
+FACE_TRACKING_BACKENDS = ['correlation', 'interpolation']  # of the face detection service
+SLICE_CHUNK_SIZE = 10  # segments sliced per ffmpeg process
+
+
+def remove_files(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def completed(segment, stage):
+    # whether the segment completed the stage before an interruption
+    return segment.stage.value >= stage.value
+
+
+def checkpoint(f, stage, session):
+    # skips stages completed before an interruption, records the stage once completed
+    @wraps(f)
+    def wrapper(segment, **kwargs):
+        if completed(segment, stage):
+            return True
+
+        if not f(segment, session=session, **kwargs):
+            return False
+
+        session.update(segment, stage=stage)
+
+        return True
+
+    return wrapper
+
+
+def slice_segments(segments, chunk_size=SLICE_CHUNK_SIZE):
+    """Slices the audio, video and combined files of segments before they enter the pipeline
+
+    Segments are sliced in chunks of consecutive segments, one ffmpeg decode pass per chunk. Every chunk is
+    yielded as soon as it's sliced so the rest of the pipeline can start on it. The files of a chunk that failed to
+    slice are removed, so slice_segment fails its segments instead of checkpointing them.
+    """
+    to_slice = []
+    for segment in segments:
+        if segment.stage.value >= SegmentStage.SLICED.value:
+            yield segment
+        else:
+            to_slice.append(segment)
+    to_slice.sort(key=lambda segment: segment.start)
+
+    for i in range(0, len(to_slice), chunk_size):
+        chunk = to_slice[i:i + chunk_size]
+        video = chunk[0].video
+
+        # slices are only complete once checkpointed, anything left over was interrupted
+        for segment in chunk:
+            remove_files(segment.video_path, segment.audio_path, segment.combined_video_audio_path)
+
+        return_code = multi_slice(video_path=video.video_path,
+                                  audio_path=video.audio_path,
+                                  slices=[(time_to_seconds(segment.start), time_to_seconds(segment.end),
+                                           segment.video_path, segment.audio_path,
+                                           segment.combined_video_audio_path) for segment in chunk])
+        if return_code != 0:
+            print(f'Failed to slice {len(chunk)} segments: ffmpeg returned {return_code}')
+
+        yield from chunk
+
+
+def slice_segment(segment, **kwargs):
+    # the media was sliced in chunks before entering the pipeline, see slice_segments
+    File(segment.transcript_path).write(segment.text)
+
+    # ffmpeg failing isn't a reason to reject the segment, it's sliced again on resume
+    if not all([os.path.exists(path)
+                for path in [segment.video_path, segment.audio_path, segment.combined_video_audio_path]]):
+        raise Exception('Failed to slice segment')
+
+    return True
+
+
+def transcribe_segment(segment, services, session, **kwargs):
+    # check language spoken in segments - run through ASR
+    # 1) check if there's an ASR transcript
+    # 2) check if ASR confidence meets threshold
+    # 3) check if manual and ASR transcript are somewhat similar
+    with services.use(SpeechRecognition) as asr:
+        if is_shared(segment.video.audio_path):
+            # clip of the video's audio, the service only reads the segment's part of it
+            response = asr.transcribe(segment.video.audio_path, start=time_to_seconds(segment.start),
+                                      end=time_to_seconds(segment.end))
+        else:
+            response = asr.transcribe(segment.audio_path)
+    response = response.json()[0]  # best candidate
+
+    if response['transcript'].strip() and \
+            response['confidence'] >= ASR_ENGLISH_CONFIDENCE and \
+            is_similar(segment.text, response['transcript']):
+        session.update(segment, asr_text=response['transcript'], asr_confidence=response['confidence'],
+                       asr_words=response['words'])
+
+        return True
+
+    return False
+
+
+def track_faces(video, services, face_tracking=None):
+    """Tracks faces over the whole video once instead of per segment
+
+    Returns (fps, [[frame, face id, x1, y1, x2, y2]]). The tracks are saved with the video and reused on resume
+    with the same face_tracking backend
+    """
+    face_tracks_path = video.get_face_tracks_path(face_tracking)
+    if not os.path.exists(face_tracks_path):
+        with services.use(FaceDetection) as fd:
+            response = fd.detect_video(video_path=video.video_path, backend=face_tracking)
+        if response is None or response.status_code != HTTPStatus.OK:
+            raise Exception(f'Failed to track faces: {response.status_code if response is not None else None}')
+        response = response.json()
+
+        # renamed once written, an interrupted run doesn't leave a partial file to resume from
+        face_tracks = np.asarray(response['detections'], dtype=np.int32).reshape(-1, 6)
+        with open(f'{face_tracks_path}.tmp', 'wb') as f:
+            np.save(f, face_tracks)
+        os.replace(f'{face_tracks_path}.tmp', face_tracks_path)
+
+        return response['fps'], face_tracks
+
+    return get_fps(video.video_path), np.load(face_tracks_path)
+
+
+def slice_face_tracks(fps, face_tracks, start, num_frames):
+    """Detections of a segment starting at start seconds, from the tracks of the whole video
+
+    Rows of frame, person, x1, y1, x2, y2 like Segment.detections, people are numbered from 0 in order of appearance
+    """
+    start_frame = math.ceil(round(start * fps, 3))  # segments are trimmed from the first frame at/after the start
+    detections = face_tracks[(face_tracks[:, 0] >= start_frame) & (face_tracks[:, 0] < start_frame + num_frames)]
+    detections = detections.astype(np.int32)  # frames of the whole video don't fit in int16
+
+    # rows are in frame order, so the first row of a face is its first appearance
+    face_ids, first_rows, face_indices = np.unique(detections[:, 1], return_index=True, return_inverse=True)
+    detections[:, 1] = np.argsort(np.argsort(first_rows))[face_indices.reshape(-1)]
+    detections[:, 0] -= start_frame
+
+    return detections.astype(np.int16)
+
+
+def detect_faces(segment, services, session, face_tracks=None, face_tracking=None, **kwargs):
+    # run face detection and tracking on the segment, or slice it from the tracks of the whole video
+    # remove segment if no people detected
+    if face_tracks is not None:
+        detections = slice_face_tracks(*face_tracks, start=time_to_seconds(segment.start),
+                                       num_frames=get_num_frames(segment.combined_video_audio_path))
+    else:
+        with services.use(FaceDetection) as fd:
+            response = fd.detect(video_path=segment.combined_video_audio_path, backend=face_tracking)
+        detections = segment.to_detections(response.json())
+    session.update(segment, detections=detections)
+
+    return segment.get_num_people() > 0
+
+
+def find_speaker(segment, services, session, keep_non_speakers=False, **kwargs):
+    # find out who the speaker is in the segment
+    num_frames = get_num_frames(segment.combined_video_audio_path)
+
+    # create tracks from detections
+    with session.lock:  # detections not loaded yet are queried through the session
+        person_tracks = segment.get_tracks()
+    people_detections = {person_id: [dict(zip(['x1', 'y1', 'x2', 'y2'], box)) for box in track[:, 1:].tolist()]
+                         for person_id, track in person_tracks.items()}
+
+    with services.use(SyncNet) as sn:
+        # get sync results from tracks of same length of video
+        # every person is evaluated in one request, sharing the video decoding and audio features
+        tracks = {person_id: detections for person_id, detections in people_detections.items()
+                  if len(detections) == num_frames}
+        people_sync_results = {}
+        if tracks:
+            sync_response = sn.find_synchronise_tracks(video_path=segment.combined_video_audio_path, tracks=tracks)
+            if sync_response.status_code != HTTPStatus.OK:
+                raise Exception(f'Failed to synchronise tracks: {sync_response.status_code}')
+            sync_response = sync_response.json()
+            for person_id, sync_results in sync_response['results'].items():
+                person_id = int(person_id)
+                people_sync_results[person_id] = sync_results
+
+                # download cropped video from sync-net API
+                cropped_video_path = os.path.join(segment.data_path, f'cropped_person_{person_id}.avi')
+                sn.get_cropped_video(save_path=cropped_video_path, request_id=sync_response['request_id'],
+                                     person_id=person_id)
+                people_sync_results[person_id]['cropped_video_path'] = cropped_video_path
+
+        if len(people_sync_results) == 0:
+            # no sync results
+            return False
+
+        # get person with max confidence - they are the speaker
+        speaker = None
+        max_confidence = 0
+        for person_id, sync_results in people_sync_results.items():
+            confidence = sync_results['confidence']
+            if confidence > max_confidence:
+                max_confidence = confidence
+                speaker = person_id
+
+        # check how high the max confidence is
+        # i.e. small max confidence indicates speaker not that person
+        if max_confidence < MIN_MAX_SYNCNET_CONFIDENCE:
+            return False
+
+        # now sync the video by the offset of the speaker
+        av_offset = people_sync_results[speaker]['offset']
+        session.update(segment, sync_confidence=max_confidence, sync_offset=av_offset)
+        sn.synchronise(
+            input_video_path=people_sync_results[speaker]['cropped_video_path'],
+            output_video_path=segment.speaker_video_path,
+            frame_offset=av_offset
+        )
+
+    # delete speaker cropped video
+    os.remove(people_sync_results[speaker]['cropped_video_path'])
+    del people_sync_results[speaker]
+
+    if keep_non_speakers:
+        for non_speaker_id, sync_results in people_sync_results.items():
+            # convert avi to mp4
+            convert(
+                input_video_path=sync_results['cropped_video_path'],
+                output_video_path=sync_results['cropped_video_path'].replace('.avi', '.mp4')
+            )
+
+    # delete other avi cropped videos that aren't the speaker cropped video
+    for non_speaker_id, sync_results in people_sync_results.items():
+        os.remove(sync_results['cropped_video_path'])
+
+    # crop speaker again but make the bounding box bigger
+    # this allows other services to make detections easier
+    crop(
+        input_video_path=segment.combined_video_audio_path,
+        output_video_path=segment.speaker_video_path_bigger,
+        track=[[d['x1'], d['y1'], d['x2'], d['y2']] for d in people_detections[speaker]],
+        height=250,
+        width=250,
+        x_pad=30,
+        y_pad=50
+    )
+
+    # convert cropped speaker avi to mp4 for browser viewing reasons
+    convert(
+        input_video_path=segment.speaker_video_path,
+        output_video_path=segment.speaker_video_path_mp4
+    )
+
+    # extract cropped speaker audio for forced alignment
+    extract_audio(
+        video_path=segment.speaker_video_path,
+        output_audio_path=segment.speaker_audio_path,
+        audio_codec='pcm_s16le'
+    )
+
+    return True
+
+
+def align_segment(segment, services, session, **kwargs):
+    """
+    Run forced alignment between audio and transcript - subtitles may not be in sync with audio
+
+    Forced alignment only uses WAV:PCM format
+    Need to convert using the command (check out sync-net preprocessing for a similar command):
+    ffmpeg -y -i cropped_speaker.avi -vn -acodec pcm_s16le cropped_speaker.wav
+
+    Interesting comment about millisecond slicing video and audio:
+    https://superuser.com/questions/1257914/ffmpeg-cut-videos-with-millisecond-accuracy-without-audio#comment1849491_1257914
+    """
+    with services.use(ForcedAlignment) as fa:
+        response = fa.align(
+            audio_path=segment.speaker_audio_path,
+            transcript=segment.text
+        )
+    if response.status_code != HTTPStatus.OK:
+        raise Exception(f'Failed to align segment: {response.status_code}')
+
+    response = response.json()
+    session.update(segment,
+                   fa_log_likelihood=response['av_log_likelihood_per_frame'],
+                   fa_alignment=response['alignment'])
+
+    return True
+
+
+def match_asr_words(fa_alignment, asr_words, time_offset=0):
+    """ASR word matching each forced alignment word, None if no ASR word overlaps it
+
+    ASR word timings are shifted by the time offset onto the timeline of the alignment.
+    The ASR word overlapping the most is matched, ties go to the closest centre.
+    """
+    asr_words = [(w['word'], w['start_time'] + time_offset, w['start_time'] + w['duration'] + time_offset)
+                 for w in asr_words]
+
+    matches = []
+    for text, start_time, end_time, score in fa_alignment:
+        centre = (start_time + end_time) / 2
+        best_match, best_key = None, None
+        for asr_text, asr_start_time, asr_end_time in asr_words:
+            overlap = min(end_time, asr_end_time) - max(start_time, asr_start_time)
+            if overlap < 0:
+                continue
+            key = (overlap, -abs(centre - (asr_start_time + asr_end_time) / 2))
+            if best_key is None or key > best_key:
+                best_match, best_key = asr_text, key
+        matches.append(best_match)
+
+    return matches
+
+
+def validate_words_by_timings(segment, session):
+    # words validated against the word timings of the segment's ASR pass, no media is cut per word
+    # the audio of the speaker video was shifted by the sync offset, so are the ASR word timings
+    if segment.asr_words is None:
+        return False
+
+    time_offset = (segment.sync_offset or 0) / SYNC_FPS
+    words = []
+    for (text, start_time, end_time, score), asr_text in zip(
+            segment.fa_alignment, match_asr_words(segment.fa_alignment, segment.asr_words, time_offset)):
+        word = Word(text=text, segment_id=segment.id, segment=segment)
+
+        # DeepSpeech only gives a confidence per transcript, the word gets the segment's
+        word.update(asr_text=asr_text or '', asr_confidence=segment.asr_confidence)
+        words.append(word)
+
+    session.add_all(words)
+
+    return True
+
+
+def validate_words(segment, services, session, word_validation='clips', **kwargs):
+    # words left over from an interrupted run
+    # loading the words queries the session, so does the delete
+    with session.lock:
+        for word in list(segment.words):
+            session.delete(word)
+        session.expire(segment, ['words'])
+
+    if word_validation == 'timings':
+        return validate_words_by_timings(segment, session)
+
+    # slice words and run through ASR to validate
+    # words are built outside of the session and only the valid ones are inserted, all at once
+    words = []
+    for i, (text, start_time, end_time, score) in enumerate(segment.fa_alignment):
+        word = Word(text=text, segment_id=segment.id, segment=segment)
+
+        precise_slice(
+            video_path=segment.speaker_video_path,
+            start=start_time,
+            end=end_time,
+            output_path=word.video_path
+        )
+        return_code = convert(
+            input_video_path=word.video_path,
+            output_video_path=word.video_path_mp4
+        )
+        if return_code != 0 and os.path.exists(word.video_path_mp4):
+            remove_files(word.video_path, word.video_path_mp4)
+            continue
+
+        # extract audio for ASR
+        # words of a shared speaker audio file are sent as clips of it instead, only they are read
+        if not is_shared(segment.speaker_audio_path):
+            extract_audio(
+                video_path=word.video_path,
+                output_audio_path=word.audio_path,
+                audio_codec='pcm_s16le'
+            )
+        os.remove(word.video_path)
+        words.append((word, start_time, end_time))
+
+    # run ASR on every word of the segment in batches
+    with services.use(SpeechRecognition) as asr:
+        if is_shared(segment.speaker_audio_path):
+            results = asr.transcribe_many([segment.speaker_audio_path] * len(words),
+                                          spans=[(start_time, end_time) for word, start_time, end_time in words])
+        else:
+            results = asr.transcribe_many([word.audio_path for word, start_time, end_time in words])
+
+    validated_words = []
+    for (word, start_time, end_time), candidates in zip(words, results):
+        remove_files(word.audio_path)
+        if not candidates:
+            remove_files(word.video_path_mp4)
+            continue
+
+        asr_response = candidates[0]  # best candidate
+        word.update(asr_text=asr_response['transcript'], asr_confidence=asr_response['confidence'])
+        validated_words.append(word)
+
+    session.add_all(validated_words)
+
+    return True
+
+
+def estimate_head_pose(segment, services, session, **kwargs):
+    # find head pose estimation
+    with services.use(HeadPoseEstimation) as hpe:
+        response = hpe.estimate(segment.speaker_video_path_bigger)
+    if response.status_code == HTTPStatus.OK:
+        session.update(segment, **response.json())
+
+    return True
+
+
+# (name, stage function, checkpoint) in pipeline order
+STAGES = [
+    ('slice', slice_segment, SegmentStage.SLICED),
+    ('asr', transcribe_segment, SegmentStage.TRANSCRIBED),
+    ('face_detection', detect_faces, SegmentStage.FACES_DETECTED),
+    ('sync', find_speaker, SegmentStage.SYNCHRONISED),
+    ('forced_alignment', align_segment, SegmentStage.ALIGNED),
+    ('words', validate_words, SegmentStage.WORDS_VALIDATED),
+    ('head_pose', estimate_head_pose, SegmentStage.HEAD_POSE_ESTIMATED)
+]
@@ -1,21 +1,41 @@
+import threading
+
 from main import config
 from main.models import Base
-from sqlalchemy import create_engine
+from main.utils.enums import SegmentStage, VideoStage
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 
+BATCH_SIZE = 100  # changes per commit when batching writes
+
+# fills in columns added to existing tables for the rows already there, rows are NULL otherwise
+# videos and segments of databases from before checkpoints were either finished or rejected
+BACKFILLS = {
+    ('videos', 'stage'): f'''
+        UPDATE videos SET stage = CASE
+            WHEN EXISTS (SELECT 1 FROM segments WHERE segments.video_id = videos.id) THEN {VideoStage.COMPLETE.value}
+            ELSE {VideoStage.REJECTED.value}
+        END
+    ''',
+    ('segments', 'stage'): f'UPDATE segments SET stage = {SegmentStage.HEAD_POSE_ESTIMATED.value}'
+}
+
 db_engine = create_engine(config.DATABASE_URL)
 session_maker = sessionmaker(bind=db_engine)
 
 
-def db_session():
-    return session_maker()
+def db_session(**kwargs):
+    return session_maker(**kwargs)
 
 
 class Session:
 
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
     def __enter__(self):
-        self.s = db_session()
+        self.s = db_session(**self.kwargs)
 
         return self.s
 
@@ -23,12 +43,90 @@ class Session:
         self.s.close()
 
 
+class UnitOfWork:
+    """Collects changes made by pipeline threads and writes them to the database in batches
+
+    Adds, updates and deletions are applied to the session under a lock and committed together once batch_size
+    changes are pending - new rows of the same table go out as a single executemany. Crash-safety comes from
+    the stage checkpoints being part of the same batches, not from committing every row.
+
+    Sessions aren't thread-safe so every change goes through the lock, as do reads that may load from the
+    database e.g. relationships and expired attributes. The session should be created with expire_on_commit=False,
+    otherwise a commit expires every object and the next read in another thread would refresh it from the database
+    outside of the lock.
+    """
+
+    def __init__(self, s, batch_size=BATCH_SIZE):
+        self.s = s
+        self.batch_size = batch_size
+        self.num_pending = 0
+        self.lock = threading.RLock()
+
+    def add(self, obj, **kwargs):
+        with self.lock:
+            obj.update(**kwargs)
+            self.s.add(obj)
+            self.changed()
+
+    def add_all(self, objs):
+        with self.lock:
+            self.s.add_all(objs)
+            self.changed(len(objs))
+
+    def update(self, obj, **kwargs):
+        with self.lock:
+            obj.update(**kwargs)
+            self.changed()
+
+    def delete(self, obj):
+        with self.lock:
+            self.s.delete(obj)
+            self.changed()
+
+    def expire(self, obj, attribute_names=None):
+        with self.lock:
+            self.s.expire(obj, attribute_names)
+
+    def changed(self, num_changes=1):
+        self.num_pending += num_changes
+        if self.num_pending >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        with self.lock:
+            self.s.commit()
+            self.num_pending = 0
+
+
+def migrate_db():
+    # create_all doesn't change existing tables, adds the columns of the models they're missing
+    table_names = inspect(db_engine).get_table_names()
+    with db_engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in table_names:
+                continue
+
+            column_names = [column['name'] for column in inspect(connection).get_columns(table.name)]
+            for column in table.columns:
+                if column.name in column_names:
+                    continue
+
+                print(f'Adding column {table.name}.{column.name}')
+                column_type = column.type.compile(dialect=db_engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {column.name} '
+                                        f'{column_type}'))
+                if (table.name, column.name) in BACKFILLS:
+                    connection.execute(text(BACKFILLS[(table.name, column.name)]))
+
+
 def construct_db(recreate=False):
     try:
         # check to see if database exists
         db_engine.connect()
         db_engine.execute('SELECT 1;')
         if not recreate:
+            migrate_db()
+            Base.metadata.create_all(db_engine)  # only creates tables missing from an existing database
             return
         Base.metadata.drop_all(db_engine)  # recreate db if specified
     except OperationalError:
@@ -8,6 +8,38 @@ class TranscriptType(enum.Enum):
     AUTO = 2
 
 
+class JobStatus(enum.Enum):
+
+    PENDING = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+
+
+class VideoStage(enum.Enum):
+
+    # last completed stage of a video harvest
+    NO_STAGE = 0
+    DOWNLOADED = 1
+    SEGMENTED = 2
+    SEGMENTS_PROCESSED = 3
+    COMPLETE = 4
+    REJECTED = 5
+
+
+class SegmentStage(enum.Enum):
+
+    # last completed pipeline stage of a segment
+    NO_STAGE = 0
+    SLICED = 1
+    TRANSCRIBED = 2
+    FACES_DETECTED = 3
+    SYNCHRONISED = 4
+    ALIGNED = 5
+    WORDS_VALIDATED = 6
+    HEAD_POSE_ESTIMATED = 7
+
+
 class Gender(enum.Enum):
 
     NO_TYPE = 0
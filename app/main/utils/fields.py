@@ -1,3 +1,6 @@
+import io
+
+import numpy as np
 import sqlalchemy.types as types
 
 
@@ -19,3 +22,35 @@ class IntEnum(types.TypeDecorator):
     def process_result_value(self, value, dialect):
         # called after db query to construct enum type
         return self.enumType(value)
+
+
+class NumpyArray(types.TypeDecorator):
+
+    impl = types.LargeBinary
+
+    def __init__(self, dtype, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dtype = dtype
+
+    def process_bind_param(self, value, dialect):
+        # stored as .npy bytes
+        if value is None:
+            return None
+
+        f = io.BytesIO()
+        np.save(f, np.asarray(value, dtype=self.dtype), allow_pickle=False)
+
+        return f.getvalue()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+
+        return np.load(io.BytesIO(value), allow_pickle=False)
+
+    def compare_values(self, x, y):
+        # arrays don't compare to a single bool
+        if x is None or y is None:
+            return x is y
+
+        return np.array_equal(x, y)
@@ -1,6 +1,8 @@
 import json
 import os
 
+from main import config
+
 
 def initialise_dirs(dirs):
     for dir in dirs:
@@ -8,6 +10,24 @@ def initialise_dirs(dirs):
             os.mkdir(dir)
 
 
+def is_shared(path):
+    return bool(config.SHARED_PATH) and \
+           os.path.realpath(path).startswith(os.path.join(os.path.realpath(config.SHARED_PATH), ''))
+
+
+def upload(**paths):
+    # returns the files and form data of a request
+    # files on the shared volume are passed by path and read in place by the services, anything else is uploaded
+    files, data = {}, {}
+    for name, path in paths.items():
+        if is_shared(path):
+            data[f'{name}_path'] = os.path.realpath(path)
+        else:
+            files[name] = File(path)
+
+    return files, data
+
+
 class File:
 
     def __init__(self, path):
@@ -0,0 +1,140 @@
+"""
+Timing and throughput instrumentation
+
+Every timed event (a video, a stage or a service call) is appended to a JSON lines file as it happens.
+Totals per kind and name are written to a Prometheus textfile for node exporter's textfile collector. Every process
+of the node adds its totals to the same file, so nothing is left behind by workers that exited.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from os.path import join
+
+from main import config
+
+EVENTS_FILENAME = 'harvest.jsonl'
+TEXTFILE_FILENAME = 'harvest.prom'
+TOTALS_FILENAME = 'harvest_totals.json'  # totals of the node the textfile is made from, kept across runs
+LOCK_FILENAME = 'harvest.lock'
+
+# (metric, totals key, help)
+PROMETHEUS_METRICS = [
+    ('harvest_events_total', 'count', 'Number of timed events'),
+    ('harvest_rejected_total', 'rejected', 'Number of events that rejected their item or failed'),
+    ('harvest_wall_seconds_total', 'wall_time', 'Wall time spent in events'),
+    ('harvest_cpu_seconds_total', 'cpu_time', 'CPU time spent in events, subprocesses and services not included'),
+    ('harvest_data_seconds_total', 'data_duration', 'Seconds of segments kept'),
+]
+
+
+class Metrics:
+
+    def __init__(self, metrics_path=config.METRICS_PATH):
+        self.metrics_path = metrics_path
+        self.totals = defaultdict(lambda: {'count': 0, 'rejected': 0, 'wall_time': 0, 'cpu_time': 0,
+                                           'data_duration': 0})  # {(kind, name): totals}
+        self.written = {}  # {(kind, name): totals} already added to the totals of the node
+        self.lock = threading.Lock()
+
+    @property
+    def events_path(self):
+        return join(self.metrics_path, EVENTS_FILENAME)
+
+    @property
+    def textfile_path(self):
+        return join(self.metrics_path, TEXTFILE_FILENAME)
+
+    @property
+    def totals_path(self):
+        return join(self.metrics_path, TOTALS_FILENAME)
+
+    @property
+    def lock_path(self):
+        return join(self.metrics_path, LOCK_FILENAME)
+
+    @contextmanager
+    def timer(self, kind, name, cpu_clock=time.thread_time, **labels):
+        # yields the event so the caller can mark it as rejected or add labels, exceptions count as rejections
+        # thread CPU time by default, use time.process_time for events spread across threads
+        event = {'kind': kind, 'name': name, 'rejected': False, **labels}
+        start_time, start_cpu_time = time.time(), cpu_clock()
+        try:
+            yield event
+        except BaseException:
+            event['rejected'] = True
+            raise
+        finally:
+            event['wall_time'] = time.time() - start_time
+            event['cpu_time'] = cpu_clock() - start_cpu_time
+            self.record(**event)
+
+    def record(self, kind, name, wall_time, cpu_time, rejected=False, **labels):
+        event = {'time': time.time(), 'pid': os.getpid(), 'kind': kind, 'name': name, 'wall_time': wall_time,
+                 'cpu_time': cpu_time, 'rejected': rejected, **labels}
+
+        with self.lock:
+            totals = self.totals[(kind, name)]
+            totals['count'] += 1
+            totals['rejected'] += int(rejected)
+            totals['wall_time'] += wall_time
+            totals['cpu_time'] += cpu_time
+            totals['data_duration'] += labels.get('data_duration', 0)
+
+            with open(self.events_path, 'a') as f:
+                f.write(json.dumps(event, default=str) + '\n')
+
+    def write_textfile(self):
+        # adds what this process recorded since it last wrote to the totals of the node
+        with self.lock:
+            deltas = {}
+            for key, totals in self.totals.items():
+                written = self.written.get(key, {})
+                deltas[key] = {k: v - written.get(k, 0) for k, v in totals.items()}
+                self.written[key] = dict(totals)
+
+        # processes of the node take turns, across pool workers too
+        with open(self.lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            node_totals = {}
+            if os.path.exists(self.totals_path):
+                with open(self.totals_path) as f:
+                    node_totals = {(totals.pop('kind'), totals.pop('name')): totals for totals in json.load(f)}
+            for key, delta in deltas.items():
+                totals = node_totals.setdefault(key, {k: 0 for k in delta})
+                for k, v in delta.items():
+                    totals[k] = totals.get(k, 0) + v
+
+            lines = []
+            for metric, key, help_text in PROMETHEUS_METRICS:
+                lines.extend([f'# HELP {metric} {help_text}', f'# TYPE {metric} counter'])
+                for (kind, name), totals in sorted(node_totals.items()):
+                    lines.append(f'{metric}{{kind="{kind}",name="{name}"}} {totals[key]}')
+
+            # the collector must never read a half written file
+            self.replace(self.totals_path, json.dumps([{'kind': kind, 'name': name, **totals}
+                                                       for (kind, name), totals in node_totals.items()]))
+            self.replace(self.textfile_path, '\n'.join(lines) + '\n')
+
+    @staticmethod
+    def replace(path, content):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        print(f'{"kind":<12} {"name":<24} {"count":>7} {"rejected":>8} {"wall (s)":>10} {"mean (s)":>9} '
+              f'{"cpu (s)":>9}')
+        with self.lock:
+            for (kind, name), totals in sorted(self.totals.items()):
+                mean_wall_time = totals['wall_time'] / totals['count']
+                print(f'{kind:<12} {name:<24} {totals["count"]:>7} {totals["rejected"]:>8} '
+                      f'{totals["wall_time"]:>10.1f} {mean_wall_time:>9.2f} {totals["cpu_time"]:>9.1f}')
+
+
+metrics = Metrics()
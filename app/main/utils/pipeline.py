@@ -0,0 +1,173 @@
+import queue
+import threading
+import time
+import traceback
+
+from tqdm import tqdm
+
+from main.utils.metrics import metrics
+
+QUEUE_SIZE = 10
+REPORT_INTERVAL = 1  # seconds
+
+_DONE = object()  # end of stream marker
+
+
+class Stage:
+
+    def __init__(self, name, f, num_workers=1, done=None):
+        self.name = name
+        self.f = f  # f(item) -> True to pass item on, False to reject it, raises if it failed
+        self.num_workers = num_workers
+        self.done = done  # done(item) -> True if the item already went through the stage, passed on untimed
+
+
+class Pipeline:
+    """Streams items through stages connected by bounded queues
+
+    Every stage runs in its own thread(s) and passes an item forward as soon as it's done with it, so stages
+    overlap instead of taking turns. Rejected items are handed to the reject callback, items a stage raised on
+are collected in failed instead e.g. when a service is down, they're neither rejected nor passed on.
+A stage raising a BaseException e.g. SystemExit aborts the pipeline, every stage drops the items left and run
+raises it.
+    The depth of each stage's input queue is reported while running - a full queue sits in front of the bottleneck.
+    """
+
+    def __init__(self, stages, queue_size=QUEUE_SIZE, reject=None, report_interval=REPORT_INTERVAL):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.reject = reject
+        self.report_interval = report_interval
+        self.kept = []
+        self.failed = []
+        self.kept_lock = threading.Lock()
+        self.depths = {stage.name: [] for stage in stages}  # sampled queue depths
+        self.progress = None
+        self.aborted = threading.Event()
+        self.error = None
+
+    def work(self, i, num_finished):
+        stage, in_queue = self.stages[i], self.queues[i]
+        out_queue = self.queues[i + 1] if i + 1 < len(self.stages) else None
+
+        try:
+            while True:
+                item = in_queue.get()
+                if item is _DONE:
+                    break
+                if self.aborted.is_set():
+                    continue  # drained so the stages in front don't block on a full queue
+
+                try:
+                    self.process(stage, item, out_queue)
+                except BaseException as e:
+                    # e.g. SystemExit, stops the whole pipeline and is raised by run
+                    self.abort(e)
+        finally:
+            # last worker of a stage to finish ends the stream for the next stage
+            with num_finished['lock']:
+                num_finished['count'] += 1
+                is_last = num_finished['count'] == stage.num_workers
+            if is_last and out_queue:
+                for _ in range(self.stages[i + 1].num_workers):
+                    out_queue.put(_DONE)
+
+    def process(self, stage, item, out_queue):
+        if stage.done and stage.done(item):
+            keep = True  # skipped, timing it would skew the stage's metrics
+        else:
+            with metrics.timer('stage', stage.name) as event:
+                try:
+                    keep = stage.f(item)
+                except Exception as e:
+                    print(f'\n{stage.name} failed: {e}')
+                    traceback.print_exc()
+                    event['rejected'] = True
+                    with self.kept_lock:
+                        self.failed.append(item)
+                    self.progress.update()
+                    return
+                event['rejected'] = not keep
+
+        if not keep:
+            if self.reject:
+                try:
+                    self.reject(item)
+                except Exception as e:
+                    print(f'\nFailed to reject item: {e}')
+            self.progress.update()
+        elif out_queue:
+            out_queue.put(item)
+        else:
+            with self.kept_lock:
+                self.kept.append(item)
+            self.progress.update()
+
+    def abort(self, error):
+        # the first error is kept, the rest of the items are dropped by every stage
+        with self.kept_lock:
+            if self.error is None:
+                self.error = error
+        self.aborted.set()
+
+    def report(self, finished):
+        while not finished.wait(self.report_interval):
+            depths = {}
+            for stage, q in zip(self.stages, self.queues):
+                depth = q.qsize()
+                self.depths[stage.name].append(depth)
+                depths[stage.name] = depth
+            self.progress.set_postfix(depths, refresh=True)
+
+    def summary(self):
+        print('Queue depths (mean/max):', ', '.join([
+            f'{name}: {sum(depths) / len(depths):.1f}/{max(depths)}' if depths else f'{name}: 0/0'
+            for name, depths in self.depths.items()
+        ]))
+
+    def run(self, items, total=None):
+        # items can be a generator, they're passed on to the first stage as they're produced
+        self.kept = []
+        self.failed = []
+        self.aborted.clear()
+        self.error = None
+        self.progress = tqdm(total=total if total is not None else len(items))
+        order = {}
+
+        threads = []
+        for i, stage in enumerate(self.stages):
+            num_finished = {'count': 0, 'lock': threading.Lock()}
+            for _ in range(stage.num_workers):
+                thread = threading.Thread(target=self.work, args=(i, num_finished), daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        finished = threading.Event()
+        reporter = threading.Thread(target=self.report, args=(finished,), daemon=True)
+        reporter.start()
+
+        start_time = time.time()
+        try:
+            for item in items:
+                if self.aborted.is_set():
+                    break
+                order[id(item)] = len(order)
+                self.queues[0].put(item)  # blocks while the first stage is behind
+        finally:
+            for _ in range(self.stages[0].num_workers):
+                self.queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+        finished.set()
+        reporter.join()
+        self.progress.close()
+
+        print(f'Pipeline took {int(time.time() - start_time)} seconds')
+        self.summary()
+
+        if self.error is not None:
+            raise self.error
+
+        # keep the original order of items
+        return sorted(self.kept, key=lambda item: order[id(item)])
@@ -19,6 +19,61 @@ def slice(video_path, start, end, output_path, quiet=True):
         .run(quiet=quiet)
 
 
+def multi_slice(video_path, audio_path, slices, quiet=True):
+    """Slice many segments out of a video and its audio in a single decode pass
+
+    slices is a list of (start, end, video_output_path, audio_output_path, combined_output_path) in seconds.
+    Only the time range covered by the slices is decoded - once - and split between every output, instead of
+    decoding the source from the start for every segment. Each slice is encoded once, the combined outputs are
+    muxed from the sliced video and audio without re-encoding the video.
+    Returns the ffmpeg return code, the outputs of every slice are removed if it failed.
+    """
+    slices = [_slice for _slice in slices if not all([os.path.exists(path) for path in _slice[2:]])]
+    if not slices:
+        return 0
+
+    offset = min([_slice[0] for _slice in slices])
+    duration = max([_slice[1] for _slice in slices]) - offset
+
+    # input seeking resets timestamps to 0 at the offset
+    filters = [
+        f'[0:v]split={len(slices)}' + ''.join([f'[v{i}]' for i in range(len(slices))]),
+        f'[1:a]asplit={len(slices)}' + ''.join([f'[a{i}]' for i in range(len(slices))])
+    ]
+    outputs = []
+    for i, (start, end, video_output_path, audio_output_path, combined_output_path) in enumerate(slices):
+        filters.extend([
+            f'[v{i}]trim=start={start - offset:.3f}:end={end - offset:.3f},setpts=PTS-STARTPTS[video_{i}]',
+            f'[a{i}]atrim=start={start - offset:.3f}:end={end - offset:.3f},asetpts=PTS-STARTPTS[audio_{i}]'
+        ])
+        outputs.extend([
+            '-map', f'[video_{i}]', video_output_path,
+            '-map', f'[audio_{i}]', '-acodec', 'pcm_s16le', audio_output_path
+        ])
+
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error' if quiet else 'info', '-y',
+               '-ss', f'{offset:.3f}', '-t', f'{duration:.3f}', '-i', video_path,
+               '-ss', f'{offset:.3f}', '-t', f'{duration:.3f}', '-i', audio_path,
+               '-filter_complex', ';'.join(filters),
+               *outputs]
+    return_code = subprocess.call(command)
+
+    for start, end, video_output_path, audio_output_path, combined_output_path in slices:
+        if return_code != 0:
+            break
+        return_code = subprocess.call(['ffmpeg', '-hide_banner', '-loglevel', 'error' if quiet else 'info', '-y',
+                                       '-i', video_output_path, '-i', audio_output_path,
+                                       '-c:v', 'copy', '-c:a', 'aac', combined_output_path])
+
+    if return_code != 0:
+        # a partial pass would pass for a complete one
+        for path in [path for _slice in slices for path in _slice[2:]]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    return return_code
+
+
 def path_check(path):
     return path.replace("'", "\\'")
 
@@ -58,6 +113,14 @@ def get_num_frames(video_path):
     return num_frames
 
 
+def get_fps(video_path):
+    video_capture = cv2.VideoCapture(video_path)
+    fps = video_capture.get(cv2.CAP_PROP_FPS)
+    video_capture.release()
+
+    return fps
+
+
 def get_frames(video_path):
     video_capture = cv2.VideoCapture(video_path)
     frames = []
@@ -6,8 +6,8 @@ from http import HTTPStatus
 
 import requests
 
-from main.utils.db import construct_db
-from harvest import harvest
+from main.jobs import enqueue
+from main.utils.db import construct_db, Session as db_session
 
 GET_CATEGORY_RECORD_IDS = 'https://storage.googleapis.com/data.yt8m.org/2/j/v/{}.js'
 GET_RECORD_YOUTUBE_ID = 'https://storage.googleapis.com/data.yt8m.org/2/j/i/{}/{}.js'
@@ -21,7 +21,8 @@ def get_category_ids():
     pass
 
 
-def harvest_by_category_id(category_id, num_to_harvest):
+def harvest_by_category_id(category_id, num_to_harvest, priority=0):
+    # queues the videos of the category for harvest workers
     response = requests.get(GET_CATEGORY_RECORD_IDS.format(category_id))
     response_str = response.content.decode('utf-8')
 
@@ -34,14 +35,16 @@ def harvest_by_category_id(category_id, num_to_harvest):
         record_ids = record_ids[:num_to_harvest]
 
     # extract youtube ids from record
+    urls = []
     for record_id in record_ids:
         response = requests.get(GET_RECORD_YOUTUBE_ID.format(record_id[:2], record_id))
         response_str = response.content.decode('utf-8')
         if response.status_code == HTTPStatus.OK:
             youtube_id = re.match(YOUTUBE_ID_REGEX.format(record_id), response_str).groups()[0]
-            url = YOUTUBE_URL.format(youtube_id)
+            urls.append(YOUTUBE_URL.format(youtube_id))
 
-            harvest(url=url, manual_transcripts_only=True)
+    with db_session() as s:
+        enqueue(s, urls, source=f'youtube_8m:{category_id}', priority=priority, manual_transcripts_only=True)
 
 
 def main(args):
@@ -50,7 +53,7 @@ def main(args):
 
     construct_db(recreate=args.recreate_db)
 
-    harvest_by_category_id(category_id=category_id, num_to_harvest=args.n)
+    harvest_by_category_id(category_id=category_id, num_to_harvest=args.n, priority=args.priority)
 
 
 if __name__ == '__main__':
@@ -58,5 +61,6 @@ if __name__ == '__main__':
 
     parser.add_argument('--recreate_db', action='store_true')
     parser.add_argument('--n', type=int)
+    parser.add_argument('--priority', type=int, default=0)
 
     main(parser.parse_args())
@@ -0,0 +1,178 @@
+"""
+End-to-end harvest benchmark
+
+Harvests synthetic videos against the service stubs and reports segments/sec with per-stage latency percentiles,
+taken from the metrics of the run. Needs ffmpeg and the database. Results are saved as JSON with the commit
+they were run on and can be compared against the results of another commit:
+
+export PYTHONPATH=app:$PYTHONPATH
+python app/tests/benchmark/run.py --num_videos 4 --output before.json
+python app/tests/benchmark/run.py --num_videos 4 --output after.json --baseline before.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from main import config
+from main.utils.metrics import metrics
+
+config.USE_DOCKER = False  # before any container clients are created
+
+from main.harvest import harvest_urls
+from main.models import Video, Word
+from main.stages import FACE_DETECTION_MODES
+from main.utils.db import BATCH_SIZE, construct_db, Session as db_session
+from main.utils.pipeline import QUEUE_SIZE
+from tests.benchmark.stubs import Stubs
+from tests.benchmark.synthetic import generate_videos, URL_PREFIX
+
+VIDEOS_PATH = os.path.join(config.PROJECT_PATH, 'benchmark')
+PERCENTILES = [50, 90, 99]
+
+
+def remove_synthetic_videos():
+    # previous runs would be skipped as already processed
+    with db_session() as s:
+        videos = s.query(Video).filter(Video.url.startswith(URL_PREFIX)).all()
+        for video in videos:
+            for segment in video.segments:
+                s.query(Word).filter(Word.segment_id == segment.id).delete(synchronize_session=False)
+                s.delete(segment)
+            shutil.rmtree(video.data_path, ignore_errors=True)
+            s.delete(video)
+        s.commit()
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode().strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def read_events(events_path):
+    with open(events_path, 'r') as f:
+        return [json.loads(line) for line in f]
+
+
+def summarise(events, wall_time):
+    latencies = defaultdict(list)
+    num_rejected = defaultdict(int)
+    num_segments, num_kept, data_duration = 0, 0, 0
+    for event in events:
+        key = f'{event["kind"]}/{event["name"]}'
+        latencies[key].append(event['wall_time'])
+        num_rejected[key] += int(event['rejected'])
+
+        if event['kind'] == 'video_stage' and event['name'] == 'segments':
+            num_segments += event['num_segments']
+        elif event['kind'] == 'video' and not event['rejected'] and not event.get('skipped'):
+            num_kept += event.get('num_segments', 0)
+            data_duration += event.get('data_duration', 0)
+
+    return {
+        'wall_time': wall_time,
+        'num_segments': num_segments,
+        'num_segments_kept': num_kept,
+        'segments_per_second': num_segments / wall_time,
+        'data_seconds_per_second': data_duration / wall_time,
+        'latencies': {
+            key: {
+                'count': len(values),
+                'rejected': num_rejected[key],
+                'mean': float(np.mean(values)),
+                **{f'p{p}': float(np.percentile(values, p)) for p in PERCENTILES}
+            }
+            for key, values in sorted(latencies.items())
+        }
+    }
+
+
+def show(results, baseline=None):
+    summary = results['summary']
+    print(f'\nCommit: {results["commit"]}, parameters: {results["parameters"]}')
+    print(f'{summary["num_segments"]} segments ({summary["num_segments_kept"]} kept) in {summary["wall_time"]:.1f} '
+          f'seconds: {summary["segments_per_second"]:.2f} segments/sec')
+    if baseline:
+        ratio = summary['segments_per_second'] / baseline['summary']['segments_per_second']
+        print(f'{ratio:.2f}x segments/sec of baseline commit {baseline["commit"]}')
+
+    columns = ['count', 'rejected', 'mean', *[f'p{p}' for p in PERCENTILES]]
+    print(f'\n{"":<32}' + ''.join([f'{column:>10}' for column in columns]) + ('  p50 vs baseline' if baseline else ''))
+    for key, latencies in summary['latencies'].items():
+        line = f'{key:<32}' + ''.join([f'{latencies[column]:>10.3f}' if isinstance(latencies[column], float)
+                                       else f'{latencies[column]:>10}' for column in columns])
+        baseline_latencies = baseline['summary']['latencies'].get(key) if baseline else None
+        if baseline_latencies and baseline_latencies['p50']:
+            line += f'  {latencies["p50"] / baseline_latencies["p50"]:>14.2f}x'
+        print(line)
+
+
+def main(args):
+    urls = generate_videos(args.videos_path, num_videos=args.num_videos, duration=args.duration)
+    latencies = dict([latency.split('=') for latency in args.latency])
+    latencies = {name: float(latency) for name, latency in latencies.items()}
+
+    construct_db()
+    remove_synthetic_videos()
+
+    # fresh metrics for every run, inherited by worker processes
+    metrics_path = tempfile.mkdtemp()
+    metrics.metrics_path = metrics_path
+
+    parameters = {
+        'num_videos': args.num_videos,
+        'duration': args.duration,
+        'workers': args.workers,
+        'queue_size': args.queue_size,
+        'batch_size': args.batch_size,
+        'face_detection': args.face_detection,
+        'latencies': latencies
+    }
+    with Stubs(videos_path=args.videos_path, latencies=latencies):
+        start_time = time.time()
+        harvest_urls(urls, manual_transcripts_only=False, min_num_views=None, max_duration=None,
+                     keep_non_speakers=False, workers=args.workers, idle_timeout=None,
+                     queue_size=args.queue_size, batch_size=args.batch_size, face_detection=args.face_detection,
+                     resume=False)
+        wall_time = time.time() - start_time
+
+    results = {
+        'commit': get_commit(),
+        'parameters': parameters,
+        'summary': summarise(read_events(metrics.events_path), wall_time)
+    }
+    shutil.rmtree(metrics_path)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    show(results, baseline=baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--videos_path', default=VIDEOS_PATH)  # synthetic videos are generated once and reused
+    parser.add_argument('--num_videos', type=int, default=2)
+    parser.add_argument('--duration', type=int, default=60)  # seconds per video
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--queue_size', type=int, default=QUEUE_SIZE)
+    parser.add_argument('--batch_size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--face_detection', choices=FACE_DETECTION_MODES, default='segments')
+    parser.add_argument('--latency', action='append', default=[])  # simulated seconds per request e.g. sync-net=0.5
+    parser.add_argument('--output')  # results JSON
+    parser.add_argument('--baseline')  # results JSON of another commit to compare against
+
+    main(parser.parse_args())
@@ -0,0 +1,225 @@
+"""
+Stand-ins for the service APIs
+
+Each stub serves the same routes as its service on the same port and returns well-formed results for the synthetic
+videos without loading any models. A configurable delay per service simulates its processing time.
+Run the harvest with USE_DOCKER=false so the container clients talk to the stubs.
+"""
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import wave
+import zipfile
+from os.path import join
+
+from flask import Flask, jsonify, request, send_file
+from werkzeug.serving import make_server
+
+from main import config
+from main.utils.video import get_fps, get_num_frames
+from tests.benchmark.synthetic import FACE_BOX, TRANSCRIPT, video_name
+
+ARC_NAMES = ['video.mp4', 'audio.wav', 'transcript.en.vtt', 'data.info.json']
+EMBEDDING_SIZE = 128
+SYNC_CONFIDENCE = 10
+ASR_CONFIDENCE = -1
+
+
+def to_seconds(value):
+    return float(value) if value not in [None, ''] else None
+
+
+def save_upload(name, directory):
+    # files on the shared volume are passed by path
+    if request.form.get(f'{name}_path'):
+        return request.form[f'{name}_path']
+
+    path = join(directory, name)
+    request.files[name].save(path)
+
+    return path
+
+
+def create_app(service, videos_path, latency=0):
+    app = Flask(f'Benchmark stub - {service}')
+    app.url_map.strict_slashes = False
+    tmp_dir = tempfile.mkdtemp()
+
+    @app.before_request
+    def simulate_processing():
+        if request.path != '/':
+            time.sleep(latency)
+
+    @app.route('/')
+    def index():
+        return 'OK'
+
+    if service == config.VIDEO_SCRAPER_NAME:
+        @app.route('/videos/info', methods=['POST'])
+        def info():
+            video_path = join(videos_path, video_name(request.json['url']))
+            with open(join(video_path, 'data.info.json')) as f:
+                video_info = json.load(f)
+
+            return jsonify({'info': video_info, 'subtitles': {'manual': ['en'], 'auto': []}, 'transcript': None})
+
+        @app.route('/videos/download', methods=['POST'])
+        def download():
+            video_path = join(videos_path, video_name(request.json['url']))
+            data = io.BytesIO()
+            with zipfile.ZipFile(data, 'w') as f:
+                for arc_name in ARC_NAMES:
+                    f.write(join(video_path, arc_name), arcname=arc_name)
+            data.seek(0)
+
+            return send_file(data, as_attachment=True, attachment_filename='video.zip')
+
+    elif service == config.SPEECH_RECOGNITION_NAME:
+        def recognise(audio_path, start=None, end=None):
+            # words spread over the clip, timings from its start like the service
+            with wave.open(audio_path) as f:
+                file_duration = f.getnframes() / f.getframerate()
+            start = min(start or 0, file_duration)
+            duration = (min(end, file_duration) if end is not None else file_duration) - start
+            if duration <= 0:
+                return [{'transcript': '', 'confidence': ASR_CONFIDENCE, 'words': []}]
+            words = TRANSCRIPT.split(' ')
+            word_duration = duration / len(words)
+
+            return [{
+                'transcript': TRANSCRIPT,
+                'confidence': ASR_CONFIDENCE,
+                'words': [{'word': word, 'start_time': round(i * word_duration, 4),
+                           'duration': round(word_duration, 4)} for i, word in enumerate(words)]
+            }]
+
+        @app.route('/transcribe', methods=['POST'])
+        def transcribe():
+            with tempfile.TemporaryDirectory() as directory:
+                return jsonify(recognise(save_upload('audio', directory), start=to_seconds(request.form.get('start')),
+                                         end=to_seconds(request.form.get('end'))))
+
+        @app.route('/transcribe/batch', methods=['POST'])
+        def transcribe_batch():
+            # shared paths then uploads, like the service, spans are of the shared paths
+            spans = [(to_seconds(start), to_seconds(end))
+                     for start, end in zip(request.form.getlist('start'), request.form.getlist('end'))]
+            with tempfile.TemporaryDirectory() as directory:
+                audio_paths = request.form.getlist('audio_path')
+                for i, file in enumerate(request.files.getlist('audio')):
+                    audio_paths.append(join(directory, f'{i}'))
+                    file.save(audio_paths[-1])
+                spans += [(None, None)] * (len(audio_paths) - len(spans))
+
+                return jsonify([recognise(audio_path, *span) for audio_path, span in zip(audio_paths, spans)])
+
+    elif service == config.FACE_DETECTION_NAME:
+        @app.route('/detect', methods=['POST'])
+        def detect():
+            with tempfile.TemporaryDirectory() as directory:
+                num_frames = get_num_frames(save_upload('video', directory))
+
+            # one person, in the same place for the whole video
+            return jsonify({str(frame_id): {'0': FACE_BOX} for frame_id in range(num_frames)})
+
+        @app.route('/detect/video', methods=['POST'])
+        def detect_video():
+            with tempfile.TemporaryDirectory() as directory:
+                video_path = save_upload('video', directory)
+                fps, num_frames = get_fps(video_path), get_num_frames(video_path)
+
+            return jsonify({'fps': fps, 'num_frames': num_frames,
+                            'detections': [[frame_id, 0, *FACE_BOX] for frame_id in range(num_frames)]})
+
+    elif service == config.SYNC_NET_NAME:
+        def save_crop():
+            # the uploaded video stands in for the cropped one
+            request_id = uuid.uuid4().hex
+            with tempfile.TemporaryDirectory() as directory:
+                shutil.copy(save_upload('video', directory), join(tmp_dir, request_id))
+
+            return request_id
+
+        @app.route('/synchronise', methods=['POST'])
+        def synchronise():
+            return jsonify({'request_id': save_crop(), 'offset': 0, 'confidence': SYNC_CONFIDENCE, 'min_distance': 5})
+
+        @app.route('/synchronise/multi', methods=['POST'])
+        def synchronise_multi():
+            return jsonify({
+                'request_id': save_crop(),
+                'results': {person_id: {'offset': 0, 'confidence': SYNC_CONFIDENCE, 'min_distance': 5}
+                            for person_id in json.loads(request.form['tracks']).keys()}
+            })
+
+        @app.route('/crop', methods=['GET'])
+        def crop():
+            # every person of a request gets the same crop
+            return send_file(join(tmp_dir, request.args['request_id']), as_attachment=True)
+
+    elif service == config.FORCED_ALIGNMENT_NAME:
+        @app.route('/align', methods=['POST'])
+        def align():
+            with tempfile.TemporaryDirectory() as directory:
+                with wave.open(save_upload('audio', directory)) as f:
+                    duration = f.getnframes() / f.getframerate()
+                with open(save_upload('transcript', directory), 'r') as f:
+                    words = f.read().split()
+            word_duration = duration / max(len(words), 1)
+
+            return jsonify({
+                'av_log_likelihood_per_frame': -1,
+                'alignment': [[word, i * word_duration, (i + 1) * word_duration, 1]
+                              for i, word in enumerate(words)]
+            })
+
+    elif service == config.HEAD_POSE_ESTIMATION_NAME:
+        @app.route('/estimate', methods=['POST'])
+        def estimate():
+            return jsonify({'direction': 'centre', 'yaw': 0, 'pitch': 0, 'roll': 0})
+
+    elif service == config.FACE_RECOGNITION_NAME:
+        @app.route('/embeddings/video', methods=['POST'])
+        def embeddings():
+            return jsonify({'embeddings': [0] * EMBEDDING_SIZE})
+
+    app.tmp_dir = tmp_dir
+
+    return app
+
+
+class Stubs:
+    """Runs a stub of every service in background threads"""
+
+    def __init__(self, videos_path, latencies=None):
+        latencies = latencies or {}
+        self.servers = []
+        self.tmp_dirs = []
+        for name, port in [
+            (config.VIDEO_SCRAPER_NAME, config.VIDEO_SCRAPER_PORT),
+            (config.SPEECH_RECOGNITION_NAME, config.SPEECH_RECOGNITION_PORT),
+            (config.FORCED_ALIGNMENT_NAME, config.FORCED_ALIGNMENT_PORT),
+            (config.FACE_DETECTION_NAME, config.FACE_DETECTION_PORT),
+            (config.SYNC_NET_NAME, config.SYNC_NET_PORT),
+            (config.HEAD_POSE_ESTIMATION_NAME, config.HEAD_POSE_ESTIMATION_PORT),
+            (config.FACE_RECOGNITION_NAME, config.FACE_RECOGNITION_PORT)
+        ]:
+            app = create_app(name, videos_path=videos_path, latency=latencies.get(name, 0))
+            self.servers.append(make_server(config.HOST, int(port), app, threaded=True))
+            self.tmp_dirs.append(app.tmp_dir)
+
+    def __enter__(self):
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        return self
+
+    def __exit__(self, *args):
+        for server in self.servers:
+            server.shutdown()
+        for tmp_dir in self.tmp_dirs:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
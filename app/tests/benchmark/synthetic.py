@@ -0,0 +1,118 @@
+"""
+Synthetic videos for benchmarking
+
+Every video is generated by ffmpeg from a test pattern and a tone with a static "face" box drawn on it, plus a VTT
+caption every few seconds. The files are laid out like the video scraper's zip so they can be served as is.
+Videos are generated deterministically, so results from different commits are comparable.
+"""
+import argparse
+import json
+import os
+import subprocess
+from os.path import join
+
+from main.utils.time import int_to_time
+
+FPS = 25
+WIDTH, HEIGHT = 640, 360
+FACE_BOX = [260, 100, 380, 260]  # x1, y1, x2, y2 - what the face detection stub returns
+SEGMENT_LENGTH = 3  # seconds
+SEGMENT_GAP = 1
+
+# the ASR stub returns the common words, the caption number keeps the captions from being removed as duplicates
+TRANSCRIPT = 'synthetic speech for benchmarking the harvest pipeline'
+NUMBERS = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine']
+
+URL_PREFIX = 'https://synthetic.invalid/watch?v='
+
+
+def video_url(name):
+    return f'{URL_PREFIX}{name}'
+
+
+def video_name(url):
+    return url[len(URL_PREFIX):]
+
+
+def caption_text(i):
+    return f'{TRANSCRIPT} {" ".join([NUMBERS[int(digit)] for digit in str(i)])}'
+
+
+def generate_captions(duration, segment_length=SEGMENT_LENGTH, segment_gap=SEGMENT_GAP):
+    lines = ['WEBVTT', 'Kind: captions', 'Language: en', '']
+    start, i = 0, 0
+    while start + segment_length <= duration:
+        end = start + segment_length
+
+        # extract_segments compares the seconds of the start and end times only
+        # i.e. captions crossing a minute would be dropped
+        if start // 60 == end // 60:
+            lines.extend([f'{int_to_time(start)}.000 --> {int_to_time(end)}.000', caption_text(i), ''])
+            i += 1
+
+        start = end + segment_gap
+
+    return '\n'.join(lines), i
+
+
+def generate_video(output_path, name, duration):
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    x1, y1, x2, y2 = FACE_BOX
+    subprocess.check_call([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size={WIDTH}x{HEIGHT}:rate={FPS}:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=16000:duration={duration}',
+        '-vf', f'drawbox=x={x1}:y={y1}:w={x2 - x1}:h={y2 - y1}:color=white:t=fill',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest',
+        join(output_path, 'video.mp4')
+    ])
+    subprocess.check_call([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=16000:duration={duration}',
+        '-ac', '1', '-acodec', 'pcm_s16le',
+        join(output_path, 'audio.wav')
+    ])
+
+    captions, num_captions = generate_captions(duration)
+    with open(join(output_path, 'transcript.en.vtt'), 'w') as f:
+        f.write(captions)
+
+    with open(join(output_path, 'data.info.json'), 'w') as f:
+        json.dump({
+            'id': name,
+            'title': f'Synthetic video {name}',
+            'duration': duration,
+            'view_count': 1000000,
+            'thumbnails': []
+        }, f)
+
+    return num_captions
+
+
+def generate_videos(output_path, num_videos, duration):
+    # returns the URLs of the videos, already generated videos are reused
+    urls = []
+    for i in range(num_videos):
+        name = f'{duration}s_{i}'
+        video_path = join(output_path, name)
+        if not os.path.exists(join(video_path, 'data.info.json')):
+            num_captions = generate_video(video_path, name=name, duration=duration)
+            print(f'Generated {name} with {num_captions} captions')
+        urls.append(video_url(name))
+
+    return urls
+
+
+def main(args):
+    generate_videos(args.output_path, num_videos=args.num_videos, duration=args.duration)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output_path')
+    parser.add_argument('--num_videos', type=int, default=1)
+    parser.add_argument('--duration', type=int, default=60)  # seconds
+
+    main(parser.parse_args())
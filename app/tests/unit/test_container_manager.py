@@ -0,0 +1,56 @@
+import threading
+
+from main.containers.manager import ContainerManager
+
+
+class FakeContainer:
+
+    name = 'fake'
+    started = None  # set to block start until it's set
+
+    def __init__(self):
+        self.num_starts = 0
+
+    def start(self):
+        if self.started is not None:
+            self.started.wait()
+        self.num_starts += 1
+
+    def stop(self):
+        pass
+
+
+class SlowContainer(FakeContainer):
+
+    name = 'slow'
+    started = threading.Event()
+
+
+def test_get_while_another_container_starts():
+    with ContainerManager(idle_timeout=None) as services:
+        container = services.get(FakeContainer)
+
+        thread = threading.Thread(target=services.get, args=(SlowContainer,), daemon=True)
+        thread.start()
+
+        # a running container doesn't wait on the other one starting
+        getter = threading.Thread(target=services.get, args=(FakeContainer,), daemon=True)
+        getter.start()
+        getter.join(timeout=5)
+        assert not getter.is_alive()
+
+        SlowContainer.started.set()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert container.num_starts == 1
+
+
+def test_container_started_once():
+    with ContainerManager(idle_timeout=None) as services:
+        threads = [threading.Thread(target=services.get, args=(FakeContainer,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert services.get(FakeContainer).num_starts == 1
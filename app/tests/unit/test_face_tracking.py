@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('dlib')  # dependency of the face detection service
+
+from main.services.face_detection.main.utils.detection import fill_frames, smooth, stitch
+
+FACE_A = [100, 100, 200, 200]
+FACE_B = [400, 100, 500, 200]
+FACE_C = [700, 100, 800, 200]
+
+
+def test_stitch():
+    chunk_frame_tracks = [
+        {
+            0: {0: FACE_A},
+            1: {0: FACE_A, 1: FACE_B},  # appears mid-chunk
+            2: {0: FACE_A, 1: FACE_B}
+        },
+        {
+            # ids start from 0 again in every chunk
+            3: {0: FACE_B, 1: [102, 102, 202, 202]},  # both faces carry on across the boundary
+            4: {0: FACE_B, 1: [104, 104, 204, 204], 2: FACE_C},  # appears mid-chunk
+            5: {2: FACE_C}
+        }
+    ]
+
+    assert stitch(chunk_frame_tracks) == {
+        0: {0: FACE_A},
+        1: {0: FACE_A, 1: FACE_B},
+        2: {0: FACE_A, 1: FACE_B},
+        3: {1: FACE_B, 0: [102, 102, 202, 202]},
+        4: {1: FACE_B, 0: [104, 104, 204, 204], 2: FACE_C},
+        5: {2: FACE_C}
+    }
+
+
+def test_stitch_new_face_at_boundary():
+    # a face that isn't in the last frame of the previous chunk gets a new id
+    chunk_frame_tracks = [
+        {0: {0: FACE_A}, 1: {}},
+        {},  # chunk without frames e.g. past the end of the video
+        {2: {0: FACE_A}, 3: {0: FACE_A}}
+    ]
+
+    assert stitch(chunk_frame_tracks) == {0: {0: FACE_A}, 1: {}, 2: {1: FACE_A}, 3: {1: FACE_A}}
+
+
+@pytest.mark.parametrize('chunk_frame_tracks', [[], [{}]])
+def test_stitch_no_frames(chunk_frame_tracks):
+    assert stitch(chunk_frame_tracks) == {}
+
+
+def moving_box(frame_id):
+    # 2 pixels right every frame
+    return [10 + 2 * frame_id, 100, 110 + 2 * frame_id, 200]
+
+
+def test_fill_frames_moving_face():
+    keyframe_ids = [0, 10, 20, 30]
+    tracks = [[(frame_id, moving_box(frame_id)) for frame_id in keyframe_ids]]
+
+    frame_tracks = fill_frames(tracks, keyframe_ids, start_frame=0, end_frame=40)
+
+    assert all([frame_tracks[frame_id][0] == moving_box(frame_id) for frame_id in range(31)])
+    assert frame_tracks[39][0] == moving_box(30)  # last box held up to the end
+
+
+def test_smooth():
+    # unevenly spaced keyframes of a moving face are left where they are
+    frame_ids = np.array([0, 3, 10, 12, 20])
+    boxes = np.array([moving_box(frame_id) for frame_id in frame_ids], dtype=np.float64)
+    assert np.allclose(smooth(frame_ids, boxes), boxes)
+
+    # jitter of interior keyframes is damped, the ends keep their detections
+    jitter = np.array([[0, 0, 0, 0], [6, 6, 6, 6], [-6, -6, -6, -6], [6, 6, 6, 6], [0, 0, 0, 0]])
+    smoothed = smooth(frame_ids, boxes + jitter)
+    assert np.allclose(smoothed[[0, -1]], boxes[[0, -1]])
+    assert np.all(np.abs(smoothed - boxes)[1:-1] < 6)
@@ -0,0 +1,113 @@
+import datetime
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from main import config, harvest
+from main.models import Base, HarvestJob, Segment, Video
+from main.utils import db
+from main.utils.enums import JobStatus, SegmentStage, VideoStage
+from main.utils.metrics import metrics
+
+URL = 'https://www.youtube.com/watch?v=test'
+
+
+class FakeResponse:
+
+    status_code = 404
+
+
+class FakeServices:
+    """Stands in for the container manager, every service is the same fake"""
+
+    def __init__(self):
+        self.num_downloads = 0
+
+    @contextmanager
+    def use(self, container_class):
+        yield self
+
+    def get_video_info(self, url):
+        return {'info': {}, 'subtitles': {'manual': ['en'], 'auto': []}}
+
+    def download_video(self, url):
+        self.num_downloads += 1
+
+    def get_embeddings_by_video(self, video_path):
+        return FakeResponse()
+
+    def get_matching_identities(self, segment_embeddings):
+        return {}, 0
+
+
+def test_failed_job_resumes_from_checkpoint(tmp_path, monkeypatch):
+    engine = create_engine(f'sqlite:///{tmp_path / "harvest.db"}', connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(db, 'session_maker', sessionmaker(bind=engine))
+    monkeypatch.setattr(config, 'DATA_PATH', str(tmp_path))
+    monkeypatch.setattr(metrics, 'metrics_path', str(tmp_path))
+    monkeypatch.setattr(Video, 'extract', lambda self, zip_path: None)
+    monkeypatch.setattr(harvest, 'slice_segments', iter)
+
+    calls = []
+    asr_down = True
+
+    def segment_video(s, video, **kwargs):
+        calls.append('segment')
+        video.segments = [Segment(start=datetime.time(second=i), end=datetime.time(second=i + 1), text='hello')
+                          for i in range(2)]
+        video.stage = VideoStage.SEGMENTED
+        s.commit()
+
+        return True
+
+    def slice_segment(segment, **kwargs):
+        calls.append('slice')
+
+        return True
+
+    def transcribe_segment(segment, **kwargs):
+        calls.append('asr')
+        if asr_down:
+            raise Exception('Service unavailable')
+
+        return True
+
+    monkeypatch.setattr(harvest, 'segment_video', segment_video)
+    monkeypatch.setattr(harvest, 'STAGES', [('slice', slice_segment, SegmentStage.SLICED),
+                                            ('asr', transcribe_segment, SegmentStage.TRANSCRIBED)])
+
+    with db.Session() as s:
+        job = HarvestJob()
+        job.update(url=URL, options={}, status=JobStatus.PENDING, attempts=0, max_attempts=3,
+                   available_at=datetime.datetime.utcnow())
+        s.add(job)
+        s.commit()
+
+    services = FakeServices()
+    kwargs = {'manual_transcripts_only': False, 'keep_non_speakers': False}
+
+    # fails halfway, the segments were sliced but not transcribed
+    assert harvest.harvest_jobs(services=services, **kwargs) == (0, 1)
+    with db.Session() as s:
+        video = s.query(Video).one()
+        assert video.stage == VideoStage.SEGMENTED
+        assert [segment.stage for segment in video.segments] == [SegmentStage.SLICED] * 2
+
+        job = s.query(HarvestJob).one()
+        assert job.status == JobStatus.PENDING
+        job.available_at = datetime.datetime.utcnow()  # past the retry backoff
+        s.commit()
+
+    # reclaimed, picks up at the checkpoint
+    asr_down = False
+    calls.clear()
+    assert harvest.harvest_jobs(services=services, **kwargs) == (1, 0)
+    assert calls == ['asr', 'asr']
+    assert services.num_downloads == 1
+    with db.Session() as s:
+        video = s.query(Video).one()
+        assert video.stage == VideoStage.COMPLETE
+        assert [segment.stage for segment in video.segments] == [SegmentStage.TRANSCRIBED] * 2
+        assert s.query(HarvestJob).one().status == JobStatus.DONE
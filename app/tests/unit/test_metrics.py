@@ -0,0 +1,18 @@
+from main.utils.metrics import Metrics
+
+
+def test_textfile_merges_processes(tmp_path):
+    # two processes of the same node, each writing more than once
+    first, second = Metrics(metrics_path=str(tmp_path)), Metrics(metrics_path=str(tmp_path))
+    first.record('stage', 'asr', wall_time=1, cpu_time=0.5)
+    first.write_textfile()
+    first.record('stage', 'asr', wall_time=2, cpu_time=0.5, rejected=True)
+    first.write_textfile()
+    second.record('stage', 'asr', wall_time=3, cpu_time=1)
+    second.write_textfile()
+
+    assert [path.name for path in tmp_path.glob('*.prom')] == ['harvest.prom']
+    lines = (tmp_path / 'harvest.prom').read_text().splitlines()
+    assert 'harvest_events_total{kind="stage",name="asr"} 3' in lines
+    assert 'harvest_rejected_total{kind="stage",name="asr"} 1' in lines
+    assert 'harvest_wall_seconds_total{kind="stage",name="asr"} 6' in lines
@@ -0,0 +1,60 @@
+import pytest
+
+from main.utils.metrics import metrics
+from main.utils.pipeline import Pipeline, Stage
+
+
+def test_done_items_pass_untimed(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'metrics_path', str(tmp_path))
+    calls = []
+
+    def process(item):
+        calls.append(item)
+        return True
+
+    pipeline = Pipeline(stages=[Stage('process', process, done=lambda item: item % 2 == 0)], report_interval=0.01)
+    kept = pipeline.run(range(5))
+
+    assert kept == [0, 1, 2, 3, 4]
+    assert sorted(calls) == [1, 3]
+    assert metrics.totals[('stage', 'process')]['count'] == 2
+
+
+def test_base_exception_aborts(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'metrics_path', str(tmp_path))
+    calls = []
+
+    def exit_on_second(item):
+        if item == 1:
+            exit()
+        return True
+
+    def process(item):
+        calls.append(item)
+        return True
+
+    # the queues are smaller than the no. items, nothing may block on them once aborted
+    pipeline = Pipeline(stages=[Stage('exit', exit_on_second), Stage('process', process)], queue_size=1,
+                        report_interval=0.01)
+    with pytest.raises(SystemExit):
+        pipeline.run(range(100))
+
+    assert 1 not in calls
+    assert len(calls) < 100
+
+
+def test_failed_items_not_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'metrics_path', str(tmp_path))
+    rejected = []
+
+    def process(item):
+        if item == 1:
+            raise Exception('Service unavailable')
+        return item != 2
+
+    pipeline = Pipeline(stages=[Stage('process', process)], reject=rejected.append, report_interval=0.01)
+    kept = pipeline.run(range(4))
+
+    assert kept == [0, 3]
+    assert pipeline.failed == [1]
+    assert rejected == [2]
@@ -0,0 +1,188 @@
+import datetime
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from main import config, stages
+from main.models import Segment, Video
+from main.stages import match_asr_words, slice_face_tracks, validate_words
+
+FA_ALIGNMENT = [
+    ['hello', 0.0, 0.5, 0.9],
+    ['big', 0.5, 0.8, 0.9],
+    ['world', 0.9, 1.4, 0.9],
+    ['again', 3.0, 3.5, 0.9]  # nothing heard
+]
+
+
+class FakeSession:
+    """Unit of work collecting the words added, see utils/db.py"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.added = []
+
+    def add_all(self, objs):
+        self.added.extend(objs)
+
+    def delete(self, obj):
+        pass
+
+    def expire(self, obj, attributes=None):
+        pass
+
+
+class FakeServices:
+
+    def __init__(self, results):
+        self.results = results
+        self.requests = []
+
+    @contextmanager
+    def use(self, container_class):
+        yield self
+
+    def transcribe_many(self, audio_paths, spans=None):
+        self.requests.append((audio_paths, spans))
+
+        return self.results
+
+
+def create_segment(**kwargs):
+    segment = Segment(start=datetime.time(second=10), end=datetime.time(second=14), text='hello big world again')
+    segment.video = Video(url='https://www.youtube.com/watch?v=test')
+    segment.update(fa_alignment=FA_ALIGNMENT, **kwargs)
+
+    return segment
+
+
+def test_slice_face_tracks():
+    face_tracks = np.array([
+        [9, 3, 0, 0, 10, 10],  # before the segment
+        [10, 3, 1, 1, 11, 11],
+        [10, 5, 2, 2, 12, 12],
+        [11, 7, 3, 3, 13, 13],
+        [11, 3, 4, 4, 14, 14],
+        [12, 3, 5, 5, 15, 15]  # after the segment
+    ], dtype=np.int32)
+
+    detections = slice_face_tracks(fps=25, face_tracks=face_tracks, start=10 / 25, num_frames=2)
+
+    assert detections.dtype == np.int16
+    assert detections.tolist() == [
+        [0, 0, 1, 1, 11, 11],
+        [0, 1, 2, 2, 12, 12],
+        [1, 2, 3, 3, 13, 13],
+        [1, 0, 4, 4, 14, 14]
+    ]
+
+
+def test_slice_face_tracks_long_video():
+    # frames of the whole video past the int16 range
+    start_frame = 40000
+    face_tracks = np.array([
+        [start_frame, 1, 100, 100, 200, 200],
+        [start_frame + 1, 1, 101, 101, 201, 201],
+        [start_frame + 1, 0, 300, 300, 400, 400]
+    ], dtype=np.int32)
+
+    detections = slice_face_tracks(fps=25, face_tracks=face_tracks, start=start_frame / 25, num_frames=25)
+
+    assert detections.tolist() == [
+        [0, 0, 100, 100, 200, 200],
+        [1, 0, 101, 101, 201, 201],
+        [1, 1, 300, 300, 400, 400]
+    ]
+
+
+def test_slice_face_tracks_no_faces():
+    face_tracks = np.array([[0, 0, 1, 1, 2, 2]], dtype=np.int32)
+
+    detections = slice_face_tracks(fps=25, face_tracks=face_tracks, start=10, num_frames=25)
+
+    assert detections.shape == (0, 6)
+
+
+def test_match_asr_words():
+    asr_words = [
+        {'word': 'hello', 'start_time': 0.0, 'duration': 0.4},
+        {'word': 'bag', 'start_time': 0.45, 'duration': 0.3},
+        {'word': 'word', 'start_time': 0.7, 'duration': 0.8}  # overlaps big a little, world the most
+    ]
+
+    assert match_asr_words(FA_ALIGNMENT, asr_words) == ['hello', 'bag', 'word', None]
+
+
+def test_match_asr_words_offset():
+    # the ASR words are a second behind the alignment
+    asr_words = [{'word': 'world', 'start_time': 0.0, 'duration': 0.5}]
+
+    assert match_asr_words(FA_ALIGNMENT, asr_words, time_offset=1.0) == [None, None, 'world', None]
+
+
+def test_validate_words_by_timings(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'DATA_PATH', str(tmp_path))
+    # shifted by 25 frames of sync offset, one second
+    segment = create_segment(sync_offset=25, asr_confidence=0.8, asr_words=[
+        {'word': 'hello', 'start_time': -1.0, 'duration': 0.4},
+        {'word': 'world', 'start_time': 0.0, 'duration': 0.4}
+    ])
+    session = FakeSession()
+
+    assert validate_words(segment, services=None, session=session, word_validation='timings')
+
+    assert [(word.text, word.asr_text, word.asr_confidence) for word in session.added] == [
+        ('hello', 'hello', 0.8),
+        ('big', '', 0.8),
+        ('world', 'world', 0.8),
+        ('again', '', 0.8)
+    ]
+
+
+def test_validate_words_by_timings_no_asr_words(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'DATA_PATH', str(tmp_path))
+    session = FakeSession()
+
+    assert not validate_words(create_segment(), services=None, session=session, word_validation='timings')
+    assert session.added == []
+
+
+def test_validate_words_clips(tmp_path, monkeypatch):
+    # the speaker audio is on the shared volume, words are sent as clips of it
+    monkeypatch.setattr(config, 'DATA_PATH', str(tmp_path))
+    monkeypatch.setattr(config, 'SHARED_PATH', str(tmp_path))
+    num_converted = 0
+
+    def touch(output_path, **kwargs):
+        with open(output_path, 'w'):
+            pass
+
+    def convert(input_video_path, output_video_path):
+        nonlocal num_converted
+        touch(output_video_path)
+        num_converted += 1
+
+        return 1 if num_converted == 2 else 0  # fails to convert the second word
+
+    monkeypatch.setattr(stages, 'precise_slice', touch)
+    monkeypatch.setattr(stages, 'convert', convert)
+    monkeypatch.setattr(stages, 'extract_audio', lambda **kwargs: None)
+    segment = create_segment()
+    words_path = tmp_path / str(segment.video.id) / 'segments' / str(segment.id) / 'words'
+    words_path.mkdir(parents=True)
+    services = FakeServices(results=[
+        [{'transcript': 'hello', 'confidence': 0.9}, {'transcript': 'hollow', 'confidence': 0.1}],
+        [],  # nothing recognised
+        None  # failed
+    ])
+    session = FakeSession()
+
+    assert validate_words(segment, services=services, session=session, word_validation='clips')
+
+    [(audio_paths, spans)] = services.requests
+    assert audio_paths == [segment.speaker_audio_path] * 3
+    assert spans == [(0.0, 0.5), (0.9, 1.4), (3.0, 3.5)]
+    assert [(word.text, word.asr_text, word.asr_confidence) for word in session.added] == [('hello', 'hello', 0.9)]
+    # only the video of the kept word is left
+    assert [path.name for path in words_path.iterdir()] == [f'{session.added[0].id}.mp4']